@@ -0,0 +1,107 @@
+import math
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# ประเภทที่นับเป็นเงินปันผล (ไม่รวมหุ้นปันผล)
+CASH_DIVIDEND_TYPE = 'เงินปันผล'
+# ดูย้อนหลังเพื่อประมาณรอบการจ่าย (ระยะห่างระหว่างวัน XD)
+HISTORY_YEARS = 3
+
+# field ที่ต้องใช้ ดึงครั้งเดียวทั้ง universe แล้วเก็บเป็นคอลัมน์
+ANALYTICS_FIELDS = ('symbol', 'amount_value', 'yield_value', 'xd_date_utc')
+
+
+def history_since(now: datetime) -> datetime:
+    return now - timedelta(days=365 * HISTORY_YEARS)
+
+
+def compute_analytics(columns: dict[str, list], symbols: list[str], now: datetime) -> list[dict]:
+    """
+    คำนวณต่อ symbol จากคอลัมน์ของแถวปันผล (ดู ANALYTICS_FIELDS) ในรอบเดียวด้วย pandas
+
+    - ttm_amount / ttm_count / ttm_yield / avg_yield: ปันผลที่ขึ้น XD ใน 365 วันที่ผ่านมา
+      (แถวซ้ำจากหลายแหล่งที่ symbol วัน XD และจำนวนเงินตรงกันนับครั้งเดียว)
+    - next_xd: วัน XD ถัดไปที่ประกาศแล้ว ถ้ายังไม่มีใช้ค่าประมาณ (XD ล่าสุด + median ระยะห่าง)
+    - rank: อันดับตาม ttm_yield (มากไปน้อย) symbol ที่ไม่มีปันผลใน 12 เดือนไม่มีอันดับ
+    """
+    symbols = list(dict.fromkeys(symbols))
+    df = pd.DataFrame({
+        'symbol': pd.Categorical(columns['symbol'], categories=symbols),
+        'amount': pd.Series(columns['amount_value'], dtype='float64'),
+        'yield': pd.Series(columns['yield_value'], dtype='float64'),
+        'xd': pd.to_datetime(pd.Series(columns['xd_date_utc'], dtype='object'), utc=True),
+    })
+    df = df[df['symbol'].notna() & df['xd'].notna()]
+    # ปันผลรอบเดียวกันอาจมีสองแถว: panphol (มี quarter / yield) และปฏิทิน SET (quarter ว่าง) ซึ่ง key ต่างกัน
+    # -> เก็บแถวเดียวต่อ (symbol, วัน XD, จำนวนเงิน) โดยเลือกแถวที่มี yield ก่อน
+    df = (
+        df.sort_values('yield', na_position='last', kind='stable')
+        .drop_duplicates(['symbol', 'xd', 'amount'])
+    )
+    now_ts = pd.Timestamp(now)
+    if now_ts.tzinfo is None:
+        now_ts = now_ts.tz_localize('UTC')
+
+    past = df[df['xd'] <= now_ts].sort_values(['symbol', 'xd'])
+    upcoming = df[df['xd'] > now_ts]
+    ttm = past[past['xd'] > now_ts - pd.Timedelta(days=365)]
+
+    by_symbol = ttm.groupby('symbol', observed=False)
+    result = pd.DataFrame({
+        'ttm_amount': by_symbol['amount'].sum(min_count=1),
+        'ttm_count': by_symbol['xd'].count(),
+        'ttm_yield': by_symbol['yield'].sum(min_count=1),
+        'avg_yield': by_symbol['yield'].mean(),
+    }).reindex(symbols)
+    result['ttm_count'] = result['ttm_count'].fillna(0)
+
+    past_groups = past.groupby('symbol', observed=False)['xd']
+    last_xd = past_groups.max().reindex(symbols)
+    median_gap = past_groups.diff().groupby(past['symbol'], observed=False).median().reindex(symbols)
+
+    # ค่าประมาณที่เลยวันนี้ไปแล้ว (ยังไม่ประกาศรอบใหม่) เลื่อนไปอีกรอบจนเป็นอนาคต
+    expected = last_xd + median_gap
+    gap_s = median_gap.dt.total_seconds()
+    behind = (now_ts - expected).dt.total_seconds()
+    steps = np.ceil(np.clip(behind / gap_s.where(gap_s > 0), 0, None))
+    expected = expected + pd.to_timedelta(steps.fillna(0) * gap_s.fillna(0), unit='s')
+
+    announced = upcoming.groupby('symbol', observed=False)['xd'].min().reindex(symbols)
+    result['last_xd'] = last_xd
+    result['next_xd'] = announced.fillna(expected)
+    result['next_xd_estimated'] = announced.isna() & expected.notna()
+    result['payout_interval_days'] = (median_gap.dt.total_seconds() / 86400).round(1)
+    result['rank'] = result['ttm_yield'].where(result['ttm_count'] > 0).rank(ascending=False, method='min')
+    result = result.sort_values(['rank', 'ttm_amount'], ascending=[True, False], na_position='last')
+    result.index.name = 'symbol'
+    return _records(result.reset_index())
+
+
+def _py(value) -> Optional[object]:
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def _records(frame: pd.DataFrame) -> list[dict]:
+    """
+    DataFrame -> list ของ dict ที่มีแต่ชนิดของ Python (NaN / NaT -> None) ให้ jsonable_encoder ใช้ได้
+    """
+    columns = {c: frame[c].astype(object).tolist() for c in frame.columns}
+    records = []
+    for row in zip(*columns.values()):
+        record = {c: _py(v) for c, v in zip(columns, row)}
+        for c in ('ttm_count', 'rank'):
+            if record[c] is not None:
+                record[c] = int(record[c])
+        records.append(record)
+    return records
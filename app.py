@@ -1,24 +1,224 @@
-from fastapi import FastAPI, HTTPException, Query, Body
-from fastapi.encoders import jsonable_encoder
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
-from bs4 import BeautifulSoup
-import redis
-import json
-from typing import List, Dict, Optional
+from fastapi import FastAPI, HTTPException, Query, Body, Request
+from typing import Awaitable, Callable, Optional
 import time
 import os
+import logging
+import asyncio
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from datetime import datetime, timedelta, UTC
-import json as pyjson
-from fastapi.responses import JSONResponse
+from datetime import date, datetime, UTC
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from browser_pool import BrowserPool
+from panphol import PanpholScraper, BasketNotFound, PANPHOL_HOST, basket_dividends, is_timeout_error
+from ratelimit import RateLimitTimeout, UpstreamThrottled
+from resilience import NegativeCache, CircuitBreakerRegistry, CircuitOpenError, NOT_FOUND, UPSTREAM_ERROR
+from singleflight import SingleFlight, RedisSingleFlight
+from repository import DividendRepository, InvalidCursor, SUMMARY_COLLECTION, content_fingerprint
+from serialization import encode_json, decode_json
+from universe import SymbolUniverse
+from indexes import reconcile_indexes, explain_queries
+from migrations import migrate_typed_fields, ensure_summary
+from refresher import BackgroundRefresher
+from events import DividendEventHub, publish_dividend_events, sse_stream
+from jobs import JobQueue, PANPHOL_JOB, SET_CALENDAR_JOB
+from metrics import (
+    BROWSER_PAGES_IN_USE, DIVIDEND_EVENT_SUBSCRIBERS, HTTP_REQUEST_SECONDS, SCRAPE_CONTENT_CHECKS, MongoCommandMetrics,
+    observe_stage, render_latest, stats_collector
+)
+from cache import (
+    TwoTierCache, DataVersions, DIVIDENDS_VERSION, SYMBOLS_VERSION,
+    panphor_key, summary_key, soon_key, analytics_key, dividend_cache_prefixes, all_dividend_cache_prefixes
+)
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Thai Stock Dividend API")
+logger = logging.getLogger(__name__)
+
+# Chromium pool: import Playwright และเปิด browser ตอน scrape ผ่าน browser ครั้งแรก
+browser_pool = BrowserPool.from_env()
+# HTTP ก่อน แล้วค่อย fallback ไปใช้ browser_pool เมื่อจำเป็น
+panphol_scraper = PanpholScraper.from_env(browser_pool)
+
+CACHE_EXPIRY = int(os.getenv('CACHE_EXPIRY', 300))  # 5 minutes in seconds
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 30))
+
+# analytics คำนวณใหม่เมื่อ ingest (cache ถูกลบ) หรือขึ้นวันใหม่ จึงเก็บได้นาน
+ANALYTICS_CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', 86400))
+
+# ขนาดหน้าของ endpoint ที่รองรับ limit/cursor
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+
+# จำนวน symbol ที่ /dividends-panphor/batch ดึงพร้อมกันต่อหนึ่ง request
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+
+# จำนวน symbol สูงสุดต่อหนึ่ง request ของ /dividends-panphor/batch และ /jobs/panphol (เกินได้ 422)
+MAX_BATCH_SYMBOLS = int(os.getenv('MAX_BATCH_SYMBOLS', 100))
+
+# single-flight ของการ scrape ต่อ symbol: 'local' = ภายใน process, 'redis' = ข้าม worker/replica
+SCRAPE_LOCK_BACKEND = os.getenv('SCRAPE_LOCK_BACKEND', 'local')
+
+# refresh เบื้องหลัง: 'inline' = scrape ใน process ของ API, 'queue' = ส่งเข้าคิวให้ worker.py
+SCRAPE_EXECUTOR = os.getenv('SCRAPE_EXECUTOR', 'inline')
+
+# state ของ rate limiter ต่อ host ต้นทาง: 'redis' = แชร์ระหว่าง worker/replica, 'local' = ภายใน process
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'redis')
+
+MONGO_URI = os.getenv('MONGO_URI', os.getenv('MONGO_URL'))
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 32))
+
+# ระยะห่างของ keep-alive ใน /dividends/events (วินาที) กัน proxy ตัด connection ที่เงียบ
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 15))
+
+# timeout ของการ ping ใน /health/ready (วินาที)
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2))
+
+# รายชื่อหุ้นจาก set.json (โหลดใหม่เฉพาะเมื่อไฟล์เปลี่ยน)
+set_universe = SymbolUniverse(os.getenv('SET_JSON_PATH', 'set.json'))
+# circuit breaker ต่อ host ต้นทาง
+circuit_breakers = CircuitBreakerRegistry.from_env()
+
+# สร้างใน connect_services() ตอน lifespan เริ่ม ไม่ใช่ตอน import
+async_redis_client = None
+response_cache: Optional[TwoTierCache] = None
+data_versions: Optional[DataVersions] = None
+negative_cache: Optional[NegativeCache] = None
+scrape_flight = None
+mongo_client = None
+db = None
+repo: Optional[DividendRepository] = None
+refresher: Optional[BackgroundRefresher] = None
+dividend_events: Optional[DividendEventHub] = None
+job_queue: Optional[JobQueue] = None
+
+STARTED_AT = time.time()
+# สถานะของงานตอน startup ที่ทำเบื้องหลัง (รายงานใน /health/ready)
+startup_state = {'database_setup': 'pending', 'browser_pool': 'lazy'}
+
+
+def connect_services() -> None:
+    """
+    สร้าง client ของ Redis / MongoDB และ object ที่ใช้ client เหล่านั้น
+    ทั้งสอง client ต่อ server ตอนใช้งานครั้งแรก ถ้า server ล่ม startup จึงไม่ค้าง (ดู /health/ready)
+    """
+    global async_redis_client, response_cache, data_versions, negative_cache, scrape_flight
+    global mongo_client, db, repo, refresher, dividend_events, job_queue
+    import redis.asyncio as aioredis
+    from pymongo import MongoClient
+
+    async_redis_client = aioredis.Redis(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
+        username=os.getenv('REDIS_USERNAME', 'default'),
+        password=os.getenv('REDIS_PASSWORD', None)
+    )
+    # read-through cache ของ response: LRU ใน process (อายุสั้น) -> Redis (CACHE_EXPIRY)
+    response_cache = TwoTierCache(
+        async_redis_client,
+        ttl=CACHE_EXPIRY,
+        local_ttl=float(os.getenv('LOCAL_CACHE_TTL', 30)),
+        local_maxsize=int(os.getenv('LOCAL_CACHE_SIZE', 1024)),
+    )
+    # ตัวนับ version ต่อ collection สำหรับ ETag / Last-Modified (conditional GET)
+    data_versions = DataVersions(async_redis_client)
+    # ผลลัพธ์ที่ล้มเหลว (symbol ไม่มี / ต้นทางล่ม)
+    negative_cache = NegativeCache.from_env(async_redis_client)
+    if SCRAPE_LOCK_BACKEND == 'redis':
+        scrape_flight = RedisSingleFlight(
+            async_redis_client,
+            lock_ttl=float(os.getenv('SCRAPE_LOCK_TTL', 60)),
+            dumps=encode_json,
+            loads=decode_json,
+        )
+    else:
+        scrape_flight = SingleFlight()
+    if RATE_LIMIT_BACKEND == 'redis':
+        panphol_scraper.limiter.share_via(async_redis_client)
+
+    mongo_client = MongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        connect=False,
+        event_listeners=[MongoCommandMetrics()]
+    )
+    db = mongo_client['dividend_db']
+    # ทุก query ของ handler ผ่าน repo (รันใน thread pool ไม่ block event loop)
+    repo = DividendRepository(db, max_workers=MONGO_MAX_POOL_SIZE)
+    # คิวงาน scrape ที่ worker.py (กี่ process / เครื่องก็ได้) หยิบไปทำ
+    job_queue = JobQueue.from_env(async_redis_client)
+    if SCRAPE_EXECUTOR == 'queue':
+        background_scrape = lambda s: job_queue.enqueue(PANPHOL_JOB, {'symbol': s}, dedup=s)
+    else:
+        background_scrape = lambda s: scrape_flight.do(s, lambda: scrape_panphol(s))
+    # refresher เบื้องหลังของ symbol ที่ติดตาม (collection symbols + set.json)
+    refresher = BackgroundRefresher.from_env(repo, set_universe, background_scrape)
+    # push ปันผลใหม่ / เปลี่ยนแปลงให้ /dividends/events (change stream หรือ Redis pub/sub)
+    dividend_events = DividendEventHub.from_env(db['dividends'], async_redis_client)
+
+
+async def prepare_database(retry_interval: float = 30.0) -> None:
+    """
+    สร้าง index / migrate ข้อมูลเบื้องหลัง ลองใหม่เป็นระยะจนกว่า MongoDB จะพร้อม
+    """
+    while True:
+        try:
+            await repo.run(reconcile_indexes, db)
+            if os.getenv('MIGRATE_ON_STARTUP', '1') != '0':
+                typed = await repo.run(migrate_typed_fields, db['dividends'])
+                summary = await repo.run(ensure_summary, db)
+                if typed['updated'] or summary['rebuilt']:
+                    # response ที่ cache ไว้ระหว่างนี้ (เช่น summary ว่างก่อน rebuild) ใช้ไม่ได้แล้ว
+                    await response_cache.invalidate(all_dividend_cache_prefixes())
+                    await data_versions.bump(DIVIDENDS_VERSION)
+            startup_state['database_setup'] = 'ok'
+            return
+        except Exception as e:
+            startup_state['database_setup'] = f'error: {e}'
+            logger.error("Cannot prepare MongoDB (indexes / migrations), retrying in %.0fs: %s", retry_interval, e)
+            await asyncio.sleep(retry_interval)
+
+
+async def prestart_browser_pool() -> None:
+    startup_state['browser_pool'] = 'starting'
+    try:
+        await browser_pool.start()
+        startup_state['browser_pool'] = 'ok'
+    except Exception as e:
+        startup_state['browser_pool'] = f'error: {e}'
+        logger.error("Cannot start browser pool: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_services()
+    tasks = [asyncio.create_task(prepare_database())]
+    if os.getenv('BROWSER_POOL_PRESTART', '0') == '1':
+        tasks.append(asyncio.create_task(prestart_browser_pool()))
+    refresher.start()
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await close_services()
+
+
+async def close_services() -> None:
+    await refresher.stop()
+    await dividend_events.stop()
+    await panphol_scraper.close()
+    await browser_pool.close()
+    await async_redis_client.close()
+    repo.close()
+    mongo_client.close()
+
+app = FastAPI(title="Thai Stock Dividend API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -29,21 +229,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Redis configuration from environment variables
-redis_client = redis.Redis(
-    host=os.getenv('REDIS_HOST', 'redis'),
-    port=int(os.getenv('REDIS_PORT', 6379)),
-    db=int(os.getenv('REDIS_DB', 0)),
-    username=os.getenv('REDIS_USERNAME', 'default'),
-    password=os.getenv('REDIS_PASSWORD', None)
-)
-CACHE_EXPIRY = int(os.getenv('CACHE_EXPIRY', 300))  # 5 minutes in seconds
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # ใช้ path template ของ route (ไม่ใช่ URL จริง) เพื่อไม่ให้ label บวม
+        route = request.scope.get('route')
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, getattr(route, 'path', 'unmatched'), str(status)
+        ).observe(time.perf_counter() - started)
 
-MONGO_URI = os.getenv('MONGO_URI', os.getenv('MONGO_URL'))
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client['dividend_db']
-dividends_collection = db['dividends']
-SYMBOLS_COLLECTION = db['symbols']
+# ตัวนับที่มีอยู่แล้วในแต่ละ module -> /metrics (อ่านตอน scrape จึงใช้ object ที่สร้างใน lifespan ได้)
+BROWSER_PAGES_IN_USE.set_function(lambda: browser_pool.in_use)
+DIVIDEND_EVENT_SUBSCRIBERS.set_function(lambda: dividend_events.subscribers if dividend_events else 0)
+stats_collector.add(
+    'response_cache_lookups', 'Response cache lookups by result', 'result',
+    lambda: response_cache.stats() if response_cache else {}, ('local_hits', 'redis_hits', 'misses')
+)
+stats_collector.add(
+    'negative_cache_events', 'Negative cache hits and stored failures', 'event',
+    lambda: negative_cache.stats() if negative_cache else {}, ('hits', 'stored')
+)
+stats_collector.add(
+    'dividend_events', 'Dividend events read from the source, delivered to subscribers and subscriber overflows', 'event',
+    lambda: dividend_events.stats() if dividend_events else {}, ('published', 'delivered', 'overflows')
+)
+stats_collector.add(
+    'panphol_scrapes', 'Panphol scrapes by path and HTTP fast-path failures', 'path',
+    panphol_scraper.stats, ('http', 'browser', 'http_fallbacks', 'http_errors')
+)
+stats_collector.add(
+    'panphol_transfer_bytes', 'Bytes downloaded from panphol by the HTTP fast path and by Chromium (all resources)', 'path',
+    lambda: {
+        'http': panphol_scraper.counters['http_bytes'],
+        'browser': (browser_pool.resource_policy.totals['bytes'] if browser_pool.resource_policy else 0),
+    },
+    ('http', 'browser')
+)
+stats_collector.add(
+    'browser_resources', 'Chromium requests seen by the resource policy, blocked requests and bytes loaded', 'kind',
+    lambda: browser_pool.resource_policy.snapshot() if browser_pool.resource_policy else {}, ('requests', 'blocked', 'bytes')
+)
 
 class DividendRecord(BaseModel):
     symbol: str = Field(..., example="BANPU")
@@ -54,13 +285,30 @@ class DividendRecord(BaseModel):
     xd_date: str = Field(..., example="10/09/67")
     pay_date: str = Field(..., example="26/09/67")
     type: str = Field(..., example="เงินปันผล")
-    scraped_at: float = Field(..., example=1718000000)
+    scraped_at: float = Field(..., example=1718000000, description="เวลาที่พบแถวนี้ครั้งแรก (ไม่เปลี่ยนเมื่อ scrape ซ้ำ)")
+    amount_value: Optional[float] = Field(None, example=0.18)
+    yield_value: Optional[float] = Field(None, example=3.05)
+    xd_date_utc: Optional[datetime] = Field(None, example="2024-09-10T00:00:00")
+    pay_date_utc: Optional[datetime] = Field(None, example="2024-09-26T00:00:00")
 
 class DividendResponse(BaseModel):
     symbol: str
     dividends: list[DividendRecord]
     timestamp: float
 
+class DividendPage(DividendResponse):
+    next_cursor: Optional[str] = Field(None, description="มีเฉพาะเมื่อส่ง limit / cursor")
+
+class BatchRequest(BaseModel):
+    symbols: list[str] = Field(..., max_length=MAX_BATCH_SYMBOLS, example=["PTT", "BANPU"])
+    force: int = Field(0, example=0)
+
+class CalendarJobRequest(BaseModel):
+    year: Optional[int] = Field(None, example=2024, description="ค.ศ. (ไม่ระบุ = เดือนปัจจุบัน)")
+    month: Optional[int] = Field(None, ge=1, le=12, example=10)
+    months: int = Field(1, ge=1, le=12, description="จำนวนเดือนต่อเนื่องนับจาก year/month")
+    force: int = Field(0, example=0, description="1 = เขียนลง DB แม้เนื้อหาตรงกับ fingerprint เดิม")
+
 class SummaryItem(BaseModel):
     symbol: str
     latest_dividend: DividendRecord
@@ -70,140 +318,294 @@ class SummaryResponse(BaseModel):
     year: str
     timestamp: float
 
-def normalize_date(date: str) -> Optional[datetime]:
-    def parse(dstr):
+class SoonResponse(BaseModel):
+    soon: list[DividendRecord]
+    timestamp: float
+    today: str
+    next_cursor: Optional[str] = None
+
+# model ด้านบนใช้เป็น schema ของ OpenAPI เท่านั้น: document อ่านด้วย DIVIDEND_PROJECTION (field ตรงกับ
+# DividendRecord) และแปลงชนิดไว้แล้วตอน ingest จึงเขียนเป็น JSON ตรง ๆ ไม่สร้าง model ใหม่ทุกแถว
+def dividend_response(result: dict) -> dict:
+    return {'symbol': result['symbol'], 'dividends': result['dividends'], 'timestamp': result['timestamp']}
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type='application/json')
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """
+    ตรวจ If-None-Match (ถ้ามี) ไม่เช่นนั้นใช้ If-Modified-Since
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+        return '*' in tags or etag.removeprefix('W/') in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
         try:
-            d, m, y = dstr.split('/')
-            y = int(y)
-            if y < 100:
-                y += 2500           # สมมติรับปีเป็น 2 หลัก -> พ.ศ.
-            if y > 2200:            # แปลง พ.ศ. -> ค.ศ.
-                y -= 543
-            when = datetime(y, int(m), int(d), tzinfo=UTC)
-
-            # กรองปีเก่าออก
-            if when.year < datetime.now(UTC).year - 1:
-                return None
-            return when
-        except Exception:
-            return None
-    
-    return parse(date)
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+async def conditional_json(
+    request: Request,
+    validator: Optional[tuple[str, float]],
+    load: Callable[[], Awaitable[bytes]]
+) -> Response:
+    """
+    ตอบ 304 ทันทีถ้า validator (etag, last_modified) ตรงกับของ client โดยไม่แตะ cache / MongoDB
+    validator เป็น None (อ่าน version จาก Redis ไม่ได้) = ตอบแบบปกติโดยไม่มี ETag
+    """
+    if validator is None:
+        return json_response(await load())
+    etag, last_modified = validator
+    headers = {
+        'ETag': etag,
+        'Last-Modified': formatdate(last_modified, usegmt=True),
+        'Cache-Control': f'public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate',
+    }
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response = json_response(await load())
+    response.headers.update(headers)
+    return response
+
+async def dividends_validator(*parts) -> tuple[Optional[tuple[str, float]], int]:
+    """
+    คืนค่า (validator, version) ของข้อมูลปันผล version ต้องอยู่ใน cache key ของ body ที่ส่งคู่กับ ETag นี้
+    อ่าน Redis ไม่ได้ = (None, 0)
+    """
+    versions = await data_versions.get(DIVIDENDS_VERSION)
+    if versions is None:
+        return None, 0
+    version, changed_at = versions[DIVIDENDS_VERSION]
+    return (make_etag(DIVIDENDS_VERSION, version, *parts), changed_at), version
 
+def ndjson_response(docs) -> StreamingResponse:
+    async def lines():
+        async for doc in docs:
+            yield encode_json(doc) + b'\n'
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
 
 @app.get(
     "/dividends-panphor",
-    response_model=DividendResponse,
+    response_model=DividendPage,
     summary="Get dividend from Panphol.com (with MongoDB cache)",
-    description="ดึงข้อมูลปันผลจาก https://aio.panphol.com/stock/{symbol}/dividend พร้อม cache ใน MongoDB"
+    description="ดึงข้อมูลปันผลจาก https://aio.panphol.com/stock/{symbol}/dividend พร้อม cache ใน MongoDB (header X-Scrape-Path บอกว่า scrape ผ่าน http หรือ browser)"
 )
 async def get_dividends_panphor(
     symbol: str = Query(..., description="Stock symbol, e.g. BANPU"),
-    force: int = Query(0, description="Force scraping if 1, otherwise use cache if data is recent")
-) -> dict:
+    force: int = Query(0, description="Force scraping if 1, otherwise use cache if data is recent"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size of the history; response includes next_cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    stream: int = Query(0, description="Stream the history as NDJSON if 1")
+) -> Response:
     symbol_upper = symbol.upper()
+    response = await serve_dividends_panphor(symbol_upper, force, limit, cursor, stream)
+    # บันทึกเฉพาะ symbol ที่ส่งข้อมูลได้ (symbol ที่ไม่มีจริง / พิมพ์ผิดได้ 404 ก่อนถึงตรงนี้ จึงไม่ถูก refresh ซ้ำ)
+    refresher.record_request(symbol_upper)
+    return response
+
+async def serve_dividends_panphor(
+    symbol_upper: str, force: int, limit: Optional[int], cursor: Optional[str], stream: int
+) -> Response:
+    paged = limit is not None or cursor is not None or bool(stream)
+    if force:
+        # request พร้อมกันของ symbol เดียวกันจะรอผลจากการ scrape ครั้งเดียว
+        result = await scrape_flight.do(symbol_upper, lambda: scrape_panphol(symbol_upper))
+        if not paged:
+            response = json_response(await scraped_body(symbol_upper, result))
+            for k, v in result.get('ingest', {}).items():
+                response.headers[f'X-Ingest-{k.capitalize()}'] = str(v)
+            response.headers['X-Scrape-Path'] = result.get('scrape_path', '')
+            response.headers['X-Scrape-Content'] = result.get('content', '')
+            return response
+    elif not paged:
+        return json_response(await panphor_body(symbol_upper, force=False))
+    elif cursor is None:
+        # หน้าแรก: ให้ path ปกติจัดการ scrape ครั้งแรก / refresh ข้อมูลเก่าก่อน (hit cache แทบทุกครั้ง)
+        await panphor_body(symbol_upper, force=False)
+    if stream:
+        return ndjson_response(repo.iter_dividends_by_symbol(symbol_upper))
+    try:
+        docs, next_cursor = await repo.page_dividends_by_symbol(symbol_upper, limit or DEFAULT_PAGE_SIZE, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return json_response(encode_json({
+        'symbol': symbol_upper,
+        'dividends': docs,
+        'timestamp': datetime.now(UTC).timestamp(),
+        'next_cursor': next_cursor
+    }))
+
+async def scraped_body(symbol_upper: str, result: dict) -> bytes:
+    if 'dividends' not in result:
+        # เนื้อหาไม่เปลี่ยน: body ที่ cache ไว้ไม่ถูก invalidate จึงยังใช้ได้ (miss = อ่านจาก DB ตามปกติ)
+        return await response_cache.get_or_load(panphor_key(symbol_upper), lambda: load_dividends_panphor(symbol_upper))
+    return encode_json(dividend_response(result))
+
+async def panphor_body(symbol_upper: str, force: bool) -> bytes:
+    if force:
+        result = await scrape_flight.do(symbol_upper, lambda: scrape_panphol(symbol_upper))
+        return await scraped_body(symbol_upper, result)
+    return await response_cache.get_or_load(
+        panphor_key(symbol_upper),
+        lambda: load_dividends_panphor(symbol_upper)
+    )
+
+@app.post(
+    "/dividends-panphor/batch",
+    summary="Get dividends of many symbols, streamed as NDJSON",
+    description="ดึงข้อมูลปันผลหลาย symbol พร้อมกัน (จำกัดจำนวนที่ scrape พร้อมกัน) ส่งผลทีละบรรทัด (NDJSON) ตามลำดับที่เสร็จ",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}}
+)
+async def post_dividends_panphor_batch(data: BatchRequest) -> StreamingResponse:
+    symbols = list(dict.fromkeys(s.strip().upper() for s in data.symbols if s.strip()))
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def fetch(symbol_upper: str) -> bytes:
+        try:
+            async with semaphore:
+                body = await panphor_body(symbol_upper, bool(data.force))
+            refresher.record_request(symbol_upper)
+            return b'{"symbol":' + encode_json(symbol_upper) + b',"status":"ok","data":' + body + b'}\n'
+        except HTTPException as e:
+            error = {'symbol': symbol_upper, 'status': 'error', 'status_code': e.status_code, 'detail': e.detail}
+        except Exception as e:
+            error = {'symbol': symbol_upper, 'status': 'error', 'status_code': 500, 'detail': str(e)}
+        return encode_json(error) + b'\n'
+
+    async def stream():
+        tasks = [asyncio.ensure_future(fetch(s)) for s in symbols]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            # client ตัดการเชื่อมต่อ -> ยกเลิกงานที่ยังไม่เสร็จ
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
+
+async def load_dividends_panphor(symbol_upper: str) -> bytes:
     now = datetime.now(UTC)
-    one_month_ago = now - timedelta(days=30)
-    if not force:
-        recent_dividends = list(dividends_collection.find({
+    dividends, state = await asyncio.gather(
+        repo.find_dividends_by_symbol(symbol_upper),
+        repo.get_scrape_state(symbol_upper)
+    )
+    if dividends:
+        # scraped_at = เวลาที่พบแถวครั้งแรก ความสดจริงอยู่ใน scrape_state ใช้ scraped_at เฉพาะ symbol ที่ยังไม่มี state
+        # (เช่น มาจาก xd_calendar_set.py) ซึ่ง refresh เบื้องหลังจะสร้าง state ให้
+        last_scraped_at = state.get('last_scraped_at') if state else max(d.get('scraped_at', 0) for d in dividends)
+        if refresher.is_stale(last_scraped_at, now.timestamp()):
+            # stale-while-revalidate: ส่งข้อมูลเดิมไปก่อน แล้ว scrape ใหม่เบื้องหลัง
+            refresher.request_refresh(symbol_upper)
+        result = {
             'symbol': symbol_upper,
-            'scraped_at': { '$gte': one_month_ago.timestamp() }
-        }, {'_id': 0}))
-        if recent_dividends:
+            'dividends': dividends,
+            'timestamp': now.timestamp()
+        }
+    else:
+        result = await scrape_flight.do(symbol_upper, lambda: scrape_panphol(symbol_upper))
+        # ไม่มีแถวใน DB: scrape จะ "unchanged" ได้เฉพาะตารางที่ว่างอยู่แล้ว (content_rows = 0)
+        result.setdefault('dividends', [])
+    return encode_json(dividend_response(result))
+
+async def scrape_panphol(symbol_upper: str) -> dict:
+    now = datetime.now(UTC)
+    # symbol ที่เพิ่งล้มเหลว / ต้นทางล่ม -> ตอบทันทีโดยไม่ scrape ซ้ำ
+    negative = await negative_cache.get(symbol_upper)
+    if negative:
+        raise HTTPException(status_code=negative['status_code'], detail=negative['detail'])
+    breaker = circuit_breakers.get(PANPHOL_HOST)
+    try:
+        trial = breaker.check()
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': str(int(e.retry_after) + 1)})
+    try:
+        rows, path = await panphol_scraper.scrape(symbol_upper)
+        breaker.record_success()
+    except BasketNotFound as e:
+        breaker.record_success()
+        await negative_cache.put(symbol_upper, NOT_FOUND, 404, str(e))
+        raise HTTPException(status_code=404, detail=str(e))
+    except UpstreamThrottled as e:
+        # limiter หยุดส่งไป host นี้ชั่วคราวแล้ว (ไม่ใส่ negative cache เพราะไม่เกี่ยวกับ symbol)
+        breaker.record_failure()
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': str(int(e.retry_after) + 1)})
+    except RateLimitTimeout as e:
+        # คิวของ limiter ฝั่งเราเต็ม (เช่น batch / force พร้อมกันจำนวนมาก) ต้นทางไม่ได้ผิดปกติ -> ไม่แตะ breaker
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': str(int(e.retry_after) + 1)})
+    except Exception as e:
+        breaker.record_failure()
+        if is_timeout_error(e):
+            detail = f"Timeout while scraping: {str(e)}"
+        else:
+            detail = f"Error while scraping: {str(e)}"
+        await negative_cache.put(symbol_upper, UPSTREAM_ERROR, 500, detail)
+        raise HTTPException(status_code=500, detail=detail)
+    finally:
+        # ครั้งลองของ half_open ที่ถูก cancel (client ตัดการเชื่อมต่อ / shutdown) ไม่ผ่าน except ข้างบน
+        if trial:
+            breaker.release_trial()
+    # replica อื่นอาจบันทึกความล้มเหลวของ symbol นี้ไว้ระหว่างที่ scrape อยู่ -> ข้อมูลใหม่กว่าจึงล้างทิ้ง
+    await negative_cache.clear(symbol_upper)
+    fingerprint = content_fingerprint(rows)
+    with observe_stage('panphol', 'fingerprint'):
+        state = await repo.get_scrape_state(symbol_upper)
+    if state and state.get('content_hash') == fingerprint:
+        with observe_stage('panphol', 'count'):
+            stored = await repo.count_panphol_dividends(symbol_upper)
+        # ถ้าแถวของ panphol ใน DB น้อยกว่าตอนบันทึก fingerprint (ถูกลบไปภายหลัง) ให้เขียนใหม่ทั้งชุดตามปกติ
+        # (ไม่นับแถวจากปฏิทิน SET ซึ่ง fingerprint ไม่ครอบ)
+        if stored >= state.get('content_rows', 0):
+            SCRAPE_CONTENT_CHECKS.labels('panphol', 'unchanged').inc()
+            logger.info("Scraped %s via %s (%d rows, unchanged)", symbol_upper, path, len(rows))
+            with observe_stage('panphol', 'mark_scraped'):
+                await repo.mark_scraped(symbol_upper, now.timestamp())
+            # ไม่อ่าน history: ผู้เรียกที่ต้องใช้ body เอาจาก response cache (ดู scraped_body)
             return {
                 'symbol': symbol_upper,
-                'dividends': recent_dividends,
-                'timestamp': now.timestamp()
+                'timestamp': now.timestamp(),
+                'ingest': {'inserted': 0, 'updated': 0, 'unchanged': state.get('content_rows', 0)},
+                'scrape_path': path,
+                'content': 'unchanged'
             }
-    url = f"https://aio.panphol.com/stock/{symbol_upper}/dividend"
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--no-sandbox', '--disable-setuid-sandbox']
-        )
-        context = await browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    SCRAPE_CONTENT_CHECKS.labels('panphol', 'changed').inc()
+    logger.info("Scraped %s via %s (%d rows)", symbol_upper, path, len(rows))
+    with observe_stage('panphol', 'parse'):
+        dividends = basket_dividends(rows, symbol_upper, now.timestamp())
+    with observe_stage('panphol', 'upsert'):
+        ingest = await repo.upsert_dividends(dividends)
+    with observe_stage('panphol', 'mark_scraped'):
+        await repo.mark_scraped(
+            symbol_upper, now.timestamp(), content_hash=fingerprint,
+            content_rows=ingest['inserted'] + ingest['updated'] + ingest['unchanged']
         )
-        page = await context.new_page()
+    if ingest['changed_symbols']:
+        await response_cache.invalidate(dividend_cache_prefixes([symbol_upper]))
+        await data_versions.bump(DIVIDENDS_VERSION)
         try:
-            await page.goto(url, timeout=30000)
-            await page.wait_for_selector('#basket', timeout=15000)
-            content = await page.content()
-            soup = BeautifulSoup(content, 'html.parser')
-            table = soup.find('table', id='basket')
-            if not table:
-                raise HTTPException(status_code=404, detail='Dividend table not found')
-            tbody = table.find('tbody')
-            if not tbody:
-                raise HTTPException(status_code=404, detail='No table body found')
-            rows = tbody.find_all('tr')
-            dividends = []
-            for row in rows:
-                cols = [col.get_text(strip=True) for col in row.find_all(['td', 'th'])]
-                if len(cols) < 7:
-                    continue
-                xd_date_utc = normalize_date(cols[4])
-                pay_date_utc = normalize_date(cols[5])
-                dividend = {
-                    'symbol': symbol_upper,
-                    'year': cols[0],
-                    'quarter': cols[1],
-                    'yield_percent': cols[2],
-                    'amount': cols[3],
-                    'xd_date': cols[4],
-                    'pay_date': cols[5],
-                    'type': cols[6],
-                    'scraped_at': now.timestamp(),
-                    'xd_date_utc': xd_date_utc if xd_date_utc else None,
-                    'pay_date_utc': pay_date_utc if pay_date_utc else None
-                }
-                dividends.append(dividend)
-            new_dividends = []
-            for d in dividends:
-                exists = dividends_collection.find_one({
-                    'symbol': d['symbol'],
-                    'year': d['year'],
-                    'quarter': d['quarter'],
-                    'xd_date': d['xd_date'],
-                    'amount': d['amount'],
-                    'type': d['type'],
-                    'xd_date_utc': d['xd_date_utc'],
-                    'pay_date_utc': d['pay_date_utc']
-                })
-                if not exists:
-                    new_dividends.append(d)
-            if new_dividends:
-                dividends_collection.insert_many(new_dividends)
-            all_dividends = list(dividends_collection.find(
-                {'symbol': symbol_upper},
-                {
-                    '_id': 0,
-                    'symbol': 1,
-                    'year': 1,
-                    'quarter': 1,
-                    'yield_percent': 1,
-                    'amount': 1,
-                    'xd_date': 1,
-                    'pay_date': 1,
-                    'type': 1,
-                    'scraped_at': 1,
-                    'xd_date_utc': 1,
-                    'pay_date_utc': 1
-                }
-            ))
-            return {
-                'symbol': symbol_upper,
-                'dividends': all_dividends,
-                'timestamp': now.timestamp()
-            }
-        except PlaywrightTimeoutError as e:
-            raise HTTPException(status_code=500, detail=f"Timeout while scraping: {str(e)}")
+            await publish_dividend_events(async_redis_client, ingest['changes'])
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error while scraping: {str(e)}")
-        finally:
-            await context.close()
-            await browser.close()
+            logger.warning("Cannot publish dividend events for %s: %s", symbol_upper, e)
+    with observe_stage('panphol', 'find'):
+        all_dividends = await repo.find_dividends_by_symbol(symbol_upper)
+    return {
+        'symbol': symbol_upper,
+        'dividends': all_dividends,
+        'timestamp': now.timestamp(),
+        'ingest': {k: ingest[k] for k in ('inserted', 'updated', 'unchanged')},
+        'scrape_path': path,
+        'content': 'changed'
+    }
 
 @app.get(
     "/dividends-summary",
@@ -212,103 +614,294 @@ async def get_dividends_panphor(
     description="สรุปหุ้นทั้งหมดใน set.json พร้อมข้อมูลปันผลล่าสุดของแต่ละหุ้นในปีที่เลือก"
 )
 async def get_dividends_summary(
+    request: Request,
     year: Optional[str] = Query(None, description="Year in BE (พ.ศ.), e.g. 2567")
-) -> dict:
-    # Load symbols from set.json
-    with open("set.json", "r", encoding="utf-8") as f:
-        symbols = pyjson.load(f)["symbols"]
-    now = datetime.now(UTC)
+) -> Response:
     if year is None:
-        current_year = str(now.year + 543)  # Thai year (พ.ศ.)
+        current_year = str(datetime.now(UTC).year + 543)  # Thai year (พ.ศ.)
     else:
         current_year = str(year)
-    summary = []
-    for symbol in symbols:
-        # Find all dividends for this symbol in the selected year
-        records = list(dividends_collection.find({
-            'symbol': symbol,
-            'year': current_year
-        }, {'_id': 0}))
-        if not records:
-            continue
-        # Find the latest by month (from xd_date or pay_date)
-        def extract_month(rec):
-            # Try xd_date first, fallback to pay_date
-            for key in ['xd_date', 'pay_date']:
-                try:
-                    # Expect format dd/mm/yy
-                    parts = rec[key].split('/')
-                    if len(parts) >= 2:
-                        return int(parts[1])
-                except Exception:
-                    continue
-            return 0
-        latest = max(records, key=extract_month)
-        summary.append({
-            'symbol': symbol,
-            'latest_dividend': latest
-        })
-    return {
+    universe_version = set_universe.version
+    validator, data_version = await dividends_validator(current_year, universe_version)
+    if validator is not None:
+        # รายชื่อหุ้นใน set.json เปลี่ยนก็ถือว่า summary เปลี่ยน
+        validator = (validator[0], max(validator[1], universe_version / 1e9))
+    return await conditional_json(request, validator, lambda: response_cache.get_or_load(
+        summary_key(current_year, universe_version, data_version),
+        lambda: load_dividends_summary(current_year)
+    ))
+
+async def load_dividends_summary(current_year: str) -> bytes:
+    now = datetime.now(UTC)
+    summary = await repo.find_latest_dividends(current_year, set_universe.symbols())
+    return encode_json({
         'summary': summary,
         'year': current_year,
         'timestamp': now.timestamp()
-    }
+    })
 
 @app.get("/symbols", summary="Get all stock symbols from set.json", description="ดึงรายชื่อหุ้นทั้งหมดจาก set.json")
-async def get_symbols() -> dict:
-    with open("set.json", "r", encoding="utf-8") as f:
-        symbols = pyjson.load(f)["symbols"]
-    return {"symbols": symbols}
+async def get_symbols(request: Request) -> Response:
+    version = set_universe.version
+
+    async def load() -> bytes:
+        return encode_json({"symbols": set_universe.symbols()})
+
+    return await conditional_json(request, (make_etag('set.json', version), version / 1e9), load)
 
-@app.get("/dividends/soon", summary="Get stocks with upcoming XD or dividend payment date", description="แสดงหุ้นที่ใกล้จะขึ้น XD หรือจ่ายปันผล (อิงจาก pay_date_utc >= วันนี้)")
-async def get_dividends_soon() -> dict:
+@app.get("/dividends/soon", response_model=SoonResponse, summary="Get stocks with upcoming XD or dividend payment date", description="แสดงหุ้นที่ใกล้จะขึ้น XD หรือจ่ายปันผล (อิงจาก pay_date_utc >= วันนี้) รองรับแบ่งหน้าด้วย limit/cursor และ stream=1 (NDJSON)")
+async def get_dividends_soon(
+    request: Request,
+    symbol: Optional[str] = Query(None, description="Only this symbol, e.g. PTT"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; response includes next_cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    stream: int = Query(0, description="Stream every row as NDJSON if 1")
+) -> Response:
+    symbol_upper = symbol.upper() if symbol else None
+    if stream:
+        today = datetime.now(UTC)
+        return ndjson_response(repo.iter_upcoming_dividends(today, symbol_upper))
+    # รายการเปลี่ยนเมื่อข้อมูลปันผลเปลี่ยน หรือเมื่อขึ้นวันใหม่ (UTC)
+    today = datetime.now(UTC).date()
+    validator, data_version = await dividends_validator(today.isoformat())
+    if limit is None and cursor is None:
+        key = soon_key(f"{today.isoformat()}/{symbol_upper or ''}", data_version)
+        loader = lambda: load_dividends_soon(symbol_upper)
+    else:
+        key = soon_key(f"{today.isoformat()}/{symbol_upper or ''}/{limit}/{cursor or ''}", data_version)
+        loader = lambda: load_dividends_soon_page(symbol_upper, limit or DEFAULT_PAGE_SIZE, cursor)
+    if validator is not None:
+        start_of_day = datetime(today.year, today.month, today.day, tzinfo=UTC).timestamp()
+        validator = (validator[0], max(validator[1], start_of_day))
+    try:
+        return await conditional_json(request, validator, lambda: response_cache.get_or_load(key, loader))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def load_dividends_soon(symbol_upper: Optional[str] = None) -> bytes:
+    today = datetime.now(UTC)
+
+    docs = await repo.find_upcoming_dividends(today, symbol_upper)
+
+    return encode_json({"soon": docs, "timestamp": today.timestamp(), "today": today.strftime("%Y-%m-%d %H:%M:%S")})
+
+async def load_dividends_soon_page(symbol_upper: Optional[str], limit: int, cursor: Optional[str]) -> bytes:
     today = datetime.now(UTC)
+    docs, next_cursor = await repo.page_upcoming_dividends(today, limit, cursor, symbol_upper)
+    return encode_json({
+        "soon": docs,
+        "next_cursor": next_cursor,
+        "timestamp": today.timestamp(),
+        "today": today.strftime("%Y-%m-%d %H:%M:%S")
+    })
 
-    cursor = dividends_collection.find(
-        {
-            "type": "เงินปันผล",
-            "pay_date_utc": {"$gte": today}
-        },
-        {
-            '_id': 0,
-            'symbol': 1,
-            'year': 1,
-            'quarter': 1,
-            'yield_percent': 1,
-            'amount': 1,
-            'xd_date': 1,
-            'pay_date': 1,
-            'type': 1,
-            'scraped_at': 1,
-            'xd_date_utc': 1,
-            'pay_date_utc': 1
+@app.get(
+    "/dividends/analytics",
+    summary="Trailing-12-month dividend analytics for every symbol in set.json",
+    description="ปันผลย้อนหลัง 12 เดือน (ยอดรวม จำนวนครั้ง yield) วัน XD ถัดไป (ประกาศแล้วหรือประมาณจากรอบจ่าย) และอันดับตาม yield"
+)
+async def get_dividends_analytics(
+    request: Request,
+    top: Optional[int] = Query(None, ge=1, description="Only the first N ranked symbols")
+) -> Response:
+    today = datetime.now(UTC).date().isoformat()
+    universe_version = set_universe.version
+    validator, data_version = await dividends_validator('analytics', today, universe_version, top)
+
+    async def load() -> bytes:
+        body = await response_cache.get_or_load(
+            analytics_key(today, universe_version, data_version), load_dividends_analytics, ttl=ANALYTICS_CACHE_TTL
+        )
+        if top is None:
+            return body
+        content = decode_json(body)
+        content['analytics'] = content['analytics'][:top]
+        return encode_json(content)
+
+    return await conditional_json(request, validator, load)
+
+async def load_dividends_analytics() -> bytes:
+    # pandas / numpy โหลดเฉพาะเมื่อมีการเรียก analytics
+    from analytics import ANALYTICS_FIELDS, compute_analytics, history_since
+
+    now = datetime.now(UTC)
+    symbols = set_universe.symbols()
+    columns = await repo.find_dividend_columns(symbols, history_since(now), ANALYTICS_FIELDS)
+    # pandas ใช้ CPU -> รันนอก event loop
+    rows = await asyncio.to_thread(compute_analytics, columns, symbols, now)
+    return encode_json({"analytics": rows, "rows": len(columns['symbol']), "timestamp": now.timestamp()})
+
+@app.get(
+    "/dividends/events",
+    summary="Live push of new and changed dividends (Server-Sent Events)",
+    description="ส่งปันผลที่เพิ่ม / เปลี่ยนทันทีที่บันทึก (event: dividend) แทนการ poll /dividends/soon กรองด้วย symbol และช่วงวัน XD / วันจ่าย",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}}
+)
+async def get_dividend_events(
+    symbol: Optional[str] = Query(None, description="Comma-separated symbols, e.g. PTT,BANPU"),
+    since: Optional[date] = Query(None, description="Only rows whose XD or pay date is on or after this date"),
+    until: Optional[date] = Query(None, description="Only rows whose XD or pay date is on or before this date"),
+    days: Optional[int] = Query(None, ge=0, description="Only rows whose XD or pay date is within N days from today")
+) -> StreamingResponse:
+    symbols = {s.strip().upper() for s in symbol.split(',') if s.strip()} if symbol else None
+    subscription = dividend_events.subscribe(symbols=symbols, since=since, until=until, days=days)
+    return StreamingResponse(
+        sse_stream(dividend_events, subscription, heartbeat=SSE_HEARTBEAT),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.post(
+    "/jobs/panphol",
+    status_code=202,
+    summary="Queue panphol scrapes for worker.py",
+    description="ส่ง symbol เข้าคิวให้ worker scrape (symbol ที่มีงานค้างอยู่แล้วได้ id เดิม) force=1 scrape แม้ข้อมูลยังใหม่"
+)
+async def post_panphol_jobs(data: BatchRequest) -> dict:
+    symbols = list(dict.fromkeys(s.strip().upper() for s in data.symbols if s.strip()))
+    jobs = []
+    for symbol_upper in symbols:
+        job_id, created = await job_queue.enqueue(
+            PANPHOL_JOB, {'symbol': symbol_upper, 'force': bool(data.force)}, dedup=symbol_upper
+        )
+        jobs.append({'symbol': symbol_upper, 'id': job_id, 'created': created})
+    return {'jobs': jobs}
+
+@app.post(
+    "/jobs/set-calendar",
+    status_code=202,
+    summary="Queue SET XD calendar months for worker.py",
+    description="ส่งเดือนของปฏิทิน XD ของ SET เข้าคิว (แทนการรัน xd_calendar_set.py เอง)"
+)
+async def post_set_calendar_jobs(data: CalendarJobRequest) -> dict:
+    now = datetime.now(UTC)
+    year, month = data.year or now.year, data.month or now.month
+    jobs = []
+    for _ in range(data.months):
+        job_id, created = await job_queue.enqueue(
+            SET_CALENDAR_JOB, {'year': year, 'month': month, 'force': bool(data.force)}, dedup=f"{year}-{month:02d}"
+        )
+        jobs.append({'year': year, 'month': month, 'id': job_id, 'created': created})
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return {'jobs': jobs}
+
+@app.get("/jobs/stats", summary="Job queue lengths", description="จำนวนงาน ready / processing / delayed (รอ retry) / dead ของแต่ละประเภท")
+async def get_job_stats() -> dict:
+    return await job_queue.stats()
+
+@app.get("/jobs/{job_id}", summary="Job status", description="สถานะงาน (queued, running, retrying, done, dead) จำนวนครั้งที่ลอง error ล่าสุด และผลลัพธ์")
+async def get_job(job_id: str) -> dict:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/diagnostics/indexes", summary="Index status and query-plan checks", description="ตรวจ index และรัน explain() ของ query แต่ละ endpoint (collection_scan = ไม่มี index รองรับ)")
+async def get_index_diagnostics(
+    symbol: str = Query('PTT', description="Symbol used in sample queries"),
+    year: Optional[str] = Query(None, description="Year in BE (พ.ศ.) used in the summary query")
+) -> dict:
+    symbols = set_universe.symbols()
+    indexes = {
+        name: await repo.run(db[name].index_information)
+        for name in ('dividends', 'symbols', 'scrape_state', SUMMARY_COLLECTION)
+    }
+    plans = await repo.run(explain_queries, db, symbol.upper(), year, symbols)
+    return {
+        'indexes': {name: sorted(info) for name, info in indexes.items()},
+        'explain': plans,
+        'collection_scans': [p['query'] for p in plans if p.get('collection_scan')],
+        'problems': {p['query']: p['problems'] for p in plans if p.get('problems')},
+    }
+
+@app.get("/scrape/stats", summary="Scrape path counters", description="จำนวนครั้งที่ scrape ผ่าน HTTP fast path / Chromium และสถานะ browser pool")
+async def get_scrape_stats() -> dict:
+    return {
+        'paths': panphol_scraper.stats(),
+        'browser_pool': browser_pool.stats(),
+        'in_flight': scrape_flight.in_flight(),
+        'refresher': refresher.stats(),
+        'negative_cache': negative_cache.stats(),
+        'circuit_breakers': circuit_breakers.stats(),
+        'rate_limits': {PANPHOL_HOST: panphol_scraper.limiter.stats()}
+    }
+
+@app.get("/health/live", summary="Liveness probe", description="process ยังตอบ request ได้ (ไม่ตรวจ MongoDB / Redis)")
+async def get_liveness() -> dict:
+    return {'status': 'ok', 'uptime': round(time.time() - STARTED_AT, 3)}
+
+async def check_mongo() -> dict:
+    # monitor ของ pymongo รู้สถานะ server อยู่แล้ว ping จริงเฉพาะเมื่อยังไม่เห็น server ที่อ่านได้
+    if mongo_client.topology_description.has_readable_server():
+        return {'status': 'ok'}
+    try:
+        await asyncio.wait_for(asyncio.to_thread(db.command, 'ping'), timeout=HEALTH_CHECK_TIMEOUT)
+        return {'status': 'ok'}
+    except Exception as e:
+        return {'status': 'error', 'detail': str(e) or type(e).__name__}
+
+async def check_redis() -> dict:
+    try:
+        await asyncio.wait_for(async_redis_client.ping(), timeout=HEALTH_CHECK_TIMEOUT)
+        return {'status': 'ok'}
+    except Exception as e:
+        return {'status': 'error', 'detail': str(e) or type(e).__name__}
+
+@app.get("/health/ready", summary="Readiness probe", description="พร้อมรับ traffic เมื่อ MongoDB และ Redis ตอบ ping (503 ถ้าไม่พร้อม)")
+async def get_readiness() -> JSONResponse:
+    mongo, redis_status = await asyncio.gather(check_mongo(), check_redis())
+    ready = mongo['status'] == 'ok' and redis_status['status'] == 'ok'
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            'status': 'ready' if ready else 'not_ready',
+            'components': {
+                'mongo': mongo,
+                'redis': redis_status,
+                'database_setup': startup_state['database_setup'],
+                'browser_pool': {'state': startup_state['browser_pool'], **browser_pool.stats()},
+            },
         }
-    ).sort("pay_date_utc", 1)
+    )
 
-    docs = list(cursor)
-    soon_list = jsonable_encoder(docs)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
 
-    return {"soon": soon_list, "timestamp": today.timestamp(), "today": today.strftime("%Y-%m-%d %H:%M:%S")}
+@app.get("/cache/stats", summary="Response cache hit/miss counters", description="สถิติ hit/miss ของ cache (LRU ใน process + Redis)")
+async def get_cache_stats() -> dict:
+    return response_cache.stats()
 
 @app.get("/symbols/db", summary="Find all symbols in MongoDB", description="ดึง symbol ทั้งหมดจาก MongoDB")
-async def get_symbols_db() -> dict:
-    symbols = list(SYMBOLS_COLLECTION.find({}, {'_id': 0, 'symbol': 1}))
-    return {"symbols": [s['symbol'] for s in symbols]}
+async def get_symbols_db(request: Request) -> Response:
+    versions = await data_versions.get(SYMBOLS_VERSION)
+    validator = None
+    if versions is not None:
+        version, changed_at = versions[SYMBOLS_VERSION]
+        validator = (make_etag(SYMBOLS_VERSION, version), changed_at)
+
+    async def load() -> bytes:
+        return encode_json({"symbols": await repo.list_symbols()})
+
+    return await conditional_json(request, validator, load)
 
 @app.post("/symbols/db", summary="Insert many symbols to MongoDB (skip existing)", description="เพิ่ม symbol หลายตัว (ถ้ามีอยู่แล้วให้ข้าม)")
 async def insert_symbols_db(data: dict = Body(..., example={"symbols": ["AAV", "BANPU"]})) -> dict:
     input_symbols = set([s.upper() for s in data.get('symbols', [])])
-    existing = set([s['symbol'] for s in SYMBOLS_COLLECTION.find({'symbol': {'$in': list(input_symbols)}}, {'symbol': 1, '_id': 0})])
-    to_insert = [{'symbol': s} for s in input_symbols if s not in existing]
-    if to_insert:
-        SYMBOLS_COLLECTION.insert_many(to_insert)
-    return {"inserted": [s['symbol'] for s in to_insert], "skipped": list(existing)}
+    inserted, skipped = await repo.insert_symbols(input_symbols)
+    if inserted:
+        await data_versions.bump(SYMBOLS_VERSION)
+    return {"inserted": inserted, "skipped": skipped}
 
 @app.delete("/symbols/db", summary="Delete many symbols from MongoDB", description="ลบ symbol หลายตัว (โดยใช้ชื่อ symbol ไม่ใช้ _id)")
 async def delete_symbols_db(data: dict = Body(..., example={"symbols": ["AAV"]})) -> dict:
     del_symbols = [s.upper() for s in data.get('symbols', [])]
-    result = SYMBOLS_COLLECTION.delete_many({'symbol': {'$in': del_symbols}})
-    return {"deleted_count": result.deleted_count, "deleted_symbols": del_symbols}
+    deleted_count = await repo.delete_symbols(del_symbols)
+    if deleted_count:
+        await data_versions.bump(SYMBOLS_VERSION)
+    return {"deleted_count": deleted_count, "deleted_symbols": del_symbols}
 
 if __name__ == "__main__":
     import uvicorn
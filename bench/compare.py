@@ -0,0 +1,46 @@
+"""
+เปรียบเทียบรายงานของ bench/run.py สองไฟล์ (ก่อน / หลัง)
+
+    python bench/compare.py bench/results/before.json bench/results/after.json
+"""
+import argparse
+import json
+
+
+def _pct(before: float, after: float) -> str:
+    if not before:
+        return '     n/a'
+    return f"{(after - before) / before * 100:+7.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two bench/run.py reports")
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta'].get('git_revision')}  after: {after['meta'].get('git_revision')}")
+    print(f"{'scenario':14s} {'c':>4s} {'rps':>19s} {'':8s} {'p95 ms':>19s} {'':8s} {'p99 ms':>19s} {'':8s}")
+    old = {(r['scenario'], r['concurrency']): r for r in before['results']}
+    for r in after['results']:
+        b = old.get((r['scenario'], r['concurrency']))
+        if b is None:
+            continue
+        cols = [f"{r['scenario']:14s} {r['concurrency']:>4d}"]
+        cols.append(f"{b['rps']:>9.1f} -> {r['rps']:>6.1f} {_pct(b['rps'], r['rps'])}")
+        for q in ('p95', 'p99'):
+            cols.append(f"{b['latency_ms'][q]:>9.1f} -> {r['latency_ms'][q]:>6.1f} {_pct(b['latency_ms'][q], r['latency_ms'][q])}")
+        print(' '.join(cols))
+    for key in ('api_peak_rss_kb', 'tree_peak_rss_kb'):
+        b, a = before['memory'].get(key), after['memory'].get(key)
+        if b and a:
+            print(f"{key}: {b} -> {a} {_pct(b, a)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+load test แบบ end-to-end ของ API โดยไม่ออกเน็ต: panphol/SET ถูกแทนด้วย bench/upstream.py
+MongoDB + Redis ใช้ของในเครื่อง (bench/docker-compose.yml) แล้วรัน uvicorn เป็น subprocess
+
+    docker compose -f bench/docker-compose.yml up -d
+    python bench/run.py --concurrency 1,8,32 --duration 15 --output bench/results/$(git rev-parse --short HEAD).json
+    python bench/compare.py bench/results/before.json bench/results/after.json
+
+ผลลัพธ์เป็น JSON: RPS, latency p50/p95/p99 ต่อ scenario ต่อระดับ concurrency และ peak RSS ของ API
+(อ่านจาก /proc จึงวัด RSS ได้เฉพาะบน Linux)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, UTC
+from typing import Callable, Optional
+
+import httpx
+
+from upstream import start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# scenario -> ฟังก์ชัน (ctx, ลำดับของ request) ที่คืน (method, path) ของ request ถัดไป
+SCENARIOS: dict[str, Callable] = {}
+
+
+def scenario(name: str):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+@scenario('panphor_hit')
+def _panphor_hit(ctx: dict, n: int) -> tuple[str, str]:
+    # symbol ที่ warm ไว้แล้ว -> ตอบจาก cache
+    symbols = ctx['warm_symbols']
+    return 'GET', f"/dividends-panphor?symbol={symbols[n % len(symbols)]}"
+
+
+@scenario('panphor_miss')
+def _panphor_miss(ctx: dict, n: int) -> tuple[str, str]:
+    # symbol ใหม่ทุกครั้ง -> MongoDB ว่าง -> scrape จาก upstream -> upsert
+    return 'GET', f"/dividends-panphor?symbol=B{ctx['run_id']}{n:06d}"
+
+
+@scenario('summary')
+def _summary(ctx: dict, n: int) -> tuple[str, str]:
+    return 'GET', "/dividends-summary"
+
+
+@scenario('soon')
+def _soon(ctx: dict, n: int) -> tuple[str, str]:
+    return 'GET', "/dividends/soon"
+
+
+@scenario('symbols')
+def _symbols(ctx: dict, n: int) -> tuple[str, str]:
+    return 'GET', "/symbols"
+
+
+@scenario('symbols_db')
+def _symbols_db(ctx: dict, n: int) -> tuple[str, str]:
+    return 'GET', "/symbols/db"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _tree_pids(root: int) -> list[int]:
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # field ที่ 4 คือ ppid (ชื่อ process อยู่ในวงเล็บและอาจมีช่องว่าง)
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def _rss_kb(pid: int, field: str = 'VmRSS') -> int:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class RssSampler:
+    """
+    อ่าน RSS ของ API และ process ลูก (Chromium) เป็นระยะ เก็บค่าสูงสุดไว้
+    """
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_tree_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        if sys.platform.startswith('linux'):
+            self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return {
+            'api_peak_rss_kb': _rss_kb(self.pid, 'VmHWM') or None,
+            'tree_peak_rss_kb': self.peak_tree_kb or None,
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            total = sum(_rss_kb(p) for p in _tree_pids(self.pid))
+            self.peak_tree_kb = max(self.peak_tree_kb, total)
+            self._stop.wait(self.interval)
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, ctx: dict, concurrency: int, duration: float) -> dict:
+    make_request = SCENARIOS[name]
+    counter = itertools.count()
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            method, url = make_request(ctx, next(counter))
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url)
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if status.startswith('2') or status == '304':
+                latencies.append(elapsed)
+            else:
+                errors[status] = errors.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': round(wall, 3),
+        'rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'max': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_api(port: int, env: dict, workers: int) -> subprocess.Popen:
+    cmd = [sys.executable, '-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', str(port),
+           '--workers', str(workers), '--log-level', 'warning']
+    return subprocess.Popen(cmd, cwd=ROOT, env={**os.environ, **env})
+
+
+async def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get('/symbols')
+                if response.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"API did not become ready within {timeout:.0f}s")
+
+
+async def warm(client: httpx.AsyncClient, symbols: list[str], concurrency: int = 8) -> None:
+    """
+    scrape symbol ใน set.json ผ่าน API หนึ่งรอบ (ให้ summary / soon มีข้อมูล) และเพิ่มลง /symbols/db
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(symbol: str):
+        async with semaphore:
+            await client.get('/dividends-panphor', params={'symbol': symbol})
+
+    await asyncio.gather(*(one(s) for s in symbols))
+    await client.post('/symbols/db', json={'symbols': symbols[:20]})
+
+
+def reset_stores(args) -> None:
+    """
+    เริ่มทุกครั้งจาก MongoDB / Redis ว่าง เพื่อให้ผลของแต่ละ commit เทียบกันได้
+    """
+    import redis
+    from pymongo import MongoClient
+
+    client = MongoClient(args.mongo_uri)
+    client.drop_database('dividend_db')
+    client.close()
+    redis.Redis(host=args.redis_host, port=args.redis_port, password=args.redis_password).flushdb()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main_async(args) -> dict:
+    upstream = start_server(latency_ms=args.upstream_latency_ms)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    api_port = args.api_port or _free_port()
+    base_url = f"http://127.0.0.1:{api_port}"
+    env = {
+        'PANPHOL_BASE_URL': upstream_url,
+        'SET_BASE_URL': upstream_url,
+        'MONGO_URI': args.mongo_uri,
+        'REDIS_HOST': args.redis_host,
+        'REDIS_PORT': str(args.redis_port),
+        'REDIS_PASSWORD': args.redis_password,
+        # ไม่ให้ refresher ยิง upstream ระหว่างวัดผล
+        'REFRESHER_ENABLED': '0',
+    }
+    with open(os.path.join(ROOT, os.getenv('SET_JSON_PATH', 'set.json')), encoding='utf-8') as f:
+        warm_symbols = [s.strip().upper() for s in json.load(f)['symbols']]
+
+    if not args.keep_data:
+        reset_stores(args)
+    api = start_api(api_port, env, args.workers)
+    sampler = RssSampler(api.pid)
+    try:
+        await wait_ready(base_url)
+        sampler.start()
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            await warm(client, warm_symbols)
+            ctx = {'warm_symbols': warm_symbols, 'run_id': int(time.time()) % 100000}
+            results = []
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    result = await run_scenario(client, name, ctx, concurrency, args.duration)
+                    print(f"{name:14s} c={concurrency:<4d} rps={result['rps']:>9.2f} "
+                          f"p50={result['latency_ms']['p50']:>8.2f}ms p95={result['latency_ms']['p95']:>8.2f}ms "
+                          f"p99={result['latency_ms']['p99']:>8.2f}ms errors={sum(result['errors'].values())}",
+                          file=sys.stderr)
+                    results.append(result)
+    finally:
+        memory = sampler.stop()
+        api.terminate()
+        try:
+            api.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            api.kill()
+        upstream.shutdown()
+
+    return {
+        'meta': {
+            'git_revision': git_revision(),
+            'created_at': datetime.now(UTC).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'workers': args.workers,
+            'duration_s': args.duration,
+            'upstream_latency_ms': args.upstream_latency_ms,
+        },
+        'results': results,
+        'memory': memory,
+        'upstream_requests': dict(upstream.RequestHandlerClass.counters),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test of the dividend API")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', default='1,8,32', help="comma separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per scenario and level")
+    parser.add_argument('--timeout', type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn workers")
+    parser.add_argument('--api-port', type=int, default=None)
+    parser.add_argument('--upstream-latency-ms', type=float, default=100.0,
+                        help="delay added by the stand-in upstream to each page")
+    parser.add_argument('--mongo-uri', default=os.getenv('BENCH_MONGO_URI', 'mongodb://127.0.0.1:27018'))
+    parser.add_argument('--redis-host', default=os.getenv('BENCH_REDIS_HOST', '127.0.0.1'))
+    parser.add_argument('--redis-port', type=int, default=int(os.getenv('BENCH_REDIS_PORT', 6380)))
+    parser.add_argument('--redis-password', default=os.getenv('BENCH_REDIS_PASSWORD', 'bench'))
+    parser.add_argument('--keep-data', action='store_true', help="do not drop dividend_db / flush Redis first")
+    parser.add_argument('--output', default=None, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    args.concurrency = [int(c) for c in args.concurrency.split(',')]
+
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
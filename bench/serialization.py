@@ -0,0 +1,111 @@
+"""
+วัด CPU ที่ใช้แปลง response เป็น JSON ต่อ 1,000 แถว: path เดิม (สร้าง pydantic model ทุกแถว
++ jsonable_encoder + json.dumps) เทียบกับ encode_json (orjson เขียน document ตรง ๆ)
+
+    python bench/serialization.py --rows 100,1000,10000 --output bench/results/serialization-$(git rev-parse --short HEAD).json
+
+ไม่ต้องมี MongoDB / Redis / upstream: document สร้างขึ้นให้หน้าตาเหมือนที่อ่านด้วย DIVIDEND_PROJECTION
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, UTC
+
+from run import ROOT, git_revision
+
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app import DividendResponse, encode_json  # noqa: E402
+from repository import DIVIDEND_PROJECTION, typed_dividend_fields  # noqa: E402
+
+
+def make_documents(count: int) -> list[dict]:
+    docs = []
+    for i in range(count):
+        year = 2560 + i % 8
+        raw = {
+            'symbol': 'PTT',
+            'year': str(year),
+            'quarter': str(i % 4 + 1),
+            'yield_percent': f"{2 + i % 300 / 100:.2f}",
+            'amount': f"{0.1 + i % 90 / 100:.2f}",
+            'xd_date': f"{i % 28 + 1:02d}/{i % 12 + 1:02d}/{year % 100:02d}",
+            'pay_date': f"{i % 28 + 1:02d}/{(i + 1) % 12 + 1:02d}/{year % 100:02d}",
+            'type': 'เงินปันผล',
+            'scraped_at': 1718000000.0 + i,
+        }
+        doc = {**raw, **typed_dividend_fields(raw)}
+        # pymongo คืน datetime แบบ naive (UTC)
+        for k in ('xd_date_utc', 'pay_date_utc'):
+            if doc[k] is not None:
+                doc[k] = doc[k].replace(tzinfo=None)
+        docs.append({k: doc[k] for k in DIVIDEND_PROJECTION if k in doc})
+    return docs
+
+
+def encode_validated(result: dict) -> bytes:
+    # path ก่อนหน้า: validate ทุกแถวเป็น DividendRecord แล้วแปลงกลับด้วย jsonable_encoder
+    return json.dumps(jsonable_encoder(DividendResponse(**result)), ensure_ascii=False).encode('utf-8')
+
+
+def encode_trusted(result: dict) -> bytes:
+    return encode_json(result)
+
+
+def measure(fn, result: dict, min_seconds: float) -> dict:
+    fn(result)  # warm up
+    loops, cpu = 0, 0.0
+    started = time.process_time()
+    while cpu < min_seconds:
+        fn(result)
+        loops += 1
+        cpu = time.process_time() - started
+    per_call = cpu / loops
+    return {
+        'loops': loops,
+        'cpu_ms_per_call': round(per_call * 1000, 3),
+        'cpu_ms_per_1k_rows': round(per_call * 1000 * 1000 / len(result['dividends']), 3),
+        'bytes': len(fn(result)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure JSON serialization CPU per 1k dividend rows")
+    parser.add_argument('--rows', default='100,1000,10000', help="comma-separated history sizes")
+    parser.add_argument('--min-seconds', type=float, default=1.0, help="CPU time per measurement")
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = []
+    for rows in (int(r) for r in args.rows.split(',')):
+        result = {'symbol': 'PTT', 'dividends': make_documents(rows), 'timestamp': datetime.now(UTC).timestamp()}
+        validated = measure(encode_validated, result, args.min_seconds)
+        trusted = measure(encode_trusted, result, args.min_seconds)
+        results.append({
+            'rows': rows,
+            'validated': validated,
+            'trusted': trusted,
+            'speedup': round(validated['cpu_ms_per_call'] / trusted['cpu_ms_per_call'], 1),
+        })
+        print(f"{rows:>7d} rows  validated {validated['cpu_ms_per_1k_rows']:9.3f} ms/1k  "
+              f"trusted {trusted['cpu_ms_per_1k_rows']:9.3f} ms/1k  x{results[-1]['speedup']}", file=sys.stderr)
+
+    report = {
+        'meta': {'git_revision': git_revision(), 'created_at': datetime.now(UTC).isoformat(), 'python': sys.version.split()[0]},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
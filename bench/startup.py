@@ -0,0 +1,116 @@
+"""
+วัดเวลา startup ของ API: เวลา `import app` (หลายรอบ), module ที่ import ช้าที่สุด และเวลาจาก
+เริ่ม uvicorn จนตอบ /health/live และ /health/ready ครั้งแรก
+
+    python bench/startup.py --runs 5 --output bench/results/startup-$(git rev-parse --short HEAD).json
+
+ไม่ต้องมี MongoDB / Redis สำหรับ import time ส่วน ready ต้องมี (ดู bench/docker-compose.yml)
+ถ้าไม่มี ready จะเป็น null หลัง --ready-timeout
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, UTC
+
+import httpx
+
+from run import ROOT, _free_port, git_revision
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def measure_import(runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return {
+        'runs': runs,
+        'median_ms': round(statistics.median(samples) * 1000, 1),
+        'min_ms': round(min(samples) * 1000, 1),
+        'max_ms': round(max(samples) * 1000, 1),
+    }
+
+
+def slowest_imports(top: int) -> list[dict]:
+    """
+    module ที่ใช้เวลา import สะสมมากที่สุด จาก `python -X importtime`
+    """
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        # นับเฉพาะ module ระดับบน (ชื่อไม่เยื้อง) เพื่อไม่ให้ module ย่อยซ้ำกับตัวที่ import มัน
+        if name.startswith('  '):
+            continue
+        rows.append({
+            'module': name.strip(),
+            'self_ms': round(int(self_us) / 1000, 1),
+            'cumulative_ms': round(int(cumulative_us) / 1000, 1),
+        })
+    return sorted(rows, key=lambda r: r['cumulative_ms'], reverse=True)[:top]
+
+
+def wait_for(url: str, timeout: float, started: float) -> float | None:
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return round((time.perf_counter() - started) * 1000, 1)
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_first_request(ready_timeout: float) -> dict:
+    port = _free_port()
+    started = time.perf_counter()
+    api = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=ROOT,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        live_ms = wait_for(f"{base}/health/live", 60.0, started)
+        ready_ms = wait_for(f"{base}/health/ready", ready_timeout, started) if live_ms is not None else None
+        return {'live_ms': live_ms, 'ready_ms': ready_ms}
+    finally:
+        api.terminate()
+        try:
+            api.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            api.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import time and time to first request")
+    parser.add_argument('--runs', type=int, default=5, help="number of `import app` samples")
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to report")
+    parser.add_argument('--ready-timeout', type=float, default=15.0)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    report = {
+        'meta': {'git_revision': git_revision(), 'created_at': datetime.now(UTC).isoformat(), 'python': sys.version.split()[0]},
+        'import': measure_import(args.runs),
+        'slowest_imports': slowest_imports(args.top),
+        'first_request': measure_first_request(args.ready_timeout),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
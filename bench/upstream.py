@@ -0,0 +1,201 @@
+"""
+เซิร์ฟเวอร์ HTTP ในเครื่องที่ทำหน้าที่แทน panphol และปฏิทิน XD ของ SET ระหว่าง benchmark
+
+- `/stock/{SYMBOL}/dividend`: หน้าที่บันทึกไว้ใน bench/fixtures/panphol/{SYMBOL}.html ถ้ามี
+  ไม่เช่นนั้นสร้างตาราง #basket ขึ้นจาก symbol (ค่าเดิมทุกครั้ง) symbol ที่ขึ้นต้นด้วย `NOTFOUND` ได้ 404
+- `/th/market/stock-calendar/x-calendar`: bench/fixtures/set/x-calendar.html หรือหน้าที่สร้างขึ้น
+
+    python bench/upstream.py serve --port 8900 --latency-ms 150
+    python bench/upstream.py record PTT BANPU     # บันทึกหน้าจริงของ panphol ไว้ใน fixtures
+"""
+import argparse
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PANPHOL_URL = re.compile(r'^/stock/([A-Za-z0-9.&-]+)/dividend/?$')
+X_CALENDAR_PATH = '/th/market/stock-calendar/x-calendar'
+
+THAI_MONTHS_SHORT = ['ม.ค.', 'ก.พ.', 'มี.ค.', 'เม.ย.', 'พ.ค.', 'มิ.ย.', 'ก.ค.', 'ส.ค.', 'ก.ย.', 'ต.ค.', 'พ.ย.', 'ธ.ค.']
+THAI_MONTHS_FULL = ['มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
+                    'กรกฎาคม', 'สิงหาคม', 'กันยายน', 'ตุลาคม', 'พฤศจิกายน', 'ธันวาคม']
+
+
+def _ddmmyy(d: datetime) -> str:
+    return f"{d.day:02d}/{d.month:02d}/{(d.year + 543) % 100:02d}"
+
+
+def synthetic_basket_html(symbol: str, rows: int = 8) -> str:
+    """
+    ตาราง #basket แบบเดียวกับของ panphol (7 คอลัมน์) ข้อมูลสุ่มจาก seed = symbol
+    วัน XD กระจายตั้งแต่ 2 ปีก่อนถึง 3 เดือนข้างหน้า เพื่อให้ /dividends/soon มีข้อมูล
+    """
+    rng = random.Random(symbol)
+    today = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+    body = []
+    for i in range(rows):
+        xd = today + timedelta(days=90 - i * 90 - rng.randint(0, 30))
+        pay = xd + timedelta(days=rng.randint(10, 25))
+        amount = rng.randint(5, 300) / 100
+        body.append(
+            "<tr>"
+            f"<td>{xd.year + 543}</td><td>{(xd.month - 1) // 3 + 1}</td>"
+            f"<td>{rng.randint(100, 900) / 100:.2f}</td><td>{amount:.2f}</td>"
+            f"<td>{_ddmmyy(xd)}</td><td>{_ddmmyy(pay)}</td><td>เงินปันผล</td>"
+            "</tr>"
+        )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{symbol} ปันผล</title></head><body>"
+        "<table id='basket'><thead><tr><th>ปี</th><th>ไตรมาส</th><th>Yield</th><th>ปันผล</th>"
+        "<th>XD</th><th>จ่าย</th><th>ประเภท</th></tr></thead>"
+        f"<tbody>{''.join(body)}</tbody></table></body></html>"
+    )
+
+
+def synthetic_x_calendar_html(symbols: list[str]) -> str:
+    """
+    หน้าปฏิทิน XD ที่มี .month-item และ .x-symbol ตามโครงสร้างที่ xd_calendar_set.py อ่าน
+    """
+    today = datetime.now(UTC)
+    tabs = ''.join(
+        f"<div class='month-item'><span class='label-month'>{THAI_MONTHS_FULL[(today.month - 1 + k) % 12]}</span>"
+        f"<span class='label-year'>{today.year + 543 + (today.month - 1 + k) // 12}</span></div>"
+        for k in range(3)
+    )
+    items = []
+    for i, symbol in enumerate(symbols):
+        xd = today + timedelta(days=i % 28)
+        pay = xd + timedelta(days=14)
+
+        def thai(d: datetime) -> str:
+            return f"{d.day} {THAI_MONTHS_SHORT[d.month - 1]} {d.year + 543}"
+
+        items.append(
+            "<div class='x-symbol'><span class='x-type xd-font-color'>XD</span>"
+            f"<span class='badge-x-calendar'>{symbol}</span><div class='dropdown-menu'>"
+            f"<div class=\"col-12 text-start\">วันขึ้นเครื่องหมาย</div><div class=\"col-12 text-start\">{thai(xd)}</div>"
+            f"<div class=\"col-12 text-start\">วันจ่ายปันผล</div><div class=\"col-12 text-start\">{thai(pay)}</div>"
+            f"<div class=\"col-12 text-start\">เงินปันผล (บาท/หุ้น)</div><div class=\"col-12 text-start\"><span>0.{i % 90 + 10} บาท</span></div>"
+            "<div class=\"col-12 text-start\">ประเภท</div><div class=\"col-12 text-start\">เงินปันผล</div>"
+            "</div></div>"
+        )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>X-Calendar</title></head><body>"
+        f"<div class='months'>{tabs}</div><div class='calendar'>{''.join(items)}</div></body></html>"
+    )
+
+
+def _read_fixture(*parts: str) -> Optional[bytes]:
+    path = os.path.join(FIXTURES_DIR, *parts)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    return None
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    calendar_symbols: list[str] = []
+    counters = {'panphol': 0, 'x_calendar': 0, 'not_found': 0}
+    _lock = threading.Lock()
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        path = self.path.split('?', 1)[0]
+        match = PANPHOL_URL.match(path)
+        if match:
+            symbol = match.group(1).upper()
+            if symbol.startswith('NOTFOUND'):
+                self._count('not_found')
+                return self._send(404, b'<html><body>not found</body></html>')
+            self._count('panphol')
+            body = _read_fixture('panphol', f'{symbol}.html') or synthetic_basket_html(symbol).encode('utf-8')
+            return self._send(200, body)
+        if path.rstrip('/') == X_CALENDAR_PATH:
+            self._count('x_calendar')
+            body = _read_fixture('set', 'x-calendar.html') or synthetic_x_calendar_html(self.calendar_symbols).encode('utf-8')
+            return self._send(200, body)
+        self._count('not_found')
+        self._send(404, b'')
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0.0,
+                 calendar_symbols: Optional[list[str]] = None) -> ThreadingHTTPServer:
+    """
+    เปิดเซิร์ฟเวอร์ใน thread แยก (port=0 = ให้ OS เลือก) คืนค่า server (ใช้ `server.server_address`)
+    """
+    handler = type('Handler', (UpstreamHandler,), {
+        'latency': latency_ms / 1000,
+        'calendar_symbols': calendar_symbols or ['PTT', 'BANPU', 'SCB', 'ADVANC', 'AOT'],
+        'counters': {'panphol': 0, 'x_calendar': 0, 'not_found': 0},
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def record(symbols: list[str], base_url: str) -> None:
+    import httpx
+
+    os.makedirs(os.path.join(FIXTURES_DIR, 'panphol'), exist_ok=True)
+    with httpx.Client(follow_redirects=True, timeout=30, headers={'User-Agent': 'Mozilla/5.0'}) as client:
+        for symbol in symbols:
+            response = client.get(f"{base_url}/stock/{symbol.upper()}/dividend")
+            has_basket = 'id="basket"' in response.text or "id='basket'" in response.text
+            if response.status_code != 200 or not has_basket:
+                print(f"{symbol}: skipped (status {response.status_code}, no #basket in raw HTML)")
+                continue
+            path = os.path.join(FIXTURES_DIR, 'panphol', f'{symbol.upper()}.html')
+            with open(path, 'wb') as f:
+                f.write(response.content)
+            print(f"{symbol}: saved {len(response.content)} bytes -> {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for panphol and the SET XD calendar")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8900)
+    serve.add_argument('--latency-ms', type=float, default=0.0, help="delay added to every response")
+    rec = sub.add_parser('record')
+    rec.add_argument('symbols', nargs='+')
+    rec.add_argument('--base-url', default='https://aio.panphol.com')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.symbols, args.base_url)
+        return
+    server = start_server(args.host, args.port, args.latency_ms)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
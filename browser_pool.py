@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Optional, TYPE_CHECKING
+
+from resource_policy import ResourcePolicy
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, BrowserContext, Page
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+DEFAULT_LAUNCH_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+
+
+class _Slot:
+    """
+    context หนึ่งตัวใน pool พร้อมตัวนับจำนวนครั้งที่ใช้งาน
+    """
+    def __init__(self, browser_index: int):
+        self.browser_index = browser_index
+        self.context: Optional["BrowserContext"] = None
+        self.uses = 0
+
+
+class BrowserPool:
+    """
+    Pool ของ Chromium browser + context ที่เปิดค้างไว้ตลอดอายุของแอป
+
+    - แจก page ได้พร้อมกันไม่เกิน `size` (หนึ่ง page ต่อหนึ่ง context)
+    - recycle context เมื่อใช้ครบ `max_uses` ครั้ง หรือ JS heap เกิน `max_heap_mb`
+    - เปิด browser ใหม่อัตโนมัติถ้า browser ตัวเดิม crash / disconnect
+    - ติดตั้ง `resource_policy` (ถ้ามี) กับทุก context เพื่อบล็อก resource ที่ไม่จำเป็น
+    - import Playwright และเปิด browser ตอนยืม page ครั้งแรก (หรือเมื่อเรียก `start()` เอง)
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        browsers: int = 1,
+        max_uses: int = 50,
+        max_heap_mb: int = 256,
+        headless: bool = True,
+        launch_args: Optional[list] = None,
+        context_options: Optional[dict] = None,
+        resource_policy: Optional[ResourcePolicy] = None,
+    ):
+        self.size = max(1, size)
+        self.browser_count = max(1, min(browsers, self.size))
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.headless = headless
+        self.launch_args = launch_args or DEFAULT_LAUNCH_ARGS
+        self.context_options = context_options or {
+            'viewport': {'width': 1920, 'height': 1080},
+            'user_agent': DEFAULT_USER_AGENT,
+        }
+        self.resource_policy = resource_policy
+        self._playwright = None
+        self._browsers: list[Optional["Browser"]] = []
+        self._browser_locks: list[asyncio.Lock] = []
+        self._slots: asyncio.Queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self.in_use = 0
+
+    @classmethod
+    def from_env(cls) -> "BrowserPool":
+        return cls(
+            size=int(os.getenv('BROWSER_POOL_SIZE', 4)),
+            browsers=int(os.getenv('BROWSER_POOL_BROWSERS', 1)),
+            max_uses=int(os.getenv('BROWSER_CONTEXT_MAX_USES', 50)),
+            max_heap_mb=int(os.getenv('BROWSER_CONTEXT_MAX_HEAP_MB', 256)),
+            headless=os.getenv('BROWSER_HEADLESS', '1') != '0',
+            resource_policy=ResourcePolicy.from_env('PANPHOL'),
+        )
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self._started:
+                return
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+            self._browsers = [None] * self.browser_count
+            self._browser_locks = [asyncio.Lock() for _ in range(self.browser_count)]
+            self._started = True
+            try:
+                for i in range(self.browser_count):
+                    await self._get_browser(i)
+                for i in range(self.size):
+                    slot = _Slot(i % self.browser_count)
+                    slot.context = await self._new_context(slot.browser_index)
+                    self._slots.put_nowait(slot)
+            except Exception:
+                # ปิดส่วนที่เปิดไปแล้ว ให้การยืม page ครั้งถัดไปลองใหม่ตั้งแต่ต้น
+                await self.close()
+                raise
+            logger.info("Browser pool started: %d browser(s), %d context(s)", self.browser_count, self.size)
+
+    async def close(self) -> None:
+        if not self._started:
+            return
+        self._started = False
+        while not self._slots.empty():
+            slot = self._slots.get_nowait()
+            await self._close_context(slot)
+        for browser in self._browsers:
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+        self._browsers = []
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        logger.info("Browser pool closed")
+
+    @asynccontextmanager
+    async def page(self):
+        """
+        ยืม page จาก pool (รอถ้า page ถูกใช้ครบ `size` แล้ว)
+        page จะถูกปิดเมื่อออกจาก context manager และ context จะถูกคืนเข้า pool
+        """
+        if not self._started:
+            await self.start()
+        async with self._semaphore:
+            slot: _Slot = await self._slots.get()
+            page: Optional["Page"] = None
+            self.in_use += 1
+            try:
+                if slot.context is None:
+                    slot.context = await self._new_context(slot.browser_index)
+                page = await slot.context.new_page()
+                yield page
+            finally:
+                self.in_use -= 1
+                slot.uses += 1
+                try:
+                    if await self._should_recycle(slot, page):
+                        await self._close_context(slot)
+                    elif page is not None:
+                        await page.close()
+                except Exception:
+                    # context เสีย (เช่น browser crash) -> ทิ้งไปแล้วสร้างใหม่ตอนยืมครั้งถัดไป
+                    await self._close_context(slot)
+                self._slots.put_nowait(slot)
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'browsers': self.browser_count,
+            'in_use': self.in_use,
+            'idle': self._slots.qsize(),
+            'started': self._started,
+            'resources': self.resource_policy.snapshot() if self.resource_policy else None,
+        }
+
+    async def _should_recycle(self, slot: _Slot, page: Optional["Page"]) -> bool:
+        if slot.context is None:
+            return False
+        if slot.uses >= self.max_uses:
+            return True
+        if page is None or page.is_closed():
+            return False
+        try:
+            heap = await page.evaluate("() => (performance.memory && performance.memory.usedJSHeapSize) || 0")
+        except Exception:
+            return False
+        return heap > self.max_heap_mb * 1024 * 1024
+
+    async def _close_context(self, slot: _Slot) -> None:
+        if slot.context is not None:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        slot.context = None
+        slot.uses = 0
+
+    async def _new_context(self, index: int) -> "BrowserContext":
+        browser = await self._get_browser(index)
+        context = await browser.new_context(**self.context_options)
+        if self.resource_policy is not None:
+            await self.resource_policy.install(context)
+        return context
+
+    async def _get_browser(self, index: int) -> "Browser":
+        async with self._browser_locks[index]:
+            browser = self._browsers[index]
+            if browser is None or not browser.is_connected():
+                browser = await self._playwright.chromium.launch(
+                    headless=self.headless,
+                    args=self.launch_args,
+                )
+                self._browsers[index] = browser
+            return browser
@@ -0,0 +1,277 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# key ของ response ที่ cache ไว้ ต่อ endpoint + parameter
+PANPHOR_PREFIX = 'dividends-panphor:'
+SUMMARY_PREFIX = 'dividends-summary:'
+SOON_PREFIX = 'dividends-soon'
+ANALYTICS_PREFIX = 'dividends-analytics:'
+
+
+def panphor_key(symbol: str) -> str:
+    # ปิดท้ายด้วย '/' เพื่อไม่ให้ prefix ของ PTT ไปลบ key ของ PTTEP
+    return f"{PANPHOR_PREFIX}{symbol.upper()}/"
+
+
+# data_version = ตัวนับ DIVIDENDS_VERSION ที่ใช้ทำ ETag: body ที่โหลดก่อน version เปลี่ยนจะไม่ถูกส่งออกภายใต้ ETag ใหม่
+# (LRU ของ process อื่นที่ยังไม่ถูกล้าง หรือ load ที่แข่งกับการ invalidate) key ของ version เก่าหมดอายุตาม TTL
+
+
+def summary_key(year: str, universe_version: int = 0, data_version: int = 0) -> str:
+    return f"{SUMMARY_PREFIX}{year}/{universe_version}/{data_version}"
+
+
+def soon_key(params: str = '', data_version: int = 0) -> str:
+    return f"{SOON_PREFIX}/{data_version}/{params}"
+
+
+def analytics_key(day: str, universe_version: int = 0, data_version: int = 0) -> str:
+    return f"{ANALYTICS_PREFIX}{day}/{universe_version}/{data_version}"
+
+
+def dividend_cache_prefixes(symbols: Iterable[str]) -> list[str]:
+    """
+    prefix ของ key ที่ต้องลบเมื่อมีการเพิ่มข้อมูลปันผลของ symbol เหล่านี้
+    (history ของ symbol นั้น + summary ทุกปี + รายการใกล้ XD + analytics)
+    """
+    prefixes = [panphor_key(s) for s in set(symbols)]
+    prefixes += [SUMMARY_PREFIX, SOON_PREFIX, ANALYTICS_PREFIX]
+    return prefixes
+
+
+def all_dividend_cache_prefixes() -> list[str]:
+    """
+    prefix ของทุก response ที่มาจากข้อมูลปันผล (ใช้เมื่อ migration / rebuild แก้ document จำนวนมาก)
+    """
+    return [PANPHOR_PREFIX] + dividend_cache_prefixes([])
+
+
+# ชื่อตัวนับ version ต่อ collection (ใช้สร้าง ETag / Last-Modified)
+DIVIDENDS_VERSION = 'dividends'
+SYMBOLS_VERSION = 'symbols'
+
+
+class DataVersions:
+    """
+    ตัวนับ version ต่อ collection เก็บใน Redis hash เดียว (ใช้ร่วมกันทุก worker/replica)
+
+    field `{name}` คือตัวนับ, `{name}:at` คือเวลา (unix) ที่ข้อมูลเปลี่ยนล่าสุด
+    ตัวนับเริ่มจากเวลาปัจจุบัน (ms) แทน 0 เพื่อไม่ให้ ETag ซ้ำกับของเดิมหลัง Redis ถูกล้าง
+    """
+
+    def __init__(self, redis_client, key: str = 'versions'):
+        self.redis = redis_client
+        self.key = key
+
+    async def get(self, *names: str) -> Optional[dict[str, tuple[int, float]]]:
+        """
+        คืนค่า {name: (version, changed_at)} หรือ None ถ้าอ่าน Redis ไม่ได้
+        """
+        fields = [f for n in names for f in (n, f"{n}:at")]
+        try:
+            values = await self.redis.hmget(self.key, fields)
+            if any(v is None for v in values):
+                await self._init(names)
+                values = await self.redis.hmget(self.key, fields)
+        except Exception as e:
+            logger.warning("versions: redis get failed: %s", e)
+            return None
+        return {
+            n: (int(values[2 * i]), float(values[2 * i + 1]))
+            for i, n in enumerate(names)
+        }
+
+    async def bump(self, *names: str) -> None:
+        now = time.time()
+        try:
+            await self._init(names)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for n in names:
+                    pipe.hincrby(self.key, n, 1)
+                    pipe.hset(self.key, f"{n}:at", now)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("versions: redis bump failed: %s", e)
+
+    async def _init(self, names: Iterable[str]) -> None:
+        now = time.time()
+        for n in names:
+            await self.redis.hsetnx(self.key, n, int(now * 1000))
+            await self.redis.hsetnx(self.key, f"{n}:at", now)
+
+
+def bump_versions_sync(redis_client, names: Iterable[str], key: str = 'versions') -> None:
+    """
+    เพิ่มตัวนับ version จาก process ที่ไม่ได้ใช้ asyncio (เช่น xd_calendar_set.py)
+    """
+    now = time.time()
+    pipe = redis_client.pipeline(transaction=True)
+    for n in names:
+        pipe.hsetnx(key, n, int(now * 1000))
+        pipe.hincrby(key, n, 1)
+        pipe.hset(key, f"{n}:at", now)
+    pipe.execute()
+
+
+class TTLCache:
+    """
+    LRU cache ใน process แบบจำกัดขนาด พร้อมอายุของแต่ละ entry
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [k for k in self._data if k.startswith(prefix)]
+        for k in keys:
+            del self._data[k]
+        return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    read-through cache 2 ชั้น: LRU ใน process -> Redis -> loader (MongoDB / scraper)
+
+    เก็บ response body ที่ serialize แล้ว (bytes) เพื่อไม่ต้อง encode ซ้ำตอน hit
+    cache miss ของ key เดียวกันที่เกิดพร้อมกันจะเรียก loader ครั้งเดียว
+    ถ้า Redis ใช้ไม่ได้จะทำงานต่อด้วย LRU ชั้นแรกอย่างเดียว
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        ttl: int = 300,
+        local_ttl: float = 30.0,
+        local_maxsize: int = 1024,
+        prefix: str = 'cache',
+    ):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.local = TTLCache(maxsize=local_maxsize, ttl=local_ttl)
+        self._flight = SingleFlight()
+        self.counters = {
+            'local_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'redis_errors': 0,
+        }
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.local.get(key)
+        if value is not None:
+            self.counters['local_hits'] += 1
+            return value
+        try:
+            value = await self.redis.get(self._redis_key(key))
+        except Exception as e:
+            self.counters['redis_errors'] += 1
+            logger.warning("cache: redis get failed for %s: %s", key, e)
+            value = None
+        if value is not None:
+            self.counters['redis_hits'] += 1
+            self.local.set(key, value)
+            return value
+        self.counters['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, ttl)
+        try:
+            await self.redis.set(self._redis_key(key), value, ex=ttl)
+        except Exception as e:
+            self.counters['redis_errors'] += 1
+            logger.warning("cache: redis set failed for %s: %s", key, e)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[bytes]], ttl: Optional[int] = None) -> bytes:
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        async def load() -> bytes:
+            body = await loader()
+            await self.set(key, body, ttl)
+            return body
+
+        return await self._flight.do(key, load)
+
+    async def invalidate(self, prefixes: Iterable[str]) -> None:
+        prefixes = list(prefixes)
+        for p in prefixes:
+            self.local.delete_prefix(p)
+        self.counters['invalidations'] += 1
+        try:
+            await invalidate_redis_async(self.redis, prefixes, self.prefix)
+        except Exception as e:
+            self.counters['redis_errors'] += 1
+            logger.warning("cache: redis invalidation failed: %s", e)
+
+    def stats(self) -> dict:
+        hits = self.counters['local_hits'] + self.counters['redis_hits']
+        total = hits + self.counters['misses']
+        return {
+            **self.counters,
+            'hits': hits,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'local_size': len(self.local),
+            'local_maxsize': self.local.maxsize,
+        }
+
+
+async def invalidate_redis_async(redis_client, prefixes: Iterable[str], namespace: str = 'cache') -> int:
+    deleted = 0
+    for p in prefixes:
+        keys = [k async for k in redis_client.scan_iter(match=f"{namespace}:{p}*", count=500)]
+        if keys:
+            deleted += await redis_client.delete(*keys)
+    return deleted
+
+
+def invalidate_redis_sync(redis_client, prefixes: Iterable[str], namespace: str = 'cache') -> int:
+    """
+    ลบ key ใน Redis จาก process ที่ไม่ได้ใช้ asyncio (เช่น xd_calendar_set.py)
+    LRU ใน process ของ API จะหมดอายุเองภายใน LOCAL_CACHE_TTL
+    """
+    deleted = 0
+    for p in prefixes:
+        keys = list(redis_client.scan_iter(match=f"{namespace}:{p}*", count=500))
+        if keys:
+            deleted += redis_client.delete(*keys)
+    return deleted
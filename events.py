@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta, UTC
+from typing import AsyncIterator, Iterable, Optional
+
+from pymongo.errors import OperationFailure
+
+from repository import DIVIDEND_PROJECTION
+from serialization import decode_json, encode_json
+
+logger = logging.getLogger(__name__)
+
+# channel ของ Redis pub/sub ที่ ingest ทุกทาง (API, xd_calendar_set.py) publish ปันผลที่เปลี่ยน
+EVENTS_CHANNEL = 'dividend-events'
+
+SOURCES = ('auto', 'change_stream', 'redis')
+
+
+def event_document(doc: dict) -> dict:
+    """
+    field เดียวกับ response ของ API (DIVIDEND_PROJECTION) datetime เป็น naive UTC เหมือนที่อ่านจาก MongoDB
+    """
+    out = {}
+    for k in DIVIDEND_PROJECTION:
+        if k == '_id' or k not in doc:
+            continue
+        value = doc[k]
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            value = value.astimezone(UTC).replace(tzinfo=None)
+        out[k] = value
+    return out
+
+
+def _encode_changes(changes: Iterable[tuple[str, dict]]) -> bytes:
+    return encode_json([{'op': op, 'dividend': event_document(doc)} for op, doc in changes])
+
+
+async def publish_dividend_events(redis_client, changes: list[tuple[str, dict]], channel: str = EVENTS_CHANNEL) -> None:
+    """
+    publish `changes` จาก upsert_dividends (รายการ (op, document)) ให้ hub ที่ใช้ Redis pub/sub
+    """
+    if changes:
+        await redis_client.publish(channel, _encode_changes(changes))
+
+
+def publish_dividend_events_sync(redis_client, changes: list[tuple[str, dict]], channel: str = EVENTS_CHANNEL) -> None:
+    """
+    เหมือน publish_dividend_events สำหรับ process ที่ไม่ได้ใช้ asyncio (เช่น xd_calendar_set.py)
+    """
+    if changes:
+        redis_client.publish(channel, _encode_changes(changes))
+
+
+def _day(value) -> Optional[str]:
+    # วันที่ในรูป 'YYYY-MM-DD' เทียบกันแบบ string ได้
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, str) and value:
+        return value[:10]
+    return None
+
+
+class DividendEvent:
+    """
+    event หนึ่งแถว: encode เป็น JSON ครั้งเดียวแล้วส่งให้ทุก subscriber ที่ filter ตรง
+    """
+
+    __slots__ = ('symbol', 'days', 'data')
+
+    def __init__(self, op: str, doc: dict):
+        doc = event_document(doc)
+        self.symbol = doc.get('symbol')
+        self.days = tuple(d for d in (_day(doc.get('xd_date_utc')), _day(doc.get('pay_date_utc'))) if d)
+        self.data = encode_json({'op': op, 'dividend': doc})
+
+
+class Subscription:
+    """
+    ตัวกรองของ subscriber หนึ่งราย: symbol และช่วงวันที่ (XD หรือวันจ่ายอยู่ในช่วง)
+    `days` = ช่วงเลื่อนจากวันนี้ถึงอีก N วัน (คำนวณใหม่ทุก event)
+    """
+
+    def __init__(
+        self,
+        symbols: Optional[set[str]] = None,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        days: Optional[int] = None,
+        maxsize: int = 256,
+    ):
+        self.symbols = symbols or None
+        self.since = since.isoformat() if since else None
+        self.until = until.isoformat() if until else None
+        self.days = days
+        self.queue: asyncio.Queue[Optional[DividendEvent]] = asyncio.Queue(maxsize)
+
+    def matches(self, event: DividendEvent) -> bool:
+        if self.symbols is not None and event.symbol not in self.symbols:
+            return False
+        since, until = self.since, self.until
+        if self.days is not None:
+            today = datetime.now(UTC).date()
+            since = max(since or '', today.isoformat())
+            until = min(until or '9999-12-31', (today + timedelta(days=self.days)).isoformat())
+        if since is None and until is None:
+            return True
+        return any((since is None or d >= since) and (until is None or d <= until) for d in event.days)
+
+    def offer(self, event: DividendEvent) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # อ่านไม่ทัน: ทิ้งที่ค้างแล้วส่ง None ให้ stream ปิด (client ต่อใหม่แล้วโหลดรายการเต็มอีกครั้ง)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+
+class DividendEventHub:
+    """
+    กระจายปันผลที่เพิ่ม / เปลี่ยนให้ subscriber ใน process (อ่านจากต้นทางครั้งเดียวไม่ว่ามีกี่ subscriber)
+
+    ต้นทาง (`source`):
+    - 'change_stream': MongoDB change stream ของ collection dividends (ต้องเป็น replica set)
+    - 'redis': Redis pub/sub ที่ ingest ทุกทาง publish (ดู publish_dividend_events)
+    - 'auto': change stream ถ้า server รองรับ ไม่เช่นนั้นใช้ Redis
+
+    เริ่มอ่านต้นทางเมื่อมี subscriber รายแรก ถ้าหลุดจะต่อใหม่ทุก `retry_interval` วินาที
+    """
+
+    def __init__(
+        self,
+        collection,
+        redis_client,
+        source: str = 'auto',
+        queue_size: int = 256,
+        channel: str = EVENTS_CHANNEL,
+        retry_interval: float = 5.0,
+    ):
+        if source not in SOURCES:
+            raise ValueError(f"unknown dividend event source {source!r}, expected one of {SOURCES}")
+        self.collection = collection
+        self.redis = redis_client
+        self.source = source
+        self.queue_size = queue_size
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self.active_source: Optional[str] = None
+        self._subscribers: set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {'published': 0, 'delivered': 0, 'overflows': 0}
+
+    @classmethod
+    def from_env(cls, collection, redis_client) -> "DividendEventHub":
+        return cls(
+            collection,
+            redis_client,
+            source=os.getenv('DIVIDEND_EVENTS_SOURCE', 'auto'),
+            queue_size=int(os.getenv('DIVIDEND_EVENTS_QUEUE_SIZE', 256)),
+        )
+
+    def subscribe(self, **filters) -> Subscription:
+        subscription = Subscription(maxsize=self.queue_size, **filters)
+        self._subscribers.add(subscription)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: DividendEvent) -> None:
+        self.counters['published'] += 1
+        for subscription in list(self._subscribers):
+            if not subscription.matches(event):
+                continue
+            if subscription.offer(event):
+                self.counters['delivered'] += 1
+            else:
+                self.counters['overflows'] += 1
+                self._subscribers.discard(subscription)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {**self.counters, 'subscribers': self.subscribers, 'source': self.active_source}
+
+    async def _run(self) -> None:
+        source = self.source
+        while True:
+            try:
+                if source == 'redis':
+                    await self._listen_redis()
+                else:
+                    await self._watch_change_stream()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if source != 'auto':
+                    logger.warning("dividend events: change stream failed: %s", e)
+                else:
+                    # standalone server ไม่มี change stream -> ใช้ Redis ตลอดอายุ process
+                    logger.info("dividend events: change streams unavailable (%s), using Redis pub/sub", e)
+                    source = 'redis'
+                    continue
+            except Exception as e:
+                logger.warning("dividend events: %s source failed: %s", source, e)
+            self.active_source = None
+            await asyncio.sleep(self.retry_interval)
+
+    async def _watch_change_stream(self) -> None:
+        # pymongo เป็น sync: วน change stream ใน thread ของตัวเอง แล้วส่ง event กลับเข้า event loop
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        try:
+            await asyncio.to_thread(self._watch, loop, stop)
+        finally:
+            stop.set()
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, stop: threading.Event) -> None:
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace']}}}]
+        with self.collection.watch(pipeline, full_document='updateLookup', max_await_time_ms=1000) as stream:
+            loop.call_soon_threadsafe(setattr, self, 'active_source', 'change_stream')
+            while not stop.is_set():
+                change = stream.try_next()
+                # document ที่ถูกลบไปก่อน lookup ไม่มี fullDocument
+                if change is None or change.get('fullDocument') is None:
+                    continue
+                op = 'insert' if change['operationType'] == 'insert' else 'update'
+                loop.call_soon_threadsafe(self.publish, DividendEvent(op, change['fullDocument']))
+
+    async def _listen_redis(self) -> None:
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            self.active_source = 'redis'
+            async for message in pubsub.listen():
+                if message.get('type') != 'message':
+                    continue
+                for item in decode_json(message['data']):
+                    self.publish(DividendEvent(item['op'], item['dividend']))
+        finally:
+            await pubsub.reset()
+
+
+async def sse_stream(hub: DividendEventHub, subscription: Subscription, heartbeat: float = 15.0) -> AsyncIterator[bytes]:
+    """
+    Server-Sent Events ของ subscription: `event: dividend` ต่อแถว, comment เป็น keep-alive ทุก `heartbeat` วินาที
+    และ `event: overflow` ก่อนปิดเมื่อ client อ่านไม่ทัน
+    """
+    try:
+        yield b'retry: 3000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield b': keep-alive\n\n'
+                continue
+            if event is None:
+                yield b'event: overflow\ndata: {}\n\n'
+                return
+            yield b'event: dividend\ndata: ' + event.data + b'\n\n'
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,235 @@
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta, UTC
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from repository import (
+    DIVIDEND_KEY_FIELDS,
+    DIVIDEND_PROJECTION,
+    CALENDAR_STATE_COLLECTION,
+    SUMMARY_COLLECTION,
+    SUMMARY_PROJECTION,
+    latest_dividend_pipeline,
+    remove_duplicate_dividends,
+    upcoming_dividends_filter,
+)
+
+logger = logging.getLogger(__name__)
+
+# index ที่แอปดูแลเอง: collection -> [(name, keys, options)]
+# index อื่นที่ไม่อยู่ในรายการนี้จะไม่ถูกลบ (รายงานเป็น unmanaged เท่านั้น)
+INDEX_SPECS = {
+    'dividends': [
+        # identity ของปันผล (upsert) + ครอบ query {symbol} ของ history ด้วย prefix
+        ('dividend_identity', [(f, ASCENDING) for f in DIVIDEND_KEY_FIELDS], {'unique': True}),
+        # history แบบแบ่งหน้า: {symbol, _id >} sort _id (keyset ไม่ต้อง sort ใน memory)
+        ('symbol_id', [('symbol', ASCENDING), ('_id', ASCENDING)], {}),
+        # /dividends/soon: {type, pay_date_utc >=} sort (pay_date_utc, _id) แบบ keyset
+        ('type_pay_date_utc', [('type', ASCENDING), ('pay_date_utc', ASCENDING), ('_id', ASCENDING)], {}),
+        # /dividends/soon?symbol=...
+        ('type_symbol_pay_date_utc', [('type', ASCENDING), ('symbol', ASCENDING), ('pay_date_utc', ASCENDING), ('_id', ASCENDING)], {}),
+        # /dividends-summary: {year, symbol $in} sort วันล่าสุดก่อน
+        ('year_symbol', [('year', ASCENDING), ('symbol', ASCENDING), ('xd_date_utc', DESCENDING), ('pay_date_utc', DESCENDING)], {}),
+    ],
+    'symbols': [
+        ('symbol', [('symbol', ASCENDING)], {}),
+    ],
+    # summary ที่คำนวณไว้แล้ว: {year, symbol $in} + key ของ $merge (ต้องเป็น unique)
+    SUMMARY_COLLECTION: [
+        ('year_symbol', [('year', ASCENDING), ('symbol', ASCENDING)], {'unique': True}),
+    ],
+    # ความสดของข้อมูลต่อ symbol: {symbol} และ {symbol $in}
+    'scrape_state': [
+        ('symbol', [('symbol', ASCENDING)], {'unique': True}),
+    ],
+    # fingerprint ของปฏิทิน XD ต่อเดือน (xd_calendar_set.py)
+    CALENDAR_STATE_COLLECTION: [
+        ('month', [('month', ASCENDING)], {'unique': True}),
+    ],
+}
+
+# query แบบ keyset ที่ต้องได้ลำดับจาก index (มี stage SORT = sort ใน memory ทุกหน้า)
+INDEX_ORDERED_QUERIES = ('dividends-panphor.page', 'dividends-soon', 'dividends-soon.symbol')
+
+# option ที่ใช้เทียบว่า index เดิมตรงกับ spec หรือไม่ (ค่า default ถ้าไม่ได้ระบุ)
+_COMPARED_OPTIONS = {'unique': False, 'sparse': False, 'partialFilterExpression': None, 'expireAfterSeconds': None}
+
+
+def _same_keys(existing: dict, keys: list) -> bool:
+    # index_information() คืน 'key' เป็น list ของ (field, direction)
+    return [tuple(k) for k in existing['key']] == [tuple(k) for k in keys]
+
+
+def _same_index(existing: dict, keys: list, options: dict) -> bool:
+    if not _same_keys(existing, keys):
+        return False
+    return all(existing.get(opt, default) == options.get(opt, default) for opt, default in _COMPARED_OPTIONS.items())
+
+
+def _create_index(collection, name: str, keys: list, options: dict) -> None:
+    try:
+        collection.create_index(keys, name=name, **options)
+    except (DuplicateKeyError, OperationFailure) as e:
+        if collection.name != 'dividends' or name != 'dividend_identity' or getattr(e, 'code', None) != 11000:
+            raise
+        # มีข้อมูลซ้ำค้างอยู่ -> ลบตัวซ้ำ (เก็บตัวที่ scrape ล่าสุด) แล้วสร้างใหม่
+        removed = remove_duplicate_dividends(collection)
+        logger.warning("Removed %d duplicate dividend documents before creating unique index", removed)
+        collection.create_index(keys, name=name, **options)
+
+
+def reconcile_indexes(db) -> dict:
+    """
+    สร้าง index ที่ยังไม่มี และสร้างใหม่ index ที่ชื่อ/คีย์ตรงแต่ option ไม่ตรงกับ INDEX_SPECS
+    คืนค่ารายงานต่อ collection: created / rebuilt / ok / unmanaged
+    """
+    report = {}
+    for coll_name, specs in INDEX_SPECS.items():
+        collection = db[coll_name]
+        existing = collection.index_information() if coll_name in db.list_collection_names() else {}
+        result = {'created': [], 'rebuilt': [], 'ok': [], 'unmanaged': []}
+        managed = set()
+        for name, keys, options in specs:
+            managed.add(name)
+            current = existing.get(name)
+            # index เดิมที่คีย์เหมือนกันแต่ชื่อต่างกันจะทำให้ create_index ล้มเหลว
+            same_keys = [
+                n for n, info in existing.items()
+                if n != name and n != '_id_' and _same_keys(info, keys)
+            ]
+            if current is not None and _same_index(current, keys, options) and not same_keys:
+                result['ok'].append(name)
+                continue
+            for n in same_keys + ([name] if current is not None else []):
+                collection.drop_index(n)
+            _create_index(collection, name, keys, options)
+            result['rebuilt' if current is not None or same_keys else 'created'].append(name)
+        result['unmanaged'] = [n for n in existing if n not in managed and n != '_id_']
+        if result['created'] or result['rebuilt']:
+            logger.info("Indexes on %s: created=%s rebuilt=%s", coll_name, result['created'], result['rebuilt'])
+        report[coll_name] = result
+    return report
+
+
+def _plan_stages(node, found: list) -> list:
+    if isinstance(node, dict):
+        if 'stage' in node:
+            found.append((node['stage'], node.get('indexName')))
+        for v in node.values():
+            _plan_stages(v, found)
+    elif isinstance(node, list):
+        for v in node:
+            _plan_stages(v, found)
+    return found
+
+
+def _winning_plans(explain: dict) -> list:
+    plans = []
+    if isinstance(explain, dict):
+        if 'winningPlan' in explain:
+            plans.append(explain['winningPlan'])
+        for v in explain.values():
+            plans.extend(_winning_plans(v))
+    elif isinstance(explain, list):
+        for v in explain:
+            plans.extend(_winning_plans(v))
+    return plans
+
+
+def _summarize(name: str, explain: dict) -> dict:
+    stages = []
+    for plan in _winning_plans(explain):
+        _plan_stages(plan, stages)
+    return {
+        'query': name,
+        'stages': sorted({s for s, _ in stages}),
+        'indexes': sorted({i for _, i in stages if i}),
+        'collection_scan': any(s == 'COLLSCAN' for s, _ in stages),
+        'in_memory_sort': any(s == 'SORT' for s, _ in stages),
+    }
+
+
+def explain_queries(db, symbol: str = 'PTT', year: str = None, symbols: list = None) -> list[dict]:
+    """
+    รัน explain() ของ query ทุกแบบที่ endpoint ใช้ แล้วรายงาน stage / index ที่ถูกเลือก
+    query ที่ `collection_scan` เป็น True คือไม่มี index รองรับ
+    query ใน INDEX_ORDERED_QUERIES ที่ `in_memory_sort` เป็น True คือ index ไม่ครอบลำดับ (รายงานใน `problems`)
+    """
+    now = datetime.now(UTC)
+    year = year or str(now.year + 543)
+    symbols = symbols or [symbol]
+    dividends = db['dividends']
+    cases = {
+        'dividends-panphor.state': lambda: db['scrape_state'].find({'symbol': symbol}).explain(),
+        'dividends-panphor.history': lambda: dividends.find({'symbol': symbol}, DIVIDEND_PROJECTION).explain(),
+        'dividends-panphor.page': lambda: dividends.find(
+            {'symbol': symbol, '_id': {'$gt': ObjectId('0' * 24)}}, {**DIVIDEND_PROJECTION, '_id': 1}
+        ).sort('_id', 1).limit(100).explain(),
+        'dividends-soon': lambda: dividends.find(
+            upcoming_dividends_filter(now), DIVIDEND_PROJECTION
+        ).sort([('pay_date_utc', 1), ('_id', 1)]).explain(),
+        'dividends-soon.symbol': lambda: dividends.find(
+            upcoming_dividends_filter(now, symbol), DIVIDEND_PROJECTION
+        ).sort([('pay_date_utc', 1), ('_id', 1)]).explain(),
+        'dividends-summary': lambda: db[SUMMARY_COLLECTION].find(
+            {'year': year, 'symbol': {'$in': symbols}}, SUMMARY_PROJECTION
+        ).explain(),
+        'dividends-summary.refresh': lambda: db.command(
+            'explain',
+            {
+                'aggregate': 'dividends',
+                'pipeline': latest_dividend_pipeline({'year': {'$in': [year]}, 'symbol': {'$in': symbols}}),
+                'cursor': {},
+            },
+            verbosity='queryPlanner',
+        ),
+        'dividends-analytics': lambda: dividends.find(
+            {'type': 'เงินปันผล', 'symbol': {'$in': symbols}, 'xd_date_utc': {'$gte': now - timedelta(days=3 * 365)}},
+        ).explain(),
+        'symbols-db.lookup': lambda: db['symbols'].find({'symbol': {'$in': symbols}}).explain(),
+    }
+    report = []
+    for name, run in cases.items():
+        try:
+            summary = _summarize(name, run())
+        except Exception as e:
+            report.append({'query': name, 'error': str(e)})
+            continue
+        problems = []
+        if summary['collection_scan']:
+            problems.append('collection scan')
+        if name in INDEX_ORDERED_QUERIES and (summary['in_memory_sort'] or 'IXSCAN' not in summary['stages']):
+            problems.append('sort not covered by an index')
+        report.append({**summary, 'problems': problems})
+    return report
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Reconcile MongoDB indexes and check query plans")
+    parser.add_argument('--no-reconcile', action='store_true', help="only run explain checks")
+    parser.add_argument('--symbol', default='PTT')
+    parser.add_argument('--year', default=None, help="year in BE, e.g. 2567")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    db = MongoClient(os.getenv('MONGO_URI', os.getenv('MONGO_URL')))['dividend_db']
+    output = {}
+    if not args.no_reconcile:
+        output['indexes'] = reconcile_indexes(db)
+    output['explain'] = explain_queries(db, symbol=args.symbol.upper(), year=args.year)
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+    # exit code 1 ถ้ามี query ที่ยังเป็น collection scan หรือ sort ใน memory (ใช้ใน CI / deploy check ได้)
+    raise SystemExit(1 if any(q.get('problems') for q in output['explain']) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import os
+import time
+import uuid
+from typing import Iterable, Optional
+
+from serialization import decode_json, encode_json
+
+# ประเภทงาน: scrape ปันผลของ symbol จาก panphol และปฏิทิน XD ของ SET หนึ่งเดือน
+PANPHOL_JOB = 'panphol'
+SET_CALENDAR_JOB = 'set_calendar'
+JOB_KINDS = (PANPHOL_JOB, SET_CALENDAR_JOB)
+
+# key ของงานเดียวกันที่ยังค้างอยู่ -> id ของงานนั้น (enqueue ซ้ำได้ id เดิม)
+# enqueue แบบ force ที่ซ้ำกับงานที่ยังรออยู่ (queued / retrying) จะตั้ง force ให้ payload ของงานนั้นแทน
+_ENQUEUE_SCRIPT = """
+local existing = redis.call('get', KEYS[1])
+if existing then
+    if ARGV[8] == '1' then
+        local job = ARGV[7] .. existing
+        local state = redis.call('hget', job, 'state')
+        if state == 'queued' or state == 'retrying' then
+            local payload = cjson.decode(redis.call('hget', job, 'payload'))
+            if not payload['force'] then
+                payload['force'] = true
+                redis.call('hset', job, 'payload', cjson.encode(payload))
+            end
+        end
+    end
+    return {existing, 0}
+end
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[6])
+redis.call('hset', KEYS[2], 'id', ARGV[1], 'kind', ARGV[2], 'payload', ARGV[3], 'state', 'queued',
+    'attempts', 0, 'max_attempts', ARGV[5], 'enqueued_at', ARGV[4], 'dedup_key', KEYS[1])
+redis.call('lpush', KEYS[3], ARGV[1])
+return {ARGV[1], 1}
+"""
+
+# ย้ายงาน retry ที่ถึงเวลา และงานที่หมด visibility timeout (worker ตาย / ค้าง) กลับเข้า ready
+# แล้วหยิบงานถัดไป งานที่ครบจำนวนครั้งแล้วแต่ยังหมดเวลาอีกจะไป dead
+_RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+for _, key in ipairs({KEYS[3], KEYS[2]}) do
+    for _, id in ipairs(redis.call('zrangebyscore', key, '-inf', now, 'LIMIT', 0, 100)) do
+        redis.call('zrem', key, id)
+        redis.call('rpush', KEYS[1], id)
+    end
+end
+while true do
+    local id = redis.call('rpop', KEYS[1])
+    if not id then
+        return false
+    end
+    local job = ARGV[4] .. id
+    if redis.call('exists', job) == 1 then
+        local attempts = redis.call('hincrby', job, 'attempts', 1)
+        if attempts > tonumber(redis.call('hget', job, 'max_attempts')) then
+            redis.call('hset', job, 'state', 'dead', 'last_error', 'visibility timeout expired', 'finished_at', ARGV[1])
+            redis.call('lpush', KEYS[4], id)
+            local dedup = redis.call('hget', job, 'dedup_key')
+            if redis.call('get', dedup) == id then
+                redis.call('del', dedup)
+            end
+        else
+            redis.call('hset', job, 'state', 'running', 'token', ARGV[3], 'started_at', ARGV[1])
+            redis.call('zadd', KEYS[2], ARGV[2], id)
+            return redis.call('hgetall', job)
+        end
+    end
+end
+"""
+
+# ต่อเวลา visibility ระหว่างที่งานยังรันอยู่ (เฉพาะเจ้าของ token ปัจจุบัน)
+_TOUCH_SCRIPT = """
+if redis.call('hget', KEYS[2], 'token') ~= ARGV[2] then
+    return 0
+end
+redis.call('zadd', KEYS[1], 'XX', ARGV[3], ARGV[1])
+return 1
+"""
+
+_ACK_SCRIPT = """
+if redis.call('hget', KEYS[2], 'token') ~= ARGV[2] then
+    return 0
+end
+redis.call('zrem', KEYS[1], ARGV[1])
+local dedup = redis.call('hget', KEYS[2], 'dedup_key')
+if redis.call('get', dedup) == ARGV[1] then
+    redis.call('del', dedup)
+end
+redis.call('hset', KEYS[2], 'state', 'done', 'result', ARGV[3], 'finished_at', ARGV[4])
+redis.call('hdel', KEYS[2], 'token')
+redis.call('expire', KEYS[2], ARGV[5])
+return 1
+"""
+
+# ล้มเหลว: retry ภายหลัง (delayed) หรือ dead เมื่อครบจำนวนครั้ง / เป็นความผิดพลาดถาวร
+_FAIL_SCRIPT = """
+if redis.call('hget', KEYS[4], 'token') ~= ARGV[2] then
+    return 'lost'
+end
+redis.call('zrem', KEYS[1], ARGV[1])
+redis.call('hset', KEYS[4], 'last_error', ARGV[3], 'finished_at', ARGV[4])
+redis.call('hdel', KEYS[4], 'token')
+local attempts = tonumber(redis.call('hget', KEYS[4], 'attempts'))
+if ARGV[6] == '1' or attempts >= tonumber(redis.call('hget', KEYS[4], 'max_attempts')) then
+    redis.call('hset', KEYS[4], 'state', 'dead')
+    redis.call('lpush', KEYS[3], ARGV[1])
+    local dedup = redis.call('hget', KEYS[4], 'dedup_key')
+    if redis.call('get', dedup) == ARGV[1] then
+        redis.call('del', dedup)
+    end
+    return 'dead'
+end
+redis.call('hset', KEYS[4], 'state', 'retrying')
+redis.call('zadd', KEYS[2], ARGV[5], ARGV[1])
+return 'retrying'
+"""
+
+# dead -> ready (นับจำนวนครั้งใหม่) ใช้หลังแก้สาเหตุแล้ว
+_REQUEUE_SCRIPT = """
+local id = redis.call('rpop', KEYS[1])
+if not id then
+    return false
+end
+local job = ARGV[1] .. id
+if redis.call('exists', job) == 0 then
+    return id
+end
+redis.call('hset', job, 'state', 'queued', 'attempts', 0)
+redis.call('hdel', job, 'last_error', 'token')
+redis.call('set', redis.call('hget', job, 'dedup_key'), id, 'EX', ARGV[2])
+redis.call('lpush', KEYS[2], id)
+return id
+"""
+
+
+class PermanentJobError(Exception):
+    """
+    งานที่ลองใหม่ไปก็ไม่สำเร็จ (payload ผิด ฯลฯ) -> dead ทันทีโดยไม่ retry
+    """
+
+
+class JobQueue:
+    """
+    คิวงาน scrape บน Redis ที่ API และ worker หลายเครื่องใช้ร่วมกัน (ดู worker.py)
+
+    - แยก list ต่อประเภทงาน: `{prefix}:{kind}:ready` (FIFO), `processing` / `delayed` (sorted set ตามเวลา)
+      และ `dead` รายละเอียดงานอยู่ใน hash `{prefix}:job:{id}`
+    - dedup: enqueue งานที่ key ซ้ำกับงานที่ยังไม่เสร็จได้ id เดิม
+    - visibility timeout: งานที่ worker หยิบไปแล้วไม่ ack / ต่อเวลา ภายใน `visibility_timeout`
+      วินาทีจะกลับเข้าคิวให้ worker อื่น ack / fail ของ worker เดิมหลังจากนั้นจะถูกเพิกเฉย (token ไม่ตรง)
+    - retry แบบ exponential backoff (`retry_delay` * 2^(ครั้งที่-1) ไม่เกิน `max_retry_delay`)
+      ครบ `max_attempts` แล้วย้ายไป dead
+    - งานที่เสร็จแล้วเก็บผลไว้ `result_ttl` วินาที
+
+    script ใช้ key ที่สร้างจาก id ภายใน script จึงรองรับเฉพาะ Redis แบบ standalone / replica (ไม่ใช่ cluster)
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        visibility_timeout: float = 120.0,
+        max_attempts: int = 5,
+        retry_delay: float = 30.0,
+        max_retry_delay: float = 1800.0,
+        dedup_ttl: int = 6 * 3600,
+        result_ttl: int = 86400,
+        prefix: str = 'jobs',
+    ):
+        self.redis = redis_client
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.dedup_ttl = dedup_ttl
+        self.result_ttl = result_ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_env(cls, redis_client) -> "JobQueue":
+        return cls(
+            redis_client,
+            visibility_timeout=float(os.getenv('JOB_VISIBILITY_TIMEOUT', 120)),
+            max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 5)),
+            retry_delay=float(os.getenv('JOB_RETRY_DELAY', 30)),
+            max_retry_delay=float(os.getenv('JOB_MAX_RETRY_DELAY', 1800)),
+            dedup_ttl=int(os.getenv('JOB_DEDUP_TTL', 6 * 3600)),
+            result_ttl=int(os.getenv('JOB_RESULT_TTL', 86400)),
+        )
+
+    def _key(self, kind: str, name: str) -> str:
+        return f"{self.prefix}:{kind}:{name}"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    async def enqueue(self, kind: str, payload: dict, dedup: str) -> tuple[str, bool]:
+        """
+        เพิ่มงาน คืนค่า (job id, สร้างใหม่หรือไม่) ถ้ามีงาน `dedup` เดียวกันค้างอยู่จะได้ id ของงานนั้น
+        payload ที่มี force จะ upgrade งานเดิมที่ยังไม่เริ่มให้เป็น force ด้วย (งานที่กำลังรันอยู่ไม่เปลี่ยน)
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"unknown job kind {kind!r}, expected one of {JOB_KINDS}")
+        job_id = uuid.uuid4().hex
+        existing, created = await self.redis.eval(
+            _ENQUEUE_SCRIPT, 3,
+            self._key('dedup', f"{kind}:{dedup}"), self._job_key(job_id), self._key(kind, 'ready'),
+            job_id, kind, encode_json(payload), time.time(), self.max_attempts, self.dedup_ttl,
+            f"{self.prefix}:job:", '1' if payload.get('force') else '0'
+        )
+        return _str(existing), bool(created)
+
+    async def reserve(self, kind: str) -> Optional[dict]:
+        """
+        หยิบงานถัดไปของ `kind` (None ถ้าคิวว่าง) ผู้เรียกต้อง ack / fail หรือ touch ก่อนหมด visibility timeout
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        raw = await self.redis.eval(
+            _RESERVE_SCRIPT, 4,
+            self._key(kind, 'ready'), self._key(kind, 'processing'), self._key(kind, 'delayed'), self._key(kind, 'dead'),
+            now, now + self.visibility_timeout, token, f"{self.prefix}:job:"
+        )
+        if not raw:
+            return None
+        return _job(raw)
+
+    async def touch(self, job: dict) -> bool:
+        return bool(await self.redis.eval(
+            _TOUCH_SCRIPT, 2,
+            self._key(job['kind'], 'processing'), self._job_key(job['id']),
+            job['id'], job['token'], time.time() + self.visibility_timeout
+        ))
+
+    async def ack(self, job: dict, result: Optional[dict] = None) -> bool:
+        """
+        False = งานหมด visibility timeout และถูกส่งให้ worker อื่นไปแล้ว
+        """
+        return bool(await self.redis.eval(
+            _ACK_SCRIPT, 2,
+            self._key(job['kind'], 'processing'), self._job_key(job['id']),
+            job['id'], job['token'], encode_json(result), time.time(), self.result_ttl
+        ))
+
+    async def fail(self, job: dict, error: str, permanent: bool = False) -> str:
+        """
+        คืนค่า 'retrying', 'dead' หรือ 'lost' (หมด visibility timeout ไปแล้ว)
+        """
+        delay = min(self.retry_delay * 2 ** max(job['attempts'] - 1, 0), self.max_retry_delay)
+        now = time.time()
+        outcome = await self.redis.eval(
+            _FAIL_SCRIPT, 4,
+            self._key(job['kind'], 'processing'), self._key(job['kind'], 'delayed'), self._key(job['kind'], 'dead'),
+            self._job_key(job['id']),
+            job['id'], job['token'], error[:2000], now, now + delay, '1' if permanent else '0'
+        )
+        return _str(outcome)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        raw = await self.redis.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        job = _job([x for pair in raw.items() for x in pair])
+        job.pop('token', None)
+        return job
+
+    async def requeue_dead(self, kind: str, limit: Optional[int] = None) -> int:
+        moved = 0
+        while limit is None or moved < limit:
+            job_id = await self.redis.eval(
+                _REQUEUE_SCRIPT, 2, self._key(kind, 'dead'), self._key(kind, 'ready'),
+                f"{self.prefix}:job:", self.dedup_ttl
+            )
+            if not job_id:
+                break
+            moved += 1
+        return moved
+
+    async def stats(self, kinds: Iterable[str] = JOB_KINDS) -> dict:
+        pipe = self.redis.pipeline(transaction=False)
+        kinds = list(kinds)
+        for kind in kinds:
+            pipe.llen(self._key(kind, 'ready'))
+            pipe.zcard(self._key(kind, 'processing'))
+            pipe.zcard(self._key(kind, 'delayed'))
+            pipe.llen(self._key(kind, 'dead'))
+        counts = await pipe.execute()
+        return {
+            kind: dict(zip(('ready', 'processing', 'delayed', 'dead'), counts[i * 4:i * 4 + 4]))
+            for i, kind in enumerate(kinds)
+        }
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _job(flat: list) -> dict:
+    job = {_str(flat[i]): _str(flat[i + 1]) for i in range(0, len(flat), 2)}
+    for field in ('attempts', 'max_attempts'):
+        job[field] = int(job.get(field, 0))
+    for field in ('payload', 'result'):
+        if field in job:
+            job[field] = decode_json(job[field])
+    return job
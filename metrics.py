@@ -0,0 +1,111 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from pymongo import monitoring
+
+# การ scrape ช้าที่สุดคือ Chromium (หลายวินาที) ส่วน query / cache อยู่ระดับ ms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'API request latency (time to response headers for streaming responses)',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+SCRAPE_STAGE_SECONDS = Histogram(
+    'scrape_stage_seconds',
+    'Time spent in each stage of a scrape',
+    ['source', 'stage'],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    'upstream_request_seconds',
+    'Latency of requests to upstream sites',
+    ['host', 'transport', 'outcome'],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    'mongo_command_seconds',
+    'MongoDB command latency as reported by the driver',
+    ['command', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+BROWSER_PAGES_IN_USE = Gauge('browser_pages_in_use', 'Pages currently borrowed from the browser pool')
+DIVIDEND_EVENT_SUBSCRIBERS = Gauge('dividend_event_subscribers', 'Open /dividends/events streams')
+# changed / unchanged ต่อ source: สัดส่วน unchanged = scrape ที่ไม่ต้องเขียนลง DB
+SCRAPE_CONTENT_CHECKS = Counter(
+    'scrape_content_checks', 'Scraped tables compared with the stored content fingerprint', ['source', 'result']
+)
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    'upstream_concurrency_limit', 'Concurrent requests currently allowed per upstream host (AIMD)', ['host']
+)
+
+
+@contextmanager
+def observe_stage(source: str, stage: str):
+    """
+    จับเวลาหนึ่งขั้นตอนของการ scrape (นับรวมกรณี error ด้วย)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SCRAPE_STAGE_SECONDS.labels(source, stage).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def observe_upstream(host: str, transport: str):
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        UPSTREAM_REQUEST_SECONDS.labels(host, transport, outcome).observe(time.perf_counter() - started)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    listener ของ pymongo: บันทึกเวลาของทุก command (find, aggregate, update, ...) ที่ client ส่ง
+    """
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        MONGO_COMMAND_SECONDS.labels(event.command_name, 'ok').observe(event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        MONGO_COMMAND_SECONDS.labels(event.command_name, 'error').observe(event.duration_micros / 1e6)
+
+
+class StatsCollector:
+    """
+    export ตัวนับที่แต่ละ module เก็บไว้เป็น dict อยู่แล้ว (เช่น `TwoTierCache.stats()`) เป็น counter
+    ค่าถูกอ่านตอน Prometheus scrape จึงไม่ต้องแก้โค้ดที่นับ
+    """
+
+    def __init__(self):
+        self._sources: list[tuple[str, str, str, Callable[[], dict], tuple]] = []
+
+    def add(self, name: str, documentation: str, label: str, stats: Callable[[], dict], keys: Iterable[str]) -> None:
+        self._sources.append((name, documentation, label, stats, tuple(keys)))
+
+    def collect(self):
+        for name, documentation, label, stats, keys in self._sources:
+            family = CounterMetricFamily(name, documentation, labels=[label])
+            values = stats()
+            for key in keys:
+                family.add_metric([key], values.get(key, 0))
+            yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
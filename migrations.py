@@ -0,0 +1,127 @@
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, UTC
+
+from pymongo import UpdateOne
+
+from repository import DIVIDEND_SCHEMA_VERSION, SUMMARY_COLLECTION, rebuild_summary, typed_dividend_fields
+
+logger = logging.getLogger(__name__)
+
+# document ละ migration ที่รันจบแล้ว (_id = ชื่อ migration) รอบถัดไปข้ามได้โดยไม่ต้อง scan
+MIGRATIONS_COLLECTION = 'migrations'
+
+# field ต้นฉบับที่ต้องใช้คำนวณ typed field
+_SOURCE_FIELDS = {'amount': 1, 'yield_percent': 1, 'xd_date': 1, 'pay_date': 1, 'xd_date_utc': 1, 'pay_date_utc': 1}
+
+
+def migrate_typed_fields(collection, batch_size: int = 1000, dry_run: bool = False, force: bool = False) -> dict:
+    """
+    เติม amount_value / yield_value / xd_date_utc / pay_date_utc ให้ document เดิมที่ยังเป็น schema เก่า
+    รันซ้ำได้ (ข้าม document ที่ schema_version เป็นปัจจุบันแล้ว)
+
+    query หา document schema เก่าใช้ index ไม่ได้ (scan ทั้ง collection) จึงบันทึกไว้ใน `migrations` เมื่อรันจบ
+    แล้วรอบถัดไปข้ามทันที document ใหม่ได้ typed field จาก upsert_dividends อยู่แล้ว force=True scan ใหม่
+    """
+    marker = collection.database[MIGRATIONS_COLLECTION]
+    if not force and not dry_run:
+        done = marker.find_one({'_id': 'typed_fields'}, {'schema_version': 1})
+        if done and done.get('schema_version', 0) >= DIVIDEND_SCHEMA_VERSION:
+            return {'scanned': 0, 'updated': 0, 'skipped': True}
+
+    query = {'schema_version': {'$not': {'$gte': DIVIDEND_SCHEMA_VERSION}}}
+    report = {'scanned': 0, 'updated': 0}
+    ops = []
+
+    def flush():
+        if ops and not dry_run:
+            report['updated'] += collection.bulk_write(ops, ordered=False).modified_count
+        ops.clear()
+
+    for doc in collection.find(query, _SOURCE_FIELDS, batch_size=batch_size):
+        report['scanned'] += 1
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': typed_dividend_fields(doc)}))
+        if len(ops) >= batch_size:
+            flush()
+    flush()
+    if report['scanned']:
+        logger.info("Typed-field migration: scanned=%d updated=%d", report['scanned'], report['updated'])
+    if not dry_run:
+        marker.update_one(
+            {'_id': 'typed_fields'},
+            {'$set': {'schema_version': DIVIDEND_SCHEMA_VERSION, 'completed_at': datetime.now(UTC)}},
+            upsert=True
+        )
+    return report
+
+
+def ensure_summary(db) -> dict:
+    """
+    สร้าง collection summary ครั้งแรก (ว่างอยู่แต่มีข้อมูลปันผลแล้ว) หลังจากนั้นดูแลแบบ incremental ตอน ingest
+    """
+    if db[SUMMARY_COLLECTION].find_one({}, {'_id': 1}) is not None or db['dividends'].find_one({}, {'_id': 1}) is None:
+        return {'rebuilt': False}
+    report = rebuild_summary(db['dividends'])
+    logger.info("Built %s: %d documents", SUMMARY_COLLECTION, report['documents'])
+    return {'rebuilt': True, **report}
+
+
+def invalidate_api_cache() -> str:
+    """
+    ลบ response ที่ API cache ไว้ใน Redis และเพิ่ม version ของข้อมูลปันผล (ETag เดิมของ client ใช้ไม่ได้แล้ว)
+    """
+    import redis
+
+    from cache import DIVIDENDS_VERSION, all_dividend_cache_prefixes, bump_versions_sync, invalidate_redis_sync
+
+    client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
+        username=os.getenv('REDIS_USERNAME', 'default'),
+        password=os.getenv('REDIS_PASSWORD', None)
+    )
+    try:
+        invalidate_redis_sync(client, all_dividend_cache_prefixes())
+        bump_versions_sync(client, [DIVIDENDS_VERSION])
+        return 'invalidated'
+    except Exception as e:
+        logger.warning("Cannot invalidate API cache: %s", e)
+        return f'error: {e}'
+    finally:
+        client.close()
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Backfill typed dividend fields and rebuild the dividend summary")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help="only count documents that need migrating")
+    parser.add_argument('--force', action='store_true',
+                        help=f"scan for old-schema documents even if {MIGRATIONS_COLLECTION} records the migration as done")
+    parser.add_argument('--rebuild-summary', action='store_true',
+                        help=f"recompute the whole {SUMMARY_COLLECTION} collection after migrating")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    db = MongoClient(os.getenv('MONGO_URI', os.getenv('MONGO_URL')))['dividend_db']
+    report = {'typed_fields': migrate_typed_fields(
+        db['dividends'], batch_size=args.batch_size, dry_run=args.dry_run, force=args.force
+    )}
+    if args.rebuild_summary and not args.dry_run:
+        # $merge ต้องมี unique index (year, symbol) ก่อน
+        from indexes import reconcile_indexes
+        reconcile_indexes(db)
+        report['summary'] = rebuild_summary(db['dividends'])
+    if report['typed_fields']['updated'] or 'summary' in report:
+        report['cache'] = invalidate_api_cache()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import logging
+import os
+import sys
+import time
+from datetime import datetime, UTC
+from typing import Optional
+from urllib.parse import urlparse
+
+from browser_pool import BrowserPool, DEFAULT_USER_AGENT
+from metrics import SCRAPE_STAGE_SECONDS, observe_stage, observe_upstream
+from ratelimit import AdaptiveRateLimiter, UpstreamThrottled, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+PANPHOL_BASE_URL = os.getenv('PANPHOL_BASE_URL', 'https://aio.panphol.com')
+PANPHOL_HOST = urlparse(PANPHOL_BASE_URL).hostname
+
+
+class BasketNotFound(Exception):
+    """
+    หน้าเว็บไม่มีตาราง #basket (หรือไม่มี tbody)
+    """
+
+
+def dividend_url(symbol: str) -> str:
+    return f"{PANPHOL_BASE_URL}/stock/{symbol}/dividend"
+
+
+def normalize_date(date: str) -> Optional[datetime]:
+    def parse(dstr):
+        try:
+            d, m, y = dstr.split('/')
+            y = int(y)
+            if y < 100:
+                y += 2500           # สมมติรับปีเป็น 2 หลัก -> พ.ศ.
+            if y > 2200:            # แปลง พ.ศ. -> ค.ศ.
+                y -= 543
+            when = datetime(y, int(m), int(d), tzinfo=UTC)
+
+            # กรองปีเก่าออก
+            if when.year < datetime.now(UTC).year - 1:
+                return None
+            return when
+        except Exception:
+            return None
+
+    return parse(date)
+
+
+def extract_basket_rows(html: str) -> list[list[str]]:
+    """
+    ข้อความในแต่ละ cell ของตาราง table#basket (เฉพาะแถวที่มีครบ 7 คอลัมน์) ใช้ทั้งทำ fingerprint และแปลงเป็น document
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', id='basket')
+    if not table:
+        raise BasketNotFound('Dividend table not found')
+    tbody = table.find('tbody')
+    if not tbody:
+        raise BasketNotFound('No table body found')
+    rows = []
+    for row in tbody.find_all('tr'):
+        cols = [col.get_text(strip=True) for col in row.find_all(['td', 'th'])]
+        if len(cols) >= 7:
+            rows.append(cols)
+    return rows
+
+
+def basket_dividends(rows: list[list[str]], symbol: str, scraped_at: float) -> list[dict]:
+    """
+    แปลงแถวจาก extract_basket_rows เป็น list ของ dividend document
+    """
+    dividends = []
+    for cols in rows:
+        xd_date_utc = normalize_date(cols[4])
+        pay_date_utc = normalize_date(cols[5])
+        dividends.append({
+            'symbol': symbol,
+            'year': cols[0],
+            'quarter': cols[1],
+            'yield_percent': cols[2],
+            'amount': cols[3],
+            'xd_date': cols[4],
+            'pay_date': cols[5],
+            'type': cols[6],
+            'scraped_at': scraped_at,
+            'xd_date_utc': xd_date_utc if xd_date_utc else None,
+            'pay_date_utc': pay_date_utc if pay_date_utc else None
+        })
+    return dividends
+
+
+def parse_basket_html(html: str, symbol: str, scraped_at: float) -> list[dict]:
+    """
+    แปลงตาราง table#basket ของ panphol เป็น list ของ dividend document
+    """
+    return basket_dividends(extract_basket_rows(html), symbol, scraped_at)
+
+
+def is_timeout_error(e: Exception) -> bool:
+    """
+    timeout ของ Playwright หรือ httpx (ตรวจเฉพาะ module ที่ถูก import แล้ว ไม่ import เพิ่มเพื่อการนี้)
+    """
+    playwright = sys.modules.get('playwright.async_api')
+    if playwright is not None and isinstance(e, playwright.TimeoutError):
+        return True
+    httpx = sys.modules.get('httpx')
+    return httpx is not None and isinstance(e, httpx.TimeoutException)
+
+
+class PanpholScraper:
+    """
+    ดึงตารางปันผลของ panphol ด้วย HTTP client (keep-alive, pooled) ก่อน
+    ใช้ Chromium จาก BrowserPool เฉพาะเมื่อ HTML ที่ได้ไม่มีตาราง หรือตารางถูก render ฝั่ง client (ไม่มีแถว)
+
+    `scrape()` คืนค่า (rows, path) โดย rows มาจาก extract_basket_rows และ path เป็น 'http' หรือ 'browser'
+    (ผู้เรียกเทียบ fingerprint ก่อนแปลงเป็น document ด้วย basket_dividends)
+    httpx client ถูกสร้างตอน scrape ครั้งแรก
+    request ทั้งสองทางผ่าน `limiter` ของ host panphol (ดู ratelimit.AdaptiveRateLimiter)
+    """
+
+    def __init__(
+        self,
+        browser_pool: BrowserPool,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        http_enabled: bool = True,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+    ):
+        self.browser_pool = browser_pool
+        self.limiter = limiter or AdaptiveRateLimiter(PANPHOL_HOST, enabled=False)
+        self.http_enabled = http_enabled
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+        self.counters = {
+            'http': 0,
+            'browser': 0,
+            'http_fallbacks': 0,
+            'http_errors': 0,
+            'http_bytes': 0,
+            'browser_time_to_selector_total': 0.0,
+            'browser_time_to_selector_last': 0.0,
+        }
+
+    @classmethod
+    def from_env(cls, browser_pool: BrowserPool) -> "PanpholScraper":
+        return cls(
+            browser_pool,
+            timeout=float(os.getenv('PANPHOL_HTTP_TIMEOUT', 10)),
+            max_connections=int(os.getenv('PANPHOL_HTTP_MAX_CONNECTIONS', 20)),
+            http_enabled=os.getenv('PANPHOL_HTTP_FAST_PATH', '1') != '0',
+            limiter=AdaptiveRateLimiter.from_env('PANPHOL', PANPHOL_HOST),
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={
+                    'User-Agent': DEFAULT_USER_AGENT,
+                    'Accept': 'text/html,application/xhtml+xml',
+                    'Accept-Language': 'th,en;q=0.8',
+                },
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def scrape(self, symbol: str) -> tuple[list[list[str]], str]:
+        if self.http_enabled:
+            rows = await self._scrape_http(symbol)
+            if rows:
+                self.counters['http'] += 1
+                return rows, 'http'
+            self.counters['http_fallbacks'] += 1
+        rows = await self._scrape_browser(symbol)
+        self.counters['browser'] += 1
+        return rows, 'browser'
+
+    async def _scrape_http(self, symbol: str) -> Optional[list[list[str]]]:
+        import httpx
+
+        try:
+            async with self.limiter.acquire() as permit:
+                with observe_stage('panphol', 'http_fetch'), observe_upstream(PANPHOL_HOST, 'http'):
+                    response = await self.client.get(dividend_url(symbol))
+                permit.record_response(response.status_code, response.headers.get('retry-after'))
+            if response.status_code in (429, 503):
+                # ต้นทางขอให้ช้าลง: browser ก็จะโดนเหมือนกัน จึงไม่ fallback
+                raise UpstreamThrottled(PANPHOL_HOST, parse_retry_after(response.headers.get('retry-after')) or self.limiter.cooldown)
+            if response.status_code == 404:
+                # symbol ไม่มีอยู่จริง ไม่ต้องเปิด browser ให้เสียเวลา
+                raise BasketNotFound('Symbol not found')
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.counters['http_errors'] += 1
+            logger.info("panphol http fetch failed for %s: %s", symbol, e)
+            return None
+        self.counters['http_bytes'] += len(response.content)
+        try:
+            with observe_stage('panphol', 'parse'):
+                return extract_basket_rows(response.text)
+        except BasketNotFound:
+            return None
+
+    async def _scrape_browser(self, symbol: str) -> list[list[str]]:
+        acquire_started = time.perf_counter()
+        async with self.browser_pool.page() as page:
+            # รอ context ว่าง + เปิด page (รวม launch browser ใหม่ถ้าตัวเดิม crash)
+            SCRAPE_STAGE_SECONDS.labels('panphol', 'browser_acquire').observe(time.perf_counter() - acquire_started)
+            started = time.perf_counter()
+            with observe_upstream(PANPHOL_HOST, 'browser'):
+                async with self.limiter.acquire() as permit:
+                    with observe_stage('panphol', 'goto'):
+                        response = await page.goto(dividend_url(symbol), wait_until='domcontentloaded', timeout=30000)
+                    if response is not None:
+                        permit.record_response(response.status, response.headers.get('retry-after'))
+                if response is not None and response.status in (429, 503):
+                    raise UpstreamThrottled(PANPHOL_HOST, permit.retry_after or self.limiter.cooldown)
+                if response is not None and response.status == 404:
+                    raise BasketNotFound('Symbol not found')
+                with observe_stage('panphol', 'wait_selector'):
+                    try:
+                        await page.wait_for_selector('#basket', timeout=15000)
+                    except Exception as e:
+                        # หน้าโหลดได้ตามปกติแต่ไม่มีตาราง = symbol ไม่มีข้อมูล ไม่ใช่ต้นทางล่ม (ไม่นับเข้า circuit breaker)
+                        if response is not None and response.ok and is_timeout_error(e):
+                            raise BasketNotFound('Dividend table not found')
+                        raise
+            elapsed = time.perf_counter() - started
+            self.counters['browser_time_to_selector_total'] += elapsed
+            self.counters['browser_time_to_selector_last'] = elapsed
+            with observe_stage('panphol', 'page_content'):
+                content = await page.content()
+        with observe_stage('panphol', 'parse'):
+            return extract_basket_rows(content)
+
+    def stats(self) -> dict:
+        return dict(self.counters)
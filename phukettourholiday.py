@@ -6,16 +6,19 @@ from playwright.async_api import (
 import re
 import csv
 from datetime import datetime
+from resource_policy import ResourcePolicy
 
 
 class PhuketTour:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, resource_policy=None):
         self.base_url = "https://www.phukettourholiday.com"
         self.headless = headless
         self.browser = None
         self.context = None
         self.page = None
         self.tours_data = []  # เพิ่มตัวแปรสำหรับเก็บข้อมูลทัวร์
+        # ต้องคลิกเมนูด้วย role/name จึงไม่บล็อก stylesheet
+        self.resource_policy = resource_policy or ResourcePolicy.from_env('PHUKET', blocked_types=('image', 'media', 'font'))
 
     async def setup_browser(self):
         """
@@ -35,6 +38,7 @@ class PhuketTour:
                 viewport={"width": 1920, "height": 1080},
                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             )
+            await self.resource_policy.install(self.context)
             self.page = await self.context.new_page()
             print("เปิด Browser สำเร็จ")
         except Exception as e:
@@ -383,6 +387,7 @@ class PhuketTour:
         """
         if self.browser:
             await self.browser.close()
+            print(f"Resources: {self.resource_policy.snapshot()}")
             print("ปิด Browser สำเร็จ")
 
 
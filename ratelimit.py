@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from metrics import UPSTREAM_CONCURRENCY_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# เติม token ตามเวลาที่ผ่านไป แล้วรับ request ถ้ายังมี slot (lease ที่ยังไม่หมดอายุ < limit) และ token
+# คืนค่า {เวลาที่ต้องรอ, สาเหตุ} (วินาทีเป็น string เพราะ number ของ Lua ถูกตัดเป็น integer) 0 = ได้ slot แล้ว
+# สาเหตุ: 'paused' (ต้นทางขอให้หยุด), 'slots' (slot เต็ม), 'tokens' (เกิน rate)
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rate, burst = tonumber(ARGV[2]), tonumber(ARGV[3])
+local s = redis.call('hmget', KEYS[1], 'limit', 'tokens', 'ts', 'paused_until')
+local limit = tonumber(s[1]) or tonumber(ARGV[4])
+local tokens = tonumber(s[2]) or burst
+local ts = tonumber(s[3]) or now
+local paused = tonumber(s[4]) or 0
+if paused > now then
+    return {tostring(paused - now), 'paused'}
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+redis.call('zremrangebyscore', KEYS[2], '-inf', now)
+local wait, reason = 0, ''
+if redis.call('zcard', KEYS[2]) >= math.floor(limit) then
+    wait, reason = tonumber(ARGV[7]), 'slots'
+elseif tokens < 1 then
+    wait, reason = (1 - tokens) / rate, 'tokens'
+else
+    tokens = tokens - 1
+    redis.call('zadd', KEYS[2], ARGV[6], ARGV[5])
+end
+redis.call('hset', KEYS[1], 'limit', limit, 'tokens', tokens, 'ts', now)
+redis.call('expire', KEYS[1], 86400)
+redis.call('expire', KEYS[2], 86400)
+return {tostring(wait), reason}
+"""
+
+# คืน slot แล้วปรับ limit แบบ AIMD (ลดได้ไม่เกินครั้งละ cooldown วินาที) และหยุดส่งชั่วคราวถ้ามี pause
+_RELEASE_SCRIPT = """
+redis.call('zrem', KEYS[2], ARGV[1])
+local now = tonumber(ARGV[3])
+local limit = tonumber(redis.call('hget', KEYS[1], 'limit')) or tonumber(ARGV[9])
+local outcome = ARGV[2]
+if outcome == 'ok' then
+    limit = math.min(tonumber(ARGV[5]), limit + 1 / limit)
+elseif outcome ~= 'cancelled' then
+    local last = tonumber(redis.call('hget', KEYS[1], 'last_decrease')) or 0
+    if now - last >= tonumber(ARGV[7]) then
+        limit = math.max(tonumber(ARGV[4]), limit * tonumber(ARGV[6]))
+        redis.call('hset', KEYS[1], 'last_decrease', now)
+    end
+end
+local pause = tonumber(ARGV[8])
+if pause > 0 then
+    local paused = tonumber(redis.call('hget', KEYS[1], 'paused_until')) or 0
+    redis.call('hset', KEYS[1], 'paused_until', math.max(paused, now + pause))
+end
+redis.call('hset', KEYS[1], 'limit', limit)
+return tostring(limit)
+"""
+
+# ระยะ poll เมื่อ slot เต็ม (วินาที)
+_SLOT_POLL = 0.1
+
+
+class UpstreamThrottled(Exception):
+    """
+    ต้นทางตอบ 429 / 503 หรือยังอยู่ในช่วงหยุดตาม Retry-After (สัญญาณจากต้นทางจริง)
+    """
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Upstream {host} is rate limited, retry after {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class RateLimitTimeout(Exception):
+    """
+    รอ slot / token ของ limiter เกิน max_wait: คิวฝั่งเราเต็ม ไม่ได้แปลว่าต้นทางมีปัญหา
+    """
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Too many requests queued for {host}, retry after {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    header Retry-After เป็นวินาทีหรือ HTTP-date -> วินาทีนับจากตอนนี้
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Permit:
+    """
+    slot หนึ่งครั้ง: ผู้เรียกบอก status ของ response ผ่าน `record_response()` (ไม่บอก = ถือว่าสำเร็จ)
+    """
+
+    __slots__ = ('status', 'retry_after')
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def record_response(self, status: Optional[int], retry_after: Optional[str] = None) -> None:
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+    def outcome(self, latency: float, latency_target: float) -> str:
+        if self.status in (429, 503):
+            return 'throttled'
+        if self.status is not None and self.status >= 500:
+            return 'failed'
+        if latency > latency_target:
+            return 'slow'
+        return 'ok'
+
+
+class AdaptiveRateLimiter:
+    """
+    จำกัด request ที่ส่งไป host ต้นทางหนึ่ง host
+
+    - token bucket: เฉลี่ยไม่เกิน `rate` request/วินาที สะสมได้ไม่เกิน `burst`
+    - จำนวน request พร้อมกัน (limit) ปรับแบบ AIMD ระหว่าง `min_concurrency` ถึง `max_concurrency`:
+      สำเร็จและ latency ไม่เกิน `latency_target` -> limit += 1 / limit (ราว +1 ต่อ limit request)
+      429 / 5xx / timeout / error / ช้ากว่า target -> limit *= `decrease_factor` (ไม่เกินครั้งละ `cooldown` วินาที)
+    - 429 / 503: หยุดส่งไป host นั้นตาม Retry-After (ไม่มี = `cooldown` วินาที)
+    - รอนานเกิน `max_wait` วินาที -> UpstreamThrottled ถ้า host ถูกหยุดตาม Retry-After
+      หรือ RateLimitTimeout ถ้ารอ slot / token ของเราเอง
+
+    `share_via(redis)` ย้าย state ไปไว้ใน Redis (`{prefix}:{host}`) ให้ทุก worker / เครื่องใช้ limit และ bucket เดียวกัน
+    ถ้า Redis ใช้ไม่ได้จะกลับมาใช้ state ใน process ชั่วคราว
+    """
+
+    def __init__(
+        self,
+        host: str,
+        rate: float = 5.0,
+        burst: float = 10.0,
+        min_concurrency: int = 1,
+        max_concurrency: int = 8,
+        initial_concurrency: Optional[float] = None,
+        latency_target: float = 5.0,
+        decrease_factor: float = 0.5,
+        cooldown: float = 5.0,
+        max_wait: float = 10.0,
+        lease_timeout: float = 60.0,
+        enabled: bool = True,
+        prefix: str = 'ratelimit',
+    ):
+        self.host = host
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(max_concurrency, min_concurrency)
+        self.initial_concurrency = initial_concurrency or min(self.max_concurrency, max(min_concurrency, 2))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.lease_timeout = lease_timeout
+        self.enabled = enabled
+        self.prefix = prefix
+        self.redis = None
+        # state ใน process (ใช้เมื่อไม่มี Redis หรือ Redis ล่ม)
+        self.limit = float(self.initial_concurrency)
+        self.tokens = self.burst
+        self.in_flight = 0
+        self._ts = time.time()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._local_leases: set[str] = set()
+        self.counters = {'acquired': 0, 'wait_seconds': 0.0, 'throttled': 0, 'decreases': 0, 'rejected': 0}
+        UPSTREAM_CONCURRENCY_LIMIT.labels(host).set(self.limit)
+
+    @classmethod
+    def from_env(cls, prefix: str, host: str, **defaults) -> "AdaptiveRateLimiter":
+        """
+        อ่านค่าจาก env `{prefix}_RATE_LIMIT_RATE`, `_BURST`, `_MIN_CONCURRENCY`, `_MAX_CONCURRENCY`,
+        `_LATENCY_TARGET`, `_MAX_WAIT` และ `{prefix}_RATE_LIMIT_ENABLED` (0 = ปิด)
+        """
+        def env(name: str, cast, default):
+            value = os.getenv(f'{prefix}_RATE_LIMIT_{name}')
+            return cast(value) if value is not None else defaults.get(name.lower(), default)
+
+        return cls(
+            host,
+            rate=env('RATE', float, 5.0),
+            burst=env('BURST', float, 10.0),
+            min_concurrency=env('MIN_CONCURRENCY', int, 1),
+            max_concurrency=env('MAX_CONCURRENCY', int, 8),
+            latency_target=env('LATENCY_TARGET', float, 5.0),
+            max_wait=env('MAX_WAIT', float, 10.0),
+            enabled=os.getenv(f'{prefix}_RATE_LIMIT_ENABLED', '1') != '0',
+        )
+
+    def share_via(self, redis_client) -> None:
+        self.redis = redis_client
+
+    def _keys(self) -> tuple[str, str]:
+        return f"{self.prefix}:{self.host}", f"{self.prefix}:{self.host}:inflight"
+
+    @asynccontextmanager
+    async def acquire(self):
+        if not self.enabled:
+            yield Permit()
+            return
+        lease = uuid.uuid4().hex
+        started = time.monotonic()
+        while True:
+            wait, reason = await self._try_acquire(lease)
+            if wait <= 0:
+                break
+            waited = time.monotonic() - started
+            if waited + wait > self.max_wait:
+                self.counters['rejected'] += 1
+                if reason == 'paused':
+                    raise UpstreamThrottled(self.host, wait)
+                raise RateLimitTimeout(self.host, wait)
+            await asyncio.sleep(wait)
+        self.counters['acquired'] += 1
+        self.counters['wait_seconds'] += time.monotonic() - started
+
+        permit = Permit()
+        outcome = 'failed'
+        request_started = time.perf_counter()
+        try:
+            yield permit
+            outcome = permit.outcome(time.perf_counter() - request_started, self.latency_target)
+        except asyncio.CancelledError:
+            # client ยกเลิกเอง ไม่ใช่สัญญาณจากต้นทาง
+            outcome = 'cancelled'
+            raise
+        finally:
+            pause = 0.0
+            if outcome == 'throttled':
+                self.counters['throttled'] += 1
+                pause = permit.retry_after if permit.retry_after is not None else self.cooldown
+                logger.warning("rate limiter: %s throttled (status %s), pausing %.0fs", self.host, permit.status, pause)
+            await self._release(lease, outcome, pause)
+
+    async def _try_acquire(self, lease: str) -> tuple[float, str]:
+        """
+        คืนค่า (เวลาที่ต้องรอ, สาเหตุ) 0 = ได้ slot แล้ว (ดู _ACQUIRE_SCRIPT)
+        """
+        if self.redis is not None:
+            hash_key, inflight_key = self._keys()
+            now = time.time()
+            try:
+                wait, reason = await self.redis.eval(
+                    _ACQUIRE_SCRIPT, 2, hash_key, inflight_key,
+                    now, self.rate, self.burst, self.initial_concurrency, lease, now + self.lease_timeout, _SLOT_POLL
+                )
+                return float(wait), reason.decode() if isinstance(reason, bytes) else reason
+            except Exception as e:
+                logger.warning("rate limiter: redis unavailable for %s (%s), using local state", self.host, e)
+        return self._try_acquire_local(lease)
+
+    def _try_acquire_local(self, lease: str) -> tuple[float, str]:
+        now = time.time()
+        if self._paused_until > now:
+            return self._paused_until - now, 'paused'
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self._ts) * self.rate)
+        self._ts = now
+        if self.in_flight >= int(self.limit):
+            return _SLOT_POLL, 'slots'
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate, 'tokens'
+        self.tokens -= 1
+        self.in_flight += 1
+        self._local_leases.add(lease)
+        return 0.0, ''
+
+    async def _release(self, lease: str, outcome: str, pause: float) -> None:
+        previous = self.limit
+        if lease in self._local_leases:
+            self._release_local(lease, outcome, pause)
+        else:
+            hash_key, inflight_key = self._keys()
+            try:
+                self.limit = float(await self.redis.eval(
+                    _RELEASE_SCRIPT, 2, hash_key, inflight_key,
+                    lease, outcome, time.time(), self.min_concurrency, self.max_concurrency,
+                    self.decrease_factor, self.cooldown, pause, self.initial_concurrency
+                ))
+            except Exception as e:
+                # lease ใน Redis หมดอายุเองหลัง lease_timeout
+                logger.warning("rate limiter: cannot release %s lease: %s", self.host, e)
+        if self.limit < previous:
+            self.counters['decreases'] += 1
+        UPSTREAM_CONCURRENCY_LIMIT.labels(self.host).set(self.limit)
+
+    def _release_local(self, lease: str, outcome: str, pause: float) -> None:
+        self._local_leases.discard(lease)
+        self.in_flight -= 1
+        now = time.time()
+        if outcome == 'ok':
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        elif outcome != 'cancelled' and now - self._last_decrease >= self.cooldown:
+            self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+            self._last_decrease = now
+        if pause > 0:
+            self._paused_until = max(self._paused_until, now + pause)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            'wait_seconds': round(self.counters['wait_seconds'], 3),
+            'concurrency_limit': round(self.limit, 2),
+            'shared': self.redis is not None,
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+
+from repository import DividendRepository
+from universe import SymbolUniverse
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresher:
+    """
+    scrape symbol ที่ติดตามอยู่ (collection symbols + set.json) ล่วงหน้าก่อนข้อมูลจะหมดอายุ
+
+    - ทุก `interval` วินาทีจะวางแผนรายการ symbol ที่อายุข้อมูลเกิน `refresh_after`
+      เรียงตามอายุ (เทียบกับ `max_age`) คูณด้วยความถี่ที่ถูกเรียก
+    - scrape ทีละตัว เว้นระยะไม่ต่ำกว่า 60 / `per_minute` วินาที
+    - `request_refresh()` ใช้เมื่อ handler เสิร์ฟข้อมูลเก่าไปแล้ว ให้ refresh ตัวนั้นก่อนรายการตามแผน
+      (ทำงานแม้ปิดการวางแผนด้วย `plan_tracked=False`)
+    """
+
+    def __init__(
+        self,
+        repo: DividendRepository,
+        universe: SymbolUniverse,
+        scrape: Callable[[str], Awaitable],
+        max_age: float = 30 * 86400,
+        refresh_after: float = 25 * 86400,
+        interval: float = 300,
+        per_minute: float = 6,
+        plan_tracked: bool = True,
+    ):
+        self.repo = repo
+        self.universe = universe
+        self.scrape = scrape
+        self.max_age = max_age
+        self.refresh_after = refresh_after
+        self.interval = interval
+        self.min_spacing = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.plan_tracked = plan_tracked
+        self._requests: Counter = Counter()
+        self._urgent: list[str] = []
+        self._planned: list[str] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_plan = 0.0
+        self._last_scrape = 0.0
+        self.counters = {'refreshed': 0, 'failed': 0, 'urgent': 0, 'planned': 0}
+
+    @classmethod
+    def from_env(cls, repo, universe, scrape) -> "BackgroundRefresher":
+        max_age_days = float(os.getenv('PANPHOR_MAX_AGE_DAYS', 30))
+        return cls(
+            repo,
+            universe,
+            scrape,
+            max_age=max_age_days * 86400,
+            refresh_after=float(os.getenv('REFRESH_AFTER_DAYS', max_age_days * 5 / 6)) * 86400,
+            interval=float(os.getenv('REFRESH_INTERVAL', 300)),
+            per_minute=float(os.getenv('REFRESH_PER_MINUTE', 6)),
+            plan_tracked=os.getenv('REFRESHER_ENABLED', '1') != '0',
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._flush_requests()
+
+    def record_request(self, symbol: str) -> None:
+        self._requests[symbol] += 1
+
+    def request_refresh(self, symbol: str) -> None:
+        if symbol not in self._urgent:
+            self._urgent.append(symbol)
+            self.counters['urgent'] += 1
+            self._wakeup.set()
+
+    def is_stale(self, last_scraped_at: Optional[float], now: Optional[float] = None) -> bool:
+        if last_scraped_at is None:
+            return True
+        return (now or time.time()) - last_scraped_at >= self.refresh_after
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            'queued_urgent': len(self._urgent),
+            'queued_planned': len(self._planned),
+            'running': self._task is not None and not self._task.done(),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                symbol = await self._next_symbol()
+                if symbol is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._throttle()
+                await self._refresh(symbol)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("refresher: loop error: %s", e)
+                await asyncio.sleep(self.interval)
+
+    async def _next_symbol(self) -> Optional[str]:
+        if self._urgent:
+            return self._urgent.pop(0)
+        if self.plan_tracked and not self._planned and time.monotonic() - self._last_plan >= self.interval:
+            self._planned = await self._plan()
+            self._last_plan = time.monotonic()
+        if self._planned:
+            return self._planned.pop(0)
+        return None
+
+    async def _plan(self) -> list[str]:
+        await self._flush_requests()
+        tracked = list(dict.fromkeys(self.universe.symbols() + await self.repo.list_symbols()))
+        states = await self.repo.list_scrape_states(tracked)
+        now = time.time()
+        scored = []
+        for symbol in tracked:
+            state = states.get(symbol, {})
+            last = state.get('last_scraped_at')
+            if not self.is_stale(last, now):
+                continue
+            # ยังไม่เคย scrape = เก่าที่สุด
+            age_ratio = (now - last) / self.max_age if last is not None else 10.0
+            scored.append((age_ratio * (1 + math.log1p(state.get('requests', 0))), symbol))
+        scored.sort(reverse=True)
+        self.counters['planned'] += len(scored)
+        return [s for _, s in scored]
+
+    async def _throttle(self) -> None:
+        wait = self._last_scrape + self.min_spacing - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._last_scrape = time.monotonic()
+
+    async def _refresh(self, symbol: str) -> None:
+        # worker/replica อื่นอาจ refresh ไปแล้วระหว่างรอคิว
+        state = await self.repo.get_scrape_state(symbol)
+        if state and not self.is_stale(state.get('last_scraped_at')):
+            return
+        try:
+            await self.scrape(symbol)
+            self.counters['refreshed'] += 1
+        except Exception as e:
+            self.counters['failed'] += 1
+            logger.info("refresher: scrape failed for %s: %s", symbol, getattr(e, 'detail', e))
+
+    async def _flush_requests(self) -> None:
+        if not self._requests:
+            return
+        counts, self._requests = dict(self._requests), Counter()
+        try:
+            await self.repo.add_request_counts(counts)
+        except Exception as e:
+            logger.warning("refresher: cannot store request counts: %s", e)
@@ -0,0 +1,559 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+from functools import partial
+from typing import AsyncIterator, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# field ที่ระบุตัวตนของปันผลหนึ่งรายการ (unique index + filter ของ upsert)
+DIVIDEND_KEY_FIELDS = ('symbol', 'year', 'quarter', 'xd_date', 'amount', 'type')
+# field ที่ตั้งค่าเฉพาะตอน insert ครั้งแรก (ไม่นับเป็นการเปลี่ยนแปลงเมื่อ scrape ซ้ำ)
+INSERT_ONLY_FIELDS = ('scraped_at',)
+
+# field ที่ส่งออกไปกับ response (ไม่รวม _id)
+DIVIDEND_PROJECTION = {
+    '_id': 0,
+    'symbol': 1,
+    'year': 1,
+    'quarter': 1,
+    'yield_percent': 1,
+    'amount': 1,
+    'xd_date': 1,
+    'pay_date': 1,
+    'type': 1,
+    'scraped_at': 1,
+    'xd_date_utc': 1,
+    'pay_date_utc': 1,
+    'amount_value': 1,
+    'yield_value': 1
+}
+
+# latest_dividend ใน summary เป็นสำเนาทั้ง document -> ส่งออกเฉพาะ field เดียวกับ DIVIDEND_PROJECTION
+SUMMARY_PROJECTION = {
+    '_id': 0,
+    'symbol': 1,
+    **{f'latest_dividend.{k}': 1 for k in DIVIDEND_PROJECTION if k != '_id'}
+}
+
+# ปฏิทิน XD ของ SET: fingerprint ของเนื้อหาต่อเดือน (key 'month' = 'YYYY-MM')
+CALENDAR_STATE_COLLECTION = 'calendar_state'
+
+# เปลี่ยนเมื่อวิธี normalize ตารางหรือการแปลงแถวเป็น document เปลี่ยน (fingerprint เดิมจะไม่ตรง -> เขียนใหม่ทั้งชุด)
+CONTENT_FINGERPRINT_VERSION = 1
+
+# version ของรูปแบบ document: 2 = มี field ที่แปลงเป็นตัวเลข / datetime แล้ว (ดู normalize_dividend)
+DIVIDEND_SCHEMA_VERSION = 2
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def parse_number(value) -> Optional[float]:
+    """
+    '0.18', '3.05%', '1,234.50 บาท' -> float ('' / '-' / แปลงไม่ได้ = None)
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return None
+    match = _NUMBER.search(str(value).replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def parse_ddmmyy(value) -> Optional[datetime]:
+    """
+    'dd/mm/yy' หรือ 'dd/mm/yyyy' (พ.ศ. หรือ ค.ศ.) -> datetime UTC (แปลงไม่ได้ = None)
+    """
+    if isinstance(value, datetime):
+        return value
+    try:
+        d, m, y = str(value).split('/')
+        y = int(y)
+        if y < 100:
+            y += 2500           # ปี 2 หลัก = พ.ศ.
+        if y > 2200:            # พ.ศ. -> ค.ศ.
+            y -= 543
+        return datetime(y, int(m), int(d), tzinfo=UTC)
+    except (TypeError, ValueError):
+        return None
+
+
+def typed_dividend_fields(d: dict) -> dict:
+    """
+    field ที่แปลงจาก string ต้นฉบับครั้งเดียวตอนบันทึก (string เดิมยังเก็บไว้ใช้แสดงผล)
+    วันที่ที่ scraper ตัดทิ้ง (ปีเก่า) จะถูกแปลงจาก string แทน
+    """
+    return {
+        'amount_value': parse_number(d.get('amount')),
+        'yield_value': parse_number(d.get('yield_percent')),
+        'xd_date_utc': d.get('xd_date_utc') or parse_ddmmyy(d.get('xd_date')),
+        'pay_date_utc': d.get('pay_date_utc') or parse_ddmmyy(d.get('pay_date')),
+        'schema_version': DIVIDEND_SCHEMA_VERSION,
+    }
+
+
+# ปันผลล่าสุดต่อ (year, symbol) ที่คำนวณไว้ล่วงหน้า (ดู refresh_summary / rebuild_summary)
+SUMMARY_COLLECTION = 'dividend_summary'
+
+
+def upcoming_dividends_filter(today: datetime, symbol: Optional[str] = None) -> dict:
+    query = {'type': 'เงินปันผล', 'pay_date_utc': {'$gte': today}}
+    if symbol:
+        query['symbol'] = symbol
+    return query
+
+
+def content_fingerprint(rows: Iterable) -> str:
+    """
+    sha256 ของเนื้อหาตารางที่ normalize แล้ว (แถวละ list / tuple ของข้อความ) ใช้ตัดสินว่าต้องเขียนลง DB หรือไม่
+    รวมปีปัจจุบันด้วย เพราะการแปลงวันที่ตัดปีที่เก่ากว่าปีที่แล้วทิ้ง (แถวเดิมให้ document ต่างไปเมื่อขึ้นปีใหม่)
+    """
+    payload = json.dumps(
+        [CONTENT_FINGERPRINT_VERSION, datetime.now(UTC).year, [list(r) for r in rows]],
+        ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_calendar_state(db, year: int, month: int) -> Optional[dict]:
+    return db[CALENDAR_STATE_COLLECTION].find_one({'month': f'{year:04d}-{month:02d}'}, {'_id': 0})
+
+
+def mark_calendar_scraped(db, year: int, month: int, scraped_at: float, content_hash: Optional[str] = None, rows: int = 0) -> None:
+    """
+    บันทึกว่าปฏิทินเดือนนี้ถูก scrape แล้ว ถ้าให้ content_hash (เนื้อหาเปลี่ยนและเขียนลง DB แล้ว) จะเก็บ fingerprint ใหม่ด้วย
+    """
+    update = {'$set': {'last_scraped_at': scraped_at}, '$inc': {f"checks.{'changed' if content_hash else 'unchanged'}": 1}}
+    if content_hash:
+        update['$set'].update({'content_hash': content_hash, 'content_rows': rows, 'content_changed_at': scraped_at})
+    db[CALENDAR_STATE_COLLECTION].update_one({'month': f'{year:04d}-{month:02d}'}, update, upsert=True)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values) -> str:
+    """
+    cursor แบบ opaque ของ keyset pagination (datetime -> iso, ObjectId -> hex)
+    """
+    parts = [v.isoformat() if isinstance(v, datetime) else str(v) for v in values]
+    return base64.urlsafe_b64encode('|'.join(parts).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list[str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def _after_pay_date(cursor: Optional[str]) -> dict:
+    """
+    เงื่อนไข "อยู่หลัง cursor" ตามลำดับ (pay_date_utc, _id)
+    """
+    if not cursor:
+        return {}
+    parts = decode_cursor(cursor)
+    try:
+        pay_date = datetime.fromisoformat(parts[0])
+        last_id = ObjectId(parts[1])
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return {'$or': [
+        {'pay_date_utc': {'$gt': pay_date}},
+        {'pay_date_utc': pay_date, '_id': {'$gt': last_id}},
+    ]}
+
+
+def _after_id(cursor: Optional[str]) -> dict:
+    if not cursor:
+        return {}
+    parts = decode_cursor(cursor)
+    try:
+        return {'_id': {'$gt': ObjectId(parts[0])}}
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def latest_dividend_pipeline(match: dict) -> list[dict]:
+    """
+    ปันผลล่าสุด (ตามวัน XD แล้วตามวันจ่าย) ต่อ (year, symbol) ของ document ที่ตรงกับ `match`
+    sort ตรงกับ index year_symbol จึงไม่ต้อง sort ใน memory
+    """
+    return [
+        {'$match': match},
+        {'$sort': {'year': 1, 'symbol': 1, 'xd_date_utc': -1, 'pay_date_utc': -1}},
+        {'$group': {'_id': {'year': '$year', 'symbol': '$symbol'}, 'latest': {'$first': '$$ROOT'}}},
+        {'$project': {'_id': 0, 'year': '$_id.year', 'symbol': '$_id.symbol', 'latest_dividend': '$latest'}},
+        {'$unset': ['latest_dividend._id']},
+    ]
+
+
+def _merge_summary(updated_at: datetime) -> list[dict]:
+    return [
+        {'$set': {'updated_at': updated_at}},
+        {'$merge': {
+            'into': SUMMARY_COLLECTION,
+            'on': ['year', 'symbol'],
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert',
+        }},
+    ]
+
+
+def refresh_summary(dividends, symbols: Iterable[str], years: Optional[Iterable[str]] = None) -> None:
+    """
+    คำนวณแถวของ summary ใหม่เฉพาะ (year, symbol) ที่ได้รับผลกระทบจากการ ingest แล้ว $merge ลง collection summary
+    """
+    match = {'symbol': {'$in': list(symbols)}}
+    if years is not None:
+        match['year'] = {'$in': list(years)}
+    dividends.aggregate(latest_dividend_pipeline(match) + _merge_summary(datetime.now(UTC)))
+
+
+def rebuild_summary(dividends) -> dict:
+    """
+    สร้าง collection summary ใหม่ทั้งหมดจาก dividends (ใช้ตอน backfill) แล้วลบแถวที่ไม่มีที่มาแล้ว
+    """
+    # BSON datetime ละเอียดแค่ ms จึงตัดเศษทิ้งก่อนใช้เทียบ
+    started = datetime.now(UTC)
+    started = started.replace(microsecond=started.microsecond // 1000 * 1000)
+    dividends.aggregate(latest_dividend_pipeline({}) + _merge_summary(started), allowDiskUse=True)
+    summary = dividends.database[SUMMARY_COLLECTION]
+    removed = summary.delete_many({'updated_at': {'$lt': started}}).deleted_count
+    return {'documents': summary.count_documents({}), 'removed': removed}
+
+
+def remove_duplicate_dividends(collection) -> int:
+    pipeline = [
+        {'$sort': {'scraped_at': -1}},
+        {'$group': {
+            '_id': {f: f'${f}' for f in DIVIDEND_KEY_FIELDS},
+            'ids': {'$push': '$_id'},
+            'count': {'$sum': 1},
+        }},
+        {'$match': {'count': {'$gt': 1}}},
+    ]
+    to_delete = []
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        to_delete.extend(group['ids'][1:])
+    if not to_delete:
+        return 0
+    return collection.delete_many({'_id': {'$in': to_delete}}).deleted_count
+
+
+def _stored_value(value):
+    # pymongo คืน datetime แบบ naive (UTC) -> แปลงค่าที่จะเขียนให้เป็นแบบเดียวกันก่อนเทียบ
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def upsert_dividends(collection, dividends: list[dict]) -> dict:
+    """
+    เขียนปันผลทั้งชุดด้วย bulk_write แบบ unordered ครั้งเดียว (upsert ตาม DIVIDEND_KEY_FIELDS)
+    อ่าน document เดิมของชุดนี้ก่อน แล้วส่ง op เฉพาะแถวใหม่และแถวที่ field เปลี่ยนจริง
+    คืนค่าจำนวน inserted / updated / unchanged, symbol ที่ข้อมูลเปลี่ยน และ changes (ใช้ส่ง event)
+    """
+    filters = []
+    docs = []
+    mutables = []
+    seen = set()
+    for d in dividends:
+        key = tuple(d.get(f, '') for f in DIVIDEND_KEY_FIELDS)
+        if key in seen:
+            continue
+        seen.add(key)
+        d = {**d, **typed_dividend_fields(d)}
+        filters.append(dict(zip(DIVIDEND_KEY_FIELDS, key)))
+        docs.append(d)
+        mutables.append({k: v for k, v in d.items() if k not in DIVIDEND_KEY_FIELDS + INSERT_ONLY_FIELDS and k != '_id'})
+    result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'changed_symbols': [], 'changes': []}
+    if not docs:
+        return result
+    existing = {
+        tuple(doc.get(f, '') for f in DIVIDEND_KEY_FIELDS): doc
+        for doc in collection.find({'$or': filters}, {'_id': 0})
+    }
+    ops = []
+    op_rows = []
+    for i, (f, d, mutable) in enumerate(zip(filters, docs, mutables)):
+        stored = existing.get(tuple(f.values()))
+        if stored is not None and all(k in stored and stored[k] == _stored_value(v) for k, v in mutable.items()):
+            continue
+        update = {'$setOnInsert': {k: d[k] for k in DIVIDEND_KEY_FIELDS + INSERT_ONLY_FIELDS if k in d}}
+        if mutable:
+            update['$set'] = mutable
+        ops.append(UpdateOne(f, update, upsert=True))
+        op_rows.append(i)
+    if not ops:
+        result['unchanged'] = len(docs)
+        return result
+    try:
+        res = collection.bulk_write(ops, ordered=False)
+        inserted, modified = res.upserted_count, res.modified_count
+        inserted_at = set(res.upserted_ids or {})
+    except BulkWriteError as e:
+        # upsert ชนกันกับ writer อื่น (duplicate key) = มีข้อมูลอยู่แล้ว นับเป็น unchanged
+        details = e.details
+        fatal = [err for err in details.get('writeErrors', []) if err.get('code') != 11000]
+        if fatal:
+            raise
+        inserted, modified = details.get('nUpserted', 0), details.get('nModified', 0)
+        inserted_at = {u['index'] for u in details.get('upserted', [])}
+    result['inserted'] = inserted
+    result['updated'] = modified
+    result['unchanged'] = len(docs) - inserted - modified
+    # op ที่ไม่ใช่ insert คือแถวที่ต่างจาก document เดิมตอนอ่าน (ถ้า writer อื่นเขียนค่าเดียวกันไปก่อน modified จะเป็น 0)
+    changed_at = [
+        j for j, i in enumerate(op_rows)
+        if j in inserted_at or (modified and tuple(filters[i].values()) in existing)
+    ]
+    result['changes'] = [
+        ('insert' if j in inserted_at else 'update',
+         {k: docs[op_rows[j]][k] for k in DIVIDEND_PROJECTION if k != '_id' and k in docs[op_rows[j]]})
+        for j in changed_at
+    ]
+    changed = {filters[op_rows[j]]['symbol'] for j in changed_at}
+    result['changed_symbols'] = sorted(changed)
+    if changed:
+        years = {f['year'] for f in filters if f['symbol'] in changed}
+        try:
+            refresh_summary(collection, changed, years)
+        except Exception as e:
+            # ข้อมูลปันผลบันทึกแล้ว summary ตามทันได้ด้วย `python migrations.py --rebuild-summary`
+            logger.error("Cannot refresh %s for %s: %s", SUMMARY_COLLECTION, sorted(changed), e)
+    return result
+
+
+class DividendRepository:
+    """
+    data layer ของ collection dividends / symbols สำหรับ handler แบบ async
+
+    pymongo เป็น driver แบบ sync จึงรันทุก operation (รวมถึงการวน cursor) ใน thread pool
+    ของตัวเอง ขนาดเท่ากับ connection pool ของ MongoClient เพื่อไม่ให้ block event loop
+    """
+
+    def __init__(self, db, max_workers: int = 32):
+        self.dividends = db['dividends']
+        self.symbols = db['symbols']
+        self.scrape_state = db['scrape_state']
+        self.summary = db[SUMMARY_COLLECTION]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mongo')
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---- dividends ----
+
+    async def find_dividends_by_symbol(self, symbol: str) -> list[dict]:
+        return await self.run(
+            lambda: list(self.dividends.find({'symbol': symbol}, DIVIDEND_PROJECTION))
+        )
+
+    async def find_latest_dividends(self, year: str, symbols: list[str]) -> list[dict]:
+        """
+        คืนค่า [{'symbol', 'latest_dividend'}] เรียงตามลำดับของ `symbols`
+        """
+        docs = await self.run(
+            lambda: list(self.summary.find(
+                {'year': year, 'symbol': {'$in': symbols}},
+                SUMMARY_PROJECTION
+            ))
+        )
+        order = {s: i for i, s in enumerate(symbols)}
+        docs.sort(key=lambda d: order.get(d['symbol'], len(order)))
+        return docs
+
+    async def find_upcoming_dividends(self, today: datetime, symbol: Optional[str] = None) -> list[dict]:
+        return await self.run(
+            lambda: list(self.dividends.find(
+                upcoming_dividends_filter(today, symbol),
+                DIVIDEND_PROJECTION
+            ).sort([('pay_date_utc', 1), ('_id', 1)]))
+        )
+
+    async def page_upcoming_dividends(
+        self,
+        today: datetime,
+        limit: int,
+        cursor: Optional[str] = None,
+        symbol: Optional[str] = None
+    ) -> tuple[list[dict], Optional[str]]:
+        """
+        หน้าหนึ่งของปันผลที่ใกล้จ่าย เรียงตาม (pay_date_utc, _id) คืนค่า (docs, next_cursor)
+        """
+        query = {**upcoming_dividends_filter(today, symbol), **_after_pay_date(cursor)}
+        docs = await self.run(
+            lambda: list(self.dividends.find(
+                query, {**DIVIDEND_PROJECTION, '_id': 1}
+            ).sort([('pay_date_utc', 1), ('_id', 1)]).limit(limit))
+        )
+        next_cursor = None
+        if len(docs) == limit:
+            next_cursor = encode_cursor(docs[-1]['pay_date_utc'], docs[-1]['_id'])
+        for d in docs:
+            d.pop('_id')
+        return docs, next_cursor
+
+    async def page_dividends_by_symbol(
+        self,
+        symbol: str,
+        limit: int,
+        cursor: Optional[str] = None
+    ) -> tuple[list[dict], Optional[str]]:
+        """
+        หน้าหนึ่งของ history ของ symbol เรียงตาม _id (ลำดับที่บันทึก) คืนค่า (docs, next_cursor)
+        """
+        query = {'symbol': symbol, **_after_id(cursor)}
+        docs = await self.run(
+            lambda: list(self.dividends.find(
+                query, {**DIVIDEND_PROJECTION, '_id': 1}
+            ).sort('_id', 1).limit(limit))
+        )
+        next_cursor = encode_cursor(docs[-1]['_id']) if len(docs) == limit else None
+        for d in docs:
+            d.pop('_id')
+        return docs, next_cursor
+
+    async def iter_upcoming_dividends(
+        self,
+        today: datetime,
+        symbol: Optional[str] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[dict]:
+        """
+        วนทุกรายการทีละ batch (keyset) โดยไม่ต้องโหลดทั้งหมดเข้า memory
+        """
+        cursor = None
+        while True:
+            docs, cursor = await self.page_upcoming_dividends(today, batch_size, cursor, symbol)
+            for d in docs:
+                yield d
+            if cursor is None:
+                return
+
+    async def iter_dividends_by_symbol(self, symbol: str, batch_size: int = 500) -> AsyncIterator[dict]:
+        cursor = None
+        while True:
+            docs, cursor = await self.page_dividends_by_symbol(symbol, batch_size, cursor)
+            for d in docs:
+                yield d
+            if cursor is None:
+                return
+
+    async def find_dividend_columns(
+        self,
+        symbols: list[str],
+        since: datetime,
+        fields: Iterable[str],
+        dividend_type: str = 'เงินปันผล'
+    ) -> dict[str, list]:
+        """
+        ดึงแถวปันผลของทุก symbol ที่ XD ตั้งแต่ `since` ใน query เดียว คืนค่าเป็นคอลัมน์ {field: [values]}
+        """
+        fields = tuple(fields)
+
+        def load() -> dict[str, list]:
+            columns = {f: [] for f in fields}
+            cursor = self.dividends.find(
+                {'type': dividend_type, 'symbol': {'$in': symbols}, 'xd_date_utc': {'$gte': since}},
+                {'_id': 0, **{f: 1 for f in fields}},
+                batch_size=5000
+            )
+            for doc in cursor:
+                for f in fields:
+                    columns[f].append(doc.get(f))
+            return columns
+
+        return await self.run(load)
+
+    async def upsert_dividends(self, dividends: list[dict]) -> dict:
+        return await self.run(upsert_dividends, self.dividends, dividends)
+
+    async def count_panphol_dividends(self, symbol: str) -> int:
+        """
+        จำนวนแถวของ symbol ที่มาจาก panphol (แถวจากปฏิทิน SET มี round_period เสมอ และใช้ key คนละชุด)
+        """
+        return await self.run(
+            self.dividends.count_documents, {'symbol': symbol, 'round_period': {'$exists': False}}
+        )
+
+    # ---- scrape state (ความสดของข้อมูลต่อ symbol) ----
+
+    async def get_scrape_state(self, symbol: str) -> Optional[dict]:
+        return await self.run(self.scrape_state.find_one, {'symbol': symbol}, {'_id': 0})
+
+    async def list_scrape_states(self, symbols: list[str]) -> dict[str, dict]:
+        docs = await self.run(
+            lambda: list(self.scrape_state.find({'symbol': {'$in': symbols}}, {'_id': 0}))
+        )
+        return {d['symbol']: d for d in docs}
+
+    async def mark_scraped(
+        self, symbol: str, scraped_at: float, content_hash: Optional[str] = None, content_rows: int = 0
+    ) -> None:
+        """
+        ต่ออายุความสดของ symbol ถ้าให้ content_hash (ตารางเปลี่ยนและเขียนลง DB แล้ว) จะเก็บ fingerprint ใหม่ด้วย
+        """
+        fields = {'last_scraped_at': scraped_at}
+        if content_hash:
+            fields.update({'content_hash': content_hash, 'content_rows': content_rows, 'content_changed_at': scraped_at})
+        await self.run(
+            self.scrape_state.update_one,
+            {'symbol': symbol},
+            {'$set': fields, '$setOnInsert': {'requests': 0}},
+            upsert=True
+        )
+
+    async def add_request_counts(self, counts: dict[str, int]) -> None:
+        """
+        สะสมจำนวนครั้งที่ถูกเรียกต่อ symbol (ใช้จัดลำดับความสำคัญของการ refresh)
+        """
+        if not counts:
+            return
+        ops = [
+            UpdateOne({'symbol': s}, {'$inc': {'requests': n}}, upsert=True)
+            for s, n in counts.items()
+        ]
+        await self.run(self.scrape_state.bulk_write, ops, ordered=False)
+
+    # ---- symbols ----
+
+    async def list_symbols(self) -> list[str]:
+        docs = await self.run(lambda: list(self.symbols.find({}, {'_id': 0, 'symbol': 1})))
+        return [s['symbol'] for s in docs]
+
+    async def insert_symbols(self, symbols: Iterable[str]) -> tuple[list[str], list[str]]:
+        """
+        เพิ่ม symbol ที่ยังไม่มี คืนค่า (inserted, skipped)
+        """
+        return await self.run(self._insert_symbols, set(symbols))
+
+    def _insert_symbols(self, input_symbols: set) -> tuple[list[str], list[str]]:
+        existing = set(s['symbol'] for s in self.symbols.find(
+            {'symbol': {'$in': list(input_symbols)}}, {'symbol': 1, '_id': 0}
+        ))
+        to_insert = [{'symbol': s} for s in input_symbols if s not in existing]
+        if to_insert:
+            self.symbols.insert_many(to_insert)
+        return [s['symbol'] for s in to_insert], list(existing)
+
+    async def delete_symbols(self, symbols: list[str]) -> int:
+        result = await self.run(self.symbols.delete_many, {'symbol': {'$in': symbols}})
+        return result.deleted_count
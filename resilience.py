@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND = 'not_found'
+UPSTREAM_ERROR = 'upstream_error'
+
+
+class NegativeCache:
+    """
+    จำผลลัพธ์ที่ล้มเหลวของ symbol ไว้ช่วงสั้น ๆ (LRU ใน process + Redis) เพื่อไม่ต้อง scrape ซ้ำ
+
+    - `not_found`: หน้าไม่มีตารางปันผล (symbol ไม่มีอยู่จริง) อายุ `not_found_ttl`
+    - `upstream_error`: timeout / error จากต้นทาง อายุ `error_ttl`
+    """
+
+    def __init__(self, redis_client, not_found_ttl: int = 3600, error_ttl: int = 60, prefix: str = 'negative'):
+        self.redis = redis_client
+        self.ttls = {NOT_FOUND: not_found_ttl, UPSTREAM_ERROR: error_ttl}
+        self.prefix = prefix
+        self.local = TTLCache(maxsize=4096, ttl=max(not_found_ttl, error_ttl))
+        self.counters = {'hits': 0, 'stored': 0}
+
+    @classmethod
+    def from_env(cls, redis_client) -> "NegativeCache":
+        return cls(
+            redis_client,
+            not_found_ttl=int(os.getenv('NEGATIVE_CACHE_NOT_FOUND_TTL', 3600)),
+            error_ttl=int(os.getenv('NEGATIVE_CACHE_ERROR_TTL', 60)),
+        )
+
+    def _key(self, symbol: str) -> str:
+        return f"{self.prefix}:{symbol}"
+
+    async def get(self, symbol: str) -> Optional[dict]:
+        raw = self.local.get(symbol)
+        if raw is None:
+            try:
+                raw = await self.redis.get(self._key(symbol))
+            except Exception as e:
+                logger.warning("negative cache: redis get failed for %s: %s", symbol, e)
+                raw = None
+            if raw is not None:
+                ttl = self.ttls[UPSTREAM_ERROR]
+                self.local.set(symbol, raw, ttl)
+        if raw is None:
+            return None
+        self.counters['hits'] += 1
+        return json.loads(raw)
+
+    async def put(self, symbol: str, kind: str, status_code: int, detail: str) -> None:
+        ttl = self.ttls[kind]
+        raw = json.dumps({'kind': kind, 'status_code': status_code, 'detail': detail}, ensure_ascii=False).encode('utf-8')
+        self.local.set(symbol, raw, ttl)
+        self.counters['stored'] += 1
+        try:
+            await self.redis.set(self._key(symbol), raw, ex=ttl)
+        except Exception as e:
+            logger.warning("negative cache: redis set failed for %s: %s", symbol, e)
+
+    async def clear(self, symbol: str) -> None:
+        self.local.delete(symbol)
+        try:
+            await self.redis.delete(self._key(symbol))
+        except Exception as e:
+            logger.warning("negative cache: redis delete failed for %s: %s", symbol, e)
+
+    def stats(self) -> dict:
+        return {**self.counters, 'local_size': len(self.local)}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Upstream {host} is failing, retry after {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    circuit breaker ต่อ host ต้นทาง
+
+    closed -> open เมื่อล้มเหลวติดกัน `failure_threshold` ครั้ง, เปิดค้าง `reset_timeout` วินาที
+    จากนั้นเป็น half_open ให้ลองได้ครั้งเดียว: สำเร็จ = closed, ล้มเหลว = open อีกรอบ
+    """
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def check(self) -> bool:
+        """
+        raise CircuitOpenError ถ้ายังไม่ควรส่ง request ไปที่ host นี้
+        คืนค่า True ถ้า request นี้เป็นครั้งลองของ half_open (ผู้เรียกต้อง release_trial() ใน finally)
+        """
+        state = self.state
+        if state == 'closed':
+            return False
+        if state == 'half_open' and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(self.host, retry_after)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """
+        คืนสิทธิ์ลองของ half_open ที่จบโดยไม่ได้ record ผล (เช่น ถูก cancel) ให้ request ถัดไปลองแทน
+        """
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                logger.warning("circuit breaker: %s opened after %d failure(s)", self.host, self.failures)
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {'state': self.state, 'failures': self.failures}
+
+
+class CircuitBreakerRegistry:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreakerRegistry":
+        return cls(
+            failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5)),
+            reset_timeout=float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30)),
+        )
+
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+            self._breakers[host] = breaker
+        return breaker
+
+    def stats(self) -> dict:
+        return {host: b.stats() for host, b in self._breakers.items()}
@@ -0,0 +1,109 @@
+import asyncio
+import os
+from typing import Iterable, Optional
+from urllib.parse import urlparse
+
+# ประเภท resource ของ Playwright ที่ไม่จำเป็นต่อการอ่านตาราง
+DEFAULT_BLOCKED_TYPES = ('image', 'media', 'font', 'stylesheet')
+
+# host ของโฆษณา / analytics / tracker ที่พบบ่อย (บล็อกรวม subdomain)
+DEFAULT_BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'doubleclick.net',
+    'adservice.google.com',
+    'facebook.net',
+    'facebook.com',
+    'connect.facebook.net',
+    'hotjar.com',
+    'clarity.ms',
+    'tiktok.com',
+    'analytics.tiktok.com',
+    'criteo.com',
+    'taboola.com',
+    'outbrain.com',
+    'scorecardresearch.com',
+    'newrelic.com',
+    'nr-data.net',
+    'line-scdn.net',
+)
+
+
+class ResourcePolicy:
+    """
+    นโยบาย request interception ของ Playwright context: abort resource ที่ไม่ใช้และ host ภายนอกที่รู้จัก
+
+    ใช้ `await policy.install(context)` กับ context (หรือ page) ที่ต้องการ
+    ตัวนับ `totals` สะสมจำนวน request, จำนวนที่ถูกบล็อก และจำนวน byte ที่โหลดจริง
+    """
+
+    def __init__(
+        self,
+        blocked_types: Iterable[str] = DEFAULT_BLOCKED_TYPES,
+        blocked_hosts: Iterable[str] = DEFAULT_BLOCKED_HOSTS,
+        enabled: bool = True,
+    ):
+        self.blocked_types = frozenset(blocked_types)
+        self.blocked_hosts = tuple(h.lower().lstrip('.') for h in blocked_hosts)
+        self.enabled = enabled
+        self.totals = {'requests': 0, 'blocked': 0, 'bytes': 0}
+        self._pending: set = set()
+
+    @classmethod
+    def from_env(cls, prefix: str, blocked_types: Iterable[str] = DEFAULT_BLOCKED_TYPES) -> "ResourcePolicy":
+        """
+        อ่านค่าจาก env `{prefix}_BLOCK_RESOURCES` (เช่น "image,font"), `{prefix}_BLOCK_HOSTS`
+        (host เพิ่มเติม) และ `{prefix}_BLOCK_ENABLED` (0 = ปิด)
+        """
+        types = os.getenv(f'{prefix}_BLOCK_RESOURCES')
+        extra_hosts = os.getenv(f'{prefix}_BLOCK_HOSTS', '')
+        return cls(
+            blocked_types=[t.strip() for t in types.split(',') if t.strip()] if types is not None else blocked_types,
+            blocked_hosts=DEFAULT_BLOCKED_HOSTS + tuple(h.strip() for h in extra_hosts.split(',') if h.strip()),
+            enabled=os.getenv(f'{prefix}_BLOCK_ENABLED', '1') != '0',
+        )
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_types:
+            return True
+        host = (urlparse(url).hostname or '').lower()
+        return any(host == h or host.endswith('.' + h) for h in self.blocked_hosts)
+
+    async def install(self, target) -> None:
+        if not self.enabled:
+            return
+        await target.route('**/*', self._route)
+        target.on('requestfinished', self._on_request_finished)
+
+    async def _route(self, route) -> None:
+        request = route.request
+        self.totals['requests'] += 1
+        if self.should_block(request.resource_type, request.url):
+            self.totals['blocked'] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_request_finished(self, request) -> None:
+        task = asyncio.ensure_future(self._add_size(request))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _add_size(self, request) -> None:
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.totals['bytes'] += sizes.get('responseBodySize', 0) + sizes.get('responseHeadersSize', 0)
+
+    def snapshot(self) -> dict:
+        return dict(self.totals)
+
+    def report(self, since: Optional[dict] = None) -> dict:
+        """
+        ส่วนต่างของตัวนับเทียบกับ snapshot ก่อนหน้า (ใช้รายงานต่อการ scrape หนึ่งครั้ง)
+        """
+        since = since or {}
+        return {k: v - since.get(k, 0) for k, v in self.totals.items()}
@@ -0,0 +1,24 @@
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+# key ที่ไม่ใช่ string (เช่น int) แปลงเป็น string แบบเดียวกับ json.dumps
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    # ชนิดที่ orjson ไม่รู้จัก (pydantic model, Decimal, ...) -> ให้ jsonable_encoder แปลงก่อน
+    return jsonable_encoder(value)
+
+
+def encode_json(content: Any) -> bytes:
+    """
+    dict / list ของ document -> JSON bytes (UTF-8 ไม่ escape ภาษาไทย)
+    str / float / datetime ถูกเขียนโดย orjson ตรง ๆ ไม่ผ่าน jsonable_encoder ทีละ field
+    """
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def decode_json(body: bytes | str) -> Any:
+    return orjson.loads(body)
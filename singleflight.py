@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# ปลด lock เฉพาะเมื่อ token ตรงกับเจ้าของ (กันปลด lock ของ worker อื่นที่ได้ lock ต่อหลังหมดอายุ)
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    รวม call ที่ทำงานซ้ำกันด้วย key เดียวกันให้เหลือครั้งเดียวภายใน process
+
+    caller ตัวแรกของ key จะเป็นคนรัน `fn` ส่วน caller ที่ตามมาระหว่างนั้นจะรอผลลัพธ์เดียวกัน
+    (รวมถึง exception) ถ้า caller ตัวแรกถูก cancel งานจะยังทำต่อให้คนที่รออยู่
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> list[str]:
+        return list(self._calls)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await fn()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # กัน warning "exception was never retrieved" เมื่อไม่มีใครรอผลแล้ว
+            task.exception()
+
+
+class RedisSingleFlight(SingleFlight):
+    """
+    SingleFlight ที่ขยายการรับประกันข้าม uvicorn worker / replica ด้วย Redis lock
+
+    - ภายใน process ยังรวม call ด้วย SingleFlight ตามปกติ
+    - ข้าม process: ใครได้ lock `singleflight:lock:{key}` (SET NX PX) เป็นคนรัน `fn`
+      แล้วเก็บผลไว้ที่ `singleflight:result:{key}` ช่วงสั้น ๆ ให้ worker อื่นที่รออยู่อ่าน
+    - ถ้าเจ้าของ lock ล้มเหลว (ไม่มีผลลัพธ์) worker ที่รออยู่จะพยายามแย่ง lock แล้วรันเอง
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        lock_ttl: float = 60.0,
+        result_ttl: float = 30.0,
+        poll_interval: float = 0.2,
+        wait_timeout: float = 90.0,
+        dumps: Callable[[Any], str] = lambda v: json.dumps(v, default=str),
+        loads: Callable[[str], Any] = json.loads,
+        prefix: str = 'singleflight',
+    ):
+        super().__init__()
+        self.redis = redis_client
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self.dumps = dumps
+        self.loads = loads
+        self.prefix = prefix
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        lock_key = f"{self.prefix}:lock:{key}"
+        result_key = f"{self.prefix}:result:{key}"
+        token = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        while True:
+            acquired = await self._try_acquire(lock_key, token)
+            if acquired:
+                try:
+                    await self.redis.delete(result_key)
+                    result = await fn()
+                    try:
+                        await self.redis.set(result_key, self.dumps(result), px=int(self.result_ttl * 1000))
+                    except Exception as e:
+                        logger.warning("singleflight: cannot publish result for %s: %s", key, e)
+                    return result
+                finally:
+                    await self._release(lock_key, token)
+
+            if acquired is None:
+                # Redis ใช้ไม่ได้ -> ทำงานแบบ in-process อย่างเดียว
+                return await fn()
+
+            # มี worker อื่นกำลังทำอยู่ -> รอจน lock หายไปแล้วอ่านผลลัพธ์
+            while loop.time() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    raw = await self.redis.get(result_key)
+                    if raw is not None:
+                        return self.loads(raw)
+                    if not await self.redis.exists(lock_key):
+                        break
+                except Exception:
+                    return await fn()
+            else:
+                raise TimeoutError(f"Timed out waiting for in-flight work on {key}")
+
+    async def _try_acquire(self, lock_key: str, token: str) -> Optional[bool]:
+        try:
+            return bool(await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)))
+        except Exception as e:
+            logger.warning("singleflight: redis lock unavailable (%s), falling back to local", e)
+            return None
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        try:
+            await self.redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+        except Exception:
+            pass
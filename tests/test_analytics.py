@@ -0,0 +1,38 @@
+from datetime import datetime, UTC
+
+from analytics import compute_analytics
+
+
+def test_payout_stored_by_both_sources_is_counted_once():
+    now = datetime(2024, 12, 1, tzinfo=UTC)
+    xd = [datetime(2024, 3, 1, tzinfo=UTC), datetime(2024, 9, 1, tzinfo=UTC)]
+    # panphol: quarter / yield มีค่า, ปฏิทิน SET: รอบเดียวกันแต่ quarter ว่างและไม่มี yield
+    columns = {
+        'symbol': ['PTT', 'PTT', 'PTT'],
+        'amount_value': [1.0, 0.8, 0.8],
+        'yield_value': [3.0, 2.5, None],
+        'xd_date_utc': [xd[0], xd[1], xd[1]],
+    }
+
+    (ptt,) = compute_analytics(columns, ['PTT'], now)
+
+    assert ptt['ttm_count'] == 2
+    assert ptt['ttm_amount'] == 1.8
+    assert ptt['ttm_yield'] == 5.5
+    assert ptt['last_xd'] == xd[1]
+
+
+def test_different_payouts_on_the_same_day_are_kept():
+    now = datetime(2024, 12, 1, tzinfo=UTC)
+    xd = datetime(2024, 9, 1, tzinfo=UTC)
+    columns = {
+        'symbol': ['PTT', 'PTT'],
+        'amount_value': [0.8, 0.2],
+        'yield_value': [2.5, 0.5],
+        'xd_date_utc': [xd, xd],
+    }
+
+    (ptt,) = compute_analytics(columns, ['PTT'], now)
+
+    assert ptt['ttm_count'] == 2
+    assert ptt['ttm_amount'] == 1.0
@@ -0,0 +1,33 @@
+import json
+import os
+import threading
+
+
+class SymbolUniverse:
+    """
+    รายชื่อหุ้นจาก set.json เก็บไว้ใน memory และอ่านไฟล์ใหม่เฉพาะเมื่อ mtime เปลี่ยน
+    """
+
+    def __init__(self, path: str = 'set.json'):
+        self.path = path
+        self._mtime = None
+        self._symbols: list[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        """
+        mtime (ns) ของไฟล์ที่โหลดอยู่ ใช้ประกอบ cache key ที่ขึ้นกับรายชื่อหุ้น
+        """
+        self.symbols()
+        return self._mtime or 0
+
+    def symbols(self) -> list[str]:
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._symbols = [s.strip().upper() for s in json.load(f)["symbols"]]
+                    self._mtime = mtime
+        return self._symbols
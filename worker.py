@@ -0,0 +1,234 @@
+"""
+worker ของคิวงาน scrape (jobs.py) รันกี่ process / กี่เครื่องก็ได้ โดยชี้ Redis และ MongoDB ชุดเดียวกับ API
+
+    python worker.py --concurrency 4                  # ทุกประเภทงาน
+    python worker.py --kinds panphol --concurrency 8  # เฉพาะ panphol
+    python worker.py --stats                          # จำนวนงานในแต่ละคิว
+    python worker.py --requeue-dead set_calendar      # ส่งงานใน dead กลับเข้าคิว
+
+SIGTERM / SIGINT: หยุดหยิบงานใหม่ รองานที่รันอยู่ให้เสร็จแล้วจึงปิด
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+
+from dotenv import load_dotenv
+
+from jobs import JOB_KINDS, PANPHOL_JOB, JobQueue, PermanentJobError
+
+logger = logging.getLogger(__name__)
+
+
+class PanpholHandler:
+    """
+    scrape ผ่าน pipeline เดียวกับ API (negative cache, circuit breaker, ล้าง cache, publish event)
+    ข้าม symbol ที่มีคน scrape ไปแล้วระหว่างที่งานรอคิว เว้นแต่ payload มี force
+    """
+
+    def __init__(self):
+        import app as api
+
+        # app สร้าง client ของ Redis / MongoDB ของตัวเอง (รวมถึง rate limiter ที่แชร์ผ่าน Redis)
+        self.api = api
+        api.connect_services()
+
+    async def __call__(self, payload: dict) -> dict:
+        from fastapi import HTTPException
+
+        symbol = str(payload.get('symbol') or '').strip().upper()
+        if not symbol:
+            raise PermanentJobError("payload has no symbol")
+        api = self.api
+        if not payload.get('force'):
+            state = await api.repo.get_scrape_state(symbol)
+            if state and not api.refresher.is_stale(state.get('last_scraped_at')):
+                return {'status': 'fresh'}
+        try:
+            result = await api.scrape_flight.do(symbol, lambda: api.scrape_panphol(symbol))
+        except HTTPException as e:
+            if e.status_code == 404:
+                return {'status': 'not_found', 'detail': e.detail}
+            raise
+        return {'status': 'scraped', 'path': result.get('scrape_path'), 'content': result.get('content'), **result.get('ingest', {})}
+
+    async def close(self) -> None:
+        await self.api.close_services()
+
+
+class SetCalendarHandler:
+    """
+    ปฏิทิน XD ของ SET หนึ่งเดือน ใช้ browser / page เดียวต่อ process จึงรันทีละงาน
+    การเขียน MongoDB / Redis ของ SETXDScraper รันใน thread (asyncio.to_thread) งานอื่นและ heartbeat จึงไม่ถูกหยุด
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._scraper = None
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, payload: dict) -> dict:
+        try:
+            year, month = int(payload['year']), int(payload['month'])
+        except (KeyError, TypeError, ValueError):
+            raise PermanentJobError(f"invalid calendar payload: {payload}")
+        if not 1 <= month <= 12:
+            raise PermanentJobError(f"invalid month: {month}")
+        async with self._lock:
+            if self._scraper is None:
+                from xd_calendar_set import SETXDScraper
+
+                self._scraper = SETXDScraper(headless=True)
+                if os.getenv('RATE_LIMIT_BACKEND', 'redis') == 'redis':
+                    self._scraper.rate_limiter.share_via(self.redis)
+            try:
+                rows = await self._scraper.get_xd_calendar_data(
+                    year, month, raise_errors=True, force=bool(payload.get('force'))
+                )
+            except Exception:
+                # page อาจค้างอยู่ที่สถานะไหนก็ได้ -> เปิด browser ใหม่ในครั้งถัดไป
+                await self.close()
+                raise
+            content = self._scraper.last_content
+        return {'status': 'scraped', 'rows': len(rows or []), 'content': content}
+
+    async def close(self) -> None:
+        scraper, self._scraper = self._scraper, None
+        if scraper is not None:
+            try:
+                await scraper.close()
+            except Exception as e:
+                logger.warning("Cannot close SET calendar browser: %s", e)
+
+
+def make_handler(kind: str, redis_client):
+    if kind == PANPHOL_JOB:
+        return PanpholHandler()
+    return SetCalendarHandler(redis_client)
+
+
+def redis_from_env():
+    import redis.asyncio as aioredis
+
+    return aioredis.Redis(
+        host=os.getenv('REDIS_HOST', 'redis'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
+        username=os.getenv('REDIS_USERNAME', 'default'),
+        password=os.getenv('REDIS_PASSWORD', None)
+    )
+
+
+async def keep_alive(queue: JobQueue, job: dict) -> None:
+    # ต่อ visibility timeout ระหว่างที่งานยังรัน (งานที่ใช้เวลานานกว่า timeout จะไม่ถูกส่งให้ worker อื่นซ้ำ)
+    while True:
+        await asyncio.sleep(queue.visibility_timeout / 3)
+        if not await queue.touch(job):
+            logger.warning("job %s: lost its reservation", job['id'])
+            return
+
+
+async def process(queue: JobQueue, handler, job: dict) -> None:
+    heartbeat = asyncio.create_task(keep_alive(queue, job))
+    started = time.perf_counter()
+    error, permanent, result = None, False, None
+    try:
+        result = await handler(job['payload'])
+    except PermanentJobError as e:
+        error, permanent = str(e), True
+    except Exception as e:
+        error = f"{type(e).__name__}: {getattr(e, 'detail', e)}"
+    finally:
+        heartbeat.cancel()
+    if error is None:
+        outcome = 'done' if await queue.ack(job, result) else 'lost'
+    else:
+        outcome = await queue.fail(job, error, permanent=permanent)
+    logger.info(
+        "job %s %s %s attempt %d/%d: %s in %.1fs%s",
+        job['id'], job['kind'], json.dumps(job['payload'], ensure_ascii=False), job['attempts'], job['max_attempts'],
+        outcome, time.perf_counter() - started, f" ({error})" if error else ''
+    )
+
+
+async def run_worker(queue: JobQueue, handlers: dict, stop: asyncio.Event, poll_interval: float) -> None:
+    kinds = list(handlers)
+    turn = 0
+    while not stop.is_set():
+        job = None
+        try:
+            # สลับประเภทงานที่ดูก่อนทุกรอบ กันคิวหนึ่งแย่ง worker จนอีกคิวไม่ได้รัน
+            for i in range(len(kinds)):
+                job = await queue.reserve(kinds[(turn + i) % len(kinds)])
+                if job is not None:
+                    break
+        except Exception as e:
+            logger.warning("Cannot reserve a job: %s", e)
+        turn += 1
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await process(queue, handlers[job['kind']], job)
+
+
+async def serve(kinds: list[str], concurrency: int, poll_interval: float) -> None:
+    redis_client = redis_from_env()
+    queue = JobQueue.from_env(redis_client)
+    handlers = {kind: make_handler(kind, redis_client) for kind in kinds}
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info("Worker started: kinds=%s concurrency=%d", ','.join(kinds), concurrency)
+    try:
+        await asyncio.gather(*(run_worker(queue, handlers, stop, poll_interval) for _ in range(concurrency)))
+    finally:
+        for handler in handlers.values():
+            await handler.close()
+        await redis_client.close()
+    logger.info("Worker stopped")
+
+
+async def admin(args) -> None:
+    redis_client = redis_from_env()
+    queue = JobQueue.from_env(redis_client)
+    try:
+        if args.requeue_dead:
+            print(json.dumps({'requeued': await queue.requeue_dead(args.requeue_dead)}))
+        else:
+            print(json.dumps(await queue.stats(), indent=2))
+    finally:
+        await redis_client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scrape job workers backed by the Redis job queue")
+    parser.add_argument('--kinds', default=','.join(JOB_KINDS), help=f"comma-separated job kinds ({', '.join(JOB_KINDS)})")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('WORKER_CONCURRENCY', 4)),
+                        help="jobs run at the same time in this process")
+    parser.add_argument('--poll-interval', type=float, default=float(os.getenv('WORKER_POLL_INTERVAL', 1.0)),
+                        help="seconds to wait when every queue is empty")
+    parser.add_argument('--stats', action='store_true', help="print queue lengths and exit")
+    parser.add_argument('--requeue-dead', choices=JOB_KINDS, default=None, help="move dead jobs of a kind back to the queue")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.stats or args.requeue_dead:
+        asyncio.run(admin(args))
+        return
+    kinds = [k.strip() for k in args.kinds.split(',') if k.strip()]
+    unknown = set(kinds) - set(JOB_KINDS)
+    if unknown or not kinds:
+        parser.error(f"unknown job kinds: {', '.join(sorted(unknown)) or '(none)'}")
+    asyncio.run(serve(kinds, args.concurrency, args.poll_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
+import asyncio
 import os
 import pandas as pd
 from datetime import datetime, timedelta, UTC
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 import re
+import time
+import redis
 from pymongo import MongoClient
+from cache import invalidate_redis_sync, dividend_cache_prefixes, bump_versions_sync, DIVIDENDS_VERSION
+from repository import upsert_dividends, content_fingerprint, get_calendar_state, mark_calendar_scraped
+from events import publish_dividend_events_sync
+from indexes import reconcile_indexes
+from resource_policy import ResourcePolicy
+from ratelimit import AdaptiveRateLimiter
+from urllib.parse import urlparse
 
 # ปิด warnings ที่ไม่จำเป็น
 import warnings
@@ -14,18 +24,34 @@ mongo_client = MongoClient(MONGO_URI)
 db = mongo_client['dividend_db']
 dividends_collection = db['dividends']
 
+redis_client = redis.Redis(
+    host=os.getenv('REDIS_HOST', 'redis'),
+    port=int(os.getenv('REDIS_PORT', 6379)),
+    db=int(os.getenv('REDIS_DB', 0)),
+    username=os.getenv('REDIS_USERNAME', 'default'),
+    password=os.getenv('REDIS_PASSWORD', None)
+)
+
 THAI_MONTHS = {
     "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
     "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12
 }
 
 class SETXDScraper:
-    def __init__(self, headless=True):
-        self.base_url = "https://www.set.or.th"
+    def __init__(self, headless=True, resource_policy=None, rate_limiter=None):
+        self.base_url = os.getenv('SET_BASE_URL', "https://www.set.or.th")
         self.headless = headless
         self.browser = None
         self.context = None
         self.page = None
+        # ผลเทียบ fingerprint ของเดือนล่าสุดที่ดึง: 'changed' / 'unchanged'
+        self.last_content = None
+        # ปฏิทินต้องใช้ script + css ในการคลิกเปลี่ยนเดือน จึงบล็อกเฉพาะรูป/ฟอนต์/media และ tracker
+        self.resource_policy = resource_policy or ResourcePolicy.from_env('SET', blocked_types=('image', 'media', 'font'))
+        # จำกัดการโหลดหน้าปฏิทินต่อ host (worker.py แชร์ state ผ่าน Redis ด้วย share_via)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter.from_env(
+            'SET', urlparse(self.base_url).hostname, rate=0.5, burst=2, max_concurrency=2
+        )
     
     async def setup_browser(self):
         """
@@ -41,6 +67,7 @@ class SETXDScraper:
                 viewport={'width': 1920, 'height': 1080},
                 user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             )
+            await self.resource_policy.install(self.context)
             self.page = await self.context.new_page()
             print("เปิด Browser สำเร็จ")
         except Exception as e:
@@ -48,27 +75,32 @@ class SETXDScraper:
     
     def insert_dividends_to_mongo(self, xd_data):
         """
-        เพิ่มข้อมูล XD ลง MongoDB โดยตรวจสอบข้อมูลซ้ำ
+        เพิ่มข้อมูล XD ลง MongoDB ด้วย bulk upsert ครั้งเดียว (ข้อมูลซ้ำถูกกันด้วย unique index)
         """
-        if xd_data:
-            for dividend in xd_data:
-                exists = dividends_collection.find_one({
-                    'symbol': dividend['symbol'],
-                    'year': dividend['year'],
-                    'amount': dividend['amount'],
-                    'xd_date': dividend['xd_date'],
-                    'type': dividend['type'],
-                    'pay_date_utc': dividend['pay_date_utc']
-                })
-                if not exists:
-                    dividends_collection.insert_one(dividend)
-                    print(f"Inserted {dividend['symbol']} {dividend['xd_date']}")
-                else:
-                    print(f"Skipped {dividend['symbol']} {dividend['xd_date']} (already exists)")
+        if not xd_data:
+            return None
+        result = upsert_dividends(dividends_collection, xd_data)
+        print(f"Inserted {result['inserted']}, updated {result['updated']}, unchanged {result['unchanged']}")
+        if result['changed_symbols']:
+            # ลบ cache ของ API ที่เกี่ยวข้องกับ symbol ที่ข้อมูลเปลี่ยน
+            try:
+                invalidate_redis_sync(redis_client, dividend_cache_prefixes(result['changed_symbols']))
+                bump_versions_sync(redis_client, [DIVIDENDS_VERSION])
+            except Exception as e:
+                print(f"Cannot invalidate API cache: {e}")
+            # subscriber ของ /dividends/events ที่ใช้ Redis pub/sub (MongoDB ไม่ใช่ replica set)
+            try:
+                publish_dividend_events_sync(redis_client, result['changes'])
+            except Exception as e:
+                print(f"Cannot publish dividend events: {e}")
+        return result
 
-    async def get_xd_calendar_data(self, year=None, month=None):
+    async def get_xd_calendar_data(self, year=None, month=None, raise_errors=False, force=False):
         """
         ดึงข้อมูล XD จากปฏิทิน SET ด้วย Playwright
+        raise_errors=True ส่ง exception ต่อแทนการคืนค่า [] (ให้ worker.py retry ได้)
+        ถ้าเนื้อหาของเดือนตรงกับ fingerprint ที่บันทึกไว้ (และไม่ force) จะไม่แปลง/เขียนลง DB และคืนค่า []
+        ดูผลได้จาก self.last_content
         """
         if not self.page:
             await self.setup_browser()
@@ -78,11 +110,21 @@ class SETXDScraper:
         if month is None:
             month = datetime.now().month
             
+        resources_before = self.resource_policy.snapshot()
         try:
             calendar_url = f"{self.base_url}/th/market/stock-calendar/x-calendar"
             print(f"กำลังโหลดหน้าเว็บ: {calendar_url}")
             
-            await self.page.goto(calendar_url, wait_until='networkidle')
+            started = time.perf_counter()
+            async with self.rate_limiter.acquire() as permit:
+                response = await self.page.goto(calendar_url, wait_until='domcontentloaded')
+                if response is not None:
+                    permit.record_response(response.status, response.headers.get('retry-after'))
+            try:
+                await self.page.wait_for_selector('.month-item', timeout=15000)
+            except PlaywrightTimeoutError:
+                print("ไม่พบ tab เดือนภายใน 15 วินาที")
+            print(f"Time to selector: {time.perf_counter() - started:.2f}s")
             
             # ลองหาและคลิกปุ่มเปลี่ยนเดือน/ปี (ถ้ามี)
             await self.navigate_to_month(year, month)
@@ -91,18 +133,41 @@ class SETXDScraper:
             await self.page.wait_for_timeout(3000)
             
             # ดึงข้อมูล XD
-            xd_data = await self.parse_xd_from_page(year, month)
+            entries = await self.collect_xd_entries()
+            fingerprint = content_fingerprint(entries)
+            # pymongo / redis-py เป็นแบบ sync: รันใน thread เพื่อไม่ block event loop (worker.py รันงานอื่นใน loop เดียวกัน)
+            state = await asyncio.to_thread(get_calendar_state, db, year, month)
+            if entries and not force and state and state.get('content_hash') == fingerprint:
+                # เนื้อหาเดิม: ต่ออายุความสดอย่างเดียว
+                await asyncio.to_thread(mark_calendar_scraped, db, year, month, datetime.now(UTC).timestamp())
+                self.last_content = 'unchanged'
+                print(f"ข้อมูล XD {month}/{year} ไม่เปลี่ยน ({len(entries)} รายการ)")
+                return []
+            xd_data = self.parse_xd_entries(entries)
             
             # เรียกฟังก์ชันใหม่สำหรับ insert
-            self.insert_dividends_to_mongo(xd_data)
+            await asyncio.to_thread(self.insert_dividends_to_mongo, xd_data)
+            self.last_content = 'changed'
+            if entries:
+                # หน้าว่าง (เช่น หา tab เดือนไม่เจอ) ไม่บันทึก fingerprint
+                await asyncio.to_thread(
+                    mark_calendar_scraped, db, year, month, datetime.now(UTC).timestamp(), fingerprint, len(xd_data)
+                )
             return xd_data
             
         except PlaywrightTimeoutError:
             print("Timeout: หน้าเว็บโหลดช้าเกินไป")
+            if raise_errors:
+                raise
             return []
         except Exception as e:
             print(f"Error: {e}")
+            if raise_errors:
+                raise
             return []
+        finally:
+            # request / byte ที่ใช้กับเดือนนี้ (ตัวนับสะสมทั้ง process อยู่ใน snapshot ตอน close)
+            print(f"Resources for {month}/{year}: {self.resource_policy.report(resources_before)}")
     
     async def navigate_to_month(self, target_year, target_month):
         """
@@ -132,12 +197,11 @@ class SETXDScraper:
         except Exception as e:
             print(f"ไม่สามารถนำทางไปยัง {target_month}/{target_year}: {e}")
     
-    async def parse_xd_from_page(self, year, month):
+    async def collect_xd_entries(self):
         """
-        แปลงข้อมูล HTML เป็นข้อมูล XD (เฉพาะหุ้น XD จริง)
+        (symbol, HTML ของ dropdown) ของหุ้น XD จริงในหน้า เรียงตาม symbol และตัดช่องว่างซ้ำ (ใช้ทำ fingerprint ได้)
         """
-        xd_events = []
-        processed_symbols = set()  # เก็บ symbol ที่เคยประมวลผลแล้ว
+        entries = {}
         
         # หา div ที่มี class x-symbol
         x_symbol_divs = await self.page.query_selector_all(".x-symbol")
@@ -157,12 +221,20 @@ class SETXDScraper:
                 }''')
                 if not data:
                     continue
-                symbol = data['symbol']
-                html = data['html']
-                # ข้ามถ้าเคยประมวลผลแล้ว
-                if symbol in processed_symbols:
-                    continue
-                processed_symbols.add(symbol)
+                # ใช้รายการแรกของแต่ละ symbol
+                entries.setdefault(data['symbol'], ' '.join(data['html'].split()))
+            except Exception as e:
+                print(f"Error reading symbol: {str(e)}")
+                continue
+        return sorted(entries.items())
+    
+    def parse_xd_entries(self, entries):
+        """
+        แปลงข้อมูล HTML เป็นข้อมูล XD (เฉพาะหุ้น XD จริง)
+        """
+        xd_events = []
+        for symbol, html in entries:
+            try:
                 print(f"Processing {symbol}...")
                 def extract(label):
                     m = re.search(
@@ -229,6 +301,7 @@ class SETXDScraper:
         """
         if self.browser:
             await self.browser.close()
+            print(f"Resources: {self.resource_policy.snapshot()}")
             print("ปิด Browser แล้ว")
 
     async def get_next_month_xd(self):
@@ -244,6 +317,7 @@ class SETXDScraper:
         return await self.get_xd_calendar_data(next_year, next_month)
 
 async def main():
+    reconcile_indexes(db)
     scraper = SETXDScraper(headless=False)
     try:
         months_to_fetch = 7  # จำนวนเดือนที่ต้องการดึงต่อเนื่อง
@@ -254,6 +328,8 @@ async def main():
             data = await scraper.get_xd_calendar_data(y, m)
             if data:
                 print(f"พบข้อมูล XD {len(data)} รายการ")
+            elif scraper.last_content == 'unchanged':
+                print("ข้อมูล XD เหมือนครั้งก่อน ไม่ได้เขียนลง DB")
             else:
                 print("ไม่พบข้อมูล XD")
             # เดือนไปข้างหน้า
@@ -268,5 +344,4 @@ async def main():
         await scraper.close()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
\ No newline at end of file